@@ -0,0 +1,139 @@
+import os
+import csv
+import json
+import struct
+import numpy as np
+
+# --- SNAPSHOT BINARIO DEL DATASET ---
+# Il CSV viene convertito UNA volta in colonne tipizzate (int64, float64,
+# stringhe; le celle vuote diventano NaN come in pd.read_csv) e salvato accanto
+# al CSV in un unico file binario:
+#   MAGIC | lunghezza intestazione (uint32) | intestazione JSON | colonne grezze
+# L'intestazione contiene mtime e dimensione del CSV di origine e la mappa delle
+# colonne (nome, dtype, offset, byte). Ai riavvii basta una lettura e una
+# np.frombuffer per colonna: niente parsing del testo e niente import di pandas.
+# Lo snapshot viene ricostruito solo quando il CSV cambia.
+SNAPSHOT_VERSION = 2  # 2: righe corte completate (prima troncavano le colonne)
+MAGIC = b"DTSNAP1\n"
+HEADER_LENGTH = struct.Struct("<I")
+
+
+def snapshot_path(csv_file):
+    return csv_file + ".snapshot"
+
+
+def _source_signature(csv_file):
+    st = os.stat(csv_file)
+    return [SNAPSHOT_VERSION, st.st_mtime_ns, st.st_size]
+
+
+def _typed_column(values):
+    """Celle di testo -> int64, float64 (vuote = NaN) o stringhe, con le regole di pd.read_csv"""
+    if all(values):
+        try:
+            return np.array([int(v) for v in values], dtype=np.int64)
+        except (ValueError, OverflowError):
+            pass
+    try:
+        return np.array([float(v) if v else np.nan for v in values], dtype=np.float64)
+    except ValueError:
+        return np.array(values, dtype=str)
+
+
+def read_csv_columns(csv_file):
+    """{nome colonna: array tipizzato} nell'ordine del CSV"""
+    with open(csv_file, newline="") as f:
+        reader = csv.reader(f)
+        names = next(reader)
+        rows = [row for row in reader if row]
+    names = [name or f"Unnamed: {i}" for i, name in enumerate(names)]
+    # Righe corte: celle mancanti vuote (NaN, come pd.read_csv); zip le taglierebbe tutte
+    rows = [row + [""] * (len(names) - len(row)) for row in rows]
+    cells = list(zip(*rows)) if rows else [() for _ in names]
+    return {name: _typed_column(list(values)) for name, values in zip(names, cells)}
+
+
+class Dataset:
+    """Colonne tipizzate + accesso ai record come dizionari di tipi Python nativi"""
+    def __init__(self, columns):
+        self.columns = columns
+        self.names = list(columns)
+        self.size = len(next(iter(columns.values()))) if columns else 0
+        self._records = None
+
+    def __len__(self):
+        return self.size
+
+    def records(self):
+        """Tutti i record (stessa regola di BioSender.get_record: NaN -> 0.0)"""
+        if self._records is None:
+            values = []
+            for name in self.names:
+                column = self.columns[name]
+                if column.dtype.kind == "f":
+                    column = np.where(np.isnan(column), 0.0, column)
+                values.append(column.tolist())
+            self._records = [dict(zip(self.names, row)) for row in zip(*values)]
+        return self._records
+
+    def record(self, index):
+        return dict(self.records()[index % self.size])
+
+
+def write_snapshot(path, columns, signature):
+    layout = []
+    offset = 0
+    for name, column in columns.items():
+        layout.append([name, column.dtype.str, offset, column.nbytes])
+        offset += column.nbytes
+    header = json.dumps({"source": signature, "columns": layout}).encode()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + HEADER_LENGTH.pack(len(header)) + header)
+        for column in columns.values():
+            f.write(np.ascontiguousarray(column).tobytes())
+    os.replace(tmp_path, path)  # Scrittura atomica: un riavvio non legge mai uno snapshot a metà
+
+
+def read_snapshot(path, signature):
+    """Colonne dello snapshot, o None se manca, è di un altro CSV o è illeggibile"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if not data.startswith(MAGIC):
+        return None
+    try:
+        (length,) = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+        start = len(MAGIC) + HEADER_LENGTH.size
+        header = json.loads(data[start:start + length])
+        if header["source"] != signature:
+            return None
+        base = start + length
+        return {name: np.frombuffer(data, dtype=np.dtype(dtype), count=nbytes // np.dtype(dtype).itemsize,
+                                    offset=base + offset)
+                for name, dtype, offset, nbytes in header["columns"]}
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
+
+def load_dataset(csv_file, use_snapshot=True):
+    """
+    Restituisce (Dataset, ricostruito). Con use_snapshot=False il CSV viene
+    letto ogni volta e nessuno snapshot viene scritto.
+    """
+    path = snapshot_path(csv_file)
+    signature = _source_signature(csv_file)
+    if use_snapshot:
+        columns = read_snapshot(path, signature)
+        if columns is not None:
+            return Dataset(columns), False
+
+    columns = read_csv_columns(csv_file)
+    if use_snapshot:
+        try:
+            write_snapshot(path, columns, signature)
+        except OSError:
+            pass  # Cartella in sola lettura: si continua dal CSV
+    return Dataset(columns), True
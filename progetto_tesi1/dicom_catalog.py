@@ -0,0 +1,237 @@
+import os
+import json
+import sqlite3
+import logging
+import argparse
+import pydicom
+
+# --- CATALOGO PERSISTENTE DELLE SERIE DICOM ---
+# Una scansione del manifest TCGA-BRCA legge solo gli header
+# (stop_before_pixels) e salva paziente, studio, serie, ordine delle slice e
+# geometria in un indice SQLite locale. Le scansioni successive rileggono solo
+# i file nuovi o modificati (mtime + dimensione).
+# Si salva ogni COMMIT_EVERY serie: una scansione interrotta di un archivio
+# grande riparte da dove era arrivata.
+DEFAULT_CATALOG_FILE = "dicom_catalog.sqlite"
+COMMIT_EVERY = 20
+
+log = logging.getLogger("dicom_catalog")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    patient_id TEXT,
+    study_uid TEXT,
+    series_uid TEXT,
+    sop_uid TEXT,
+    instance_number INTEGER,
+    slice_position REAL,
+    position TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_series ON files (series_uid);
+CREATE TABLE IF NOT EXISTS series (
+    series_uid TEXT PRIMARY KEY,
+    patient_id TEXT,
+    study_uid TEXT,
+    modality TEXT,
+    description TEXT,
+    num_slices INTEGER,
+    rows INTEGER,
+    columns INTEGER,
+    pixel_spacing TEXT,
+    slice_thickness REAL,
+    orientation TEXT,
+    directory TEXT
+);
+"""
+
+
+def _slice_position(ds):
+    """Proiezione di ImagePositionPatient sulla normale al piano dell'immagine"""
+    if "ImagePositionPatient" not in ds or "ImageOrientationPatient" not in ds:
+        return None
+    r = [float(v) for v in ds.ImageOrientationPatient[:3]]
+    c = [float(v) for v in ds.ImageOrientationPatient[3:]]
+    normal = (r[1] * c[2] - r[2] * c[1], r[2] * c[0] - r[0] * c[2], r[0] * c[1] - r[1] * c[0])
+    return sum(float(p) * n for p, n in zip(ds.ImagePositionPatient, normal))
+
+
+def _list_or_none(ds, keyword):
+    if keyword not in ds:
+        return None
+    return json.dumps([float(v) for v in ds.data_element(keyword).value])
+
+
+class DicomCatalog:
+    def __init__(self, db_path=DEFAULT_CATALOG_FILE):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def is_empty(self):
+        return self.conn.execute("SELECT COUNT(*) FROM series").fetchone()[0] == 0
+
+    # --- SCANSIONE (INCREMENTALE) ---
+    def scan(self, root_path):
+        log.info(f"🔍 Indicizzazione DICOM partendo da: {root_path}")
+        # Con il separatore finale: /data/dicom non deve includere /data/dicom2
+        prefix = os.path.join(root_path, "")
+        known = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.conn.execute("SELECT path, mtime_ns, size FROM files")
+            if path.startswith(prefix)
+        }
+        seen = set()
+        touched_series = set()
+        added = updated = errors = 0
+
+        for dirpath, dirnames, filenames in os.walk(root_path):
+            for name in filenames:
+                if not name.endswith('.dcm'):
+                    continue
+                path = os.path.join(dirpath, name)
+                seen.add(path)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if known.get(path) == (st.st_mtime_ns, st.st_size):
+                    continue
+
+                try:
+                    ds = pydicom.dcmread(path, stop_before_pixels=True)
+                except Exception as e:
+                    log.warning(f"⚠️ Header illeggibile {path}: {e}")
+                    errors += 1
+                    continue
+
+                series_uid = str(ds.get("SeriesInstanceUID", dirpath))
+                old = self.conn.execute("SELECT series_uid FROM files WHERE path = ?", (path,)).fetchone()
+                if old:
+                    touched_series.add(old[0])
+                    updated += 1
+                else:
+                    added += 1
+                touched_series.add(series_uid)
+
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (path, st.st_mtime_ns, st.st_size,
+                     str(ds.get("PatientID", "")), str(ds.get("StudyInstanceUID", "")), series_uid,
+                     str(ds.get("SOPInstanceUID", "")),
+                     int(ds.InstanceNumber) if ds.get("InstanceNumber") is not None else None,
+                     _slice_position(ds), _list_or_none(ds, "ImagePositionPatient"))
+                )
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO series (series_uid) VALUES (?)", (series_uid,)
+                )
+                self.conn.execute(
+                    "UPDATE series SET patient_id = ?, study_uid = ?, modality = ?, description = ?,"
+                    " rows = ?, columns = ?, pixel_spacing = ?, slice_thickness = ?, orientation = ?,"
+                    " directory = ? WHERE series_uid = ?",
+                    (str(ds.get("PatientID", "")), str(ds.get("StudyInstanceUID", "")),
+                     str(ds.get("Modality", "")), str(ds.get("SeriesDescription", "")),
+                     ds.get("Rows"), ds.get("Columns"), _list_or_none(ds, "PixelSpacing"),
+                     float(ds.SliceThickness) if ds.get("SliceThickness") is not None else None,
+                     _list_or_none(ds, "ImageOrientationPatient"), dirpath, series_uid)
+                )
+                if len(touched_series) >= COMMIT_EVERY:
+                    self._refresh_series(touched_series)
+                    self.conn.commit()
+                    touched_series.clear()
+
+        # File spariti dal disco
+        removed = [path for path in known if path not in seen]
+        for path in removed:
+            row = self.conn.execute("SELECT series_uid FROM files WHERE path = ?", (path,)).fetchone()
+            if row:
+                touched_series.add(row[0])
+            self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+        self._refresh_series(touched_series)
+        self.conn.commit()
+
+        log.info(f"✅ Indice aggiornato: +{added} nuovi, {updated} modificati, -{len(removed)} rimossi, {errors} errori")
+        return {"added": added, "updated": updated, "removed": len(removed), "errors": errors}
+
+    def _refresh_series(self, series_uids):
+        """Aggiorna il conteggio delle serie toccate (ed elimina quelle vuote)"""
+        for series_uid in series_uids:
+            count = self.conn.execute(
+                "SELECT COUNT(*) FROM files WHERE series_uid = ?", (series_uid,)
+            ).fetchone()[0]
+            if count:
+                self.conn.execute("UPDATE series SET num_slices = ? WHERE series_uid = ?", (count, series_uid))
+            else:
+                self.conn.execute("DELETE FROM series WHERE series_uid = ?", (series_uid,))
+
+    # --- INTERROGAZIONI ---
+    def list_series(self):
+        cursor = self.conn.execute(
+            "SELECT series_uid, patient_id, study_uid, modality, description, num_slices, directory"
+            " FROM series ORDER BY patient_id, study_uid, series_uid"
+        )
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def series_info(self, series_uid):
+        cursor = self.conn.execute("SELECT * FROM series WHERE series_uid = ?", (series_uid,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        info = dict(zip([c[0] for c in cursor.description], row))
+        for key in ("pixel_spacing", "orientation"):
+            if info[key] is not None:
+                info[key] = json.loads(info[key])
+        return info
+
+    def series_files(self, series_uid):
+        """
+        File della serie in ordine anatomico: posizione lungo la normale,
+        poi InstanceNumber, infine nome del file.
+        """
+        rows = self.conn.execute(
+            "SELECT path FROM files WHERE series_uid = ?"
+            " ORDER BY slice_position IS NULL, slice_position,"
+            " instance_number IS NULL, instance_number, path",
+            (series_uid,)
+        )
+        return [row[0] for row in rows]
+
+    def slice_positions(self, series_uid):
+        """ImagePositionPatient di ogni slice, nello stesso ordine di series_files()"""
+        rows = self.conn.execute(
+            "SELECT position FROM files WHERE series_uid = ?"
+            " ORDER BY slice_position IS NULL, slice_position,"
+            " instance_number IS NULL, instance_number, path",
+            (series_uid,)
+        )
+        return [json.loads(row[0]) if row[0] is not None else None for row in rows]
+
+    def first_series(self):
+        row = self.conn.execute(
+            "SELECT series_uid FROM series ORDER BY patient_id, study_uid, series_uid LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Indicizzatore serie DICOM")
+    parser.add_argument("root", help="Cartella radice del manifest")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_FILE, help="File SQLite dell'indice")
+    parser.add_argument("--log-level", default="INFO", help="WARNING nasconde l'avanzamento della scansione")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+
+    catalog = DicomCatalog(args.catalog)
+    catalog.scan(args.root)
+    for s in catalog.list_series():
+        print(f"{s['patient_id']} | {s['series_uid']} | {s['modality']} | {s['num_slices']} slice | {s['description']}")
+    catalog.close()
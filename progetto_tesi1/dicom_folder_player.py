@@ -1,118 +1,459 @@
+import io
 import os
 import time
-import json
+import queue
+import threading
 import zmq
 import pydicom
 import numpy as np
+import logging
 import argparse
+from concurrent.futures import ProcessPoolExecutor, Future
+from feature_cache import SliceFeatureCache, DEFAULT_CACHE_FILE
+from dicom_catalog import DicomCatalog, DEFAULT_CATALOG_FILE
+from dicom_volume import VolumeStore
+from volume_features import extract_volume_features
+from wire_codec import WireEncoder, CODECS
+from metrics import MetricsRegistry, serve_metrics
+from payload_ring import Pacer
+from pixel_stream import PixelStreamer, pixel_socket, ZMQ_PIXEL_PORT, PIXEL_KINDS, COMPRESSIONS
+
+log = logging.getLogger("dicom_player")
 
 # --- CONFIGURAZIONE ---
 DATASET_ROOT = r"C:\Users\Davide\OneDrive - Universita' degli Studi Mediterranea\Magistrale\Tesi Magistrale\Immagini\manifest-25vRPwyh8987165612391086998\TCGA-BRCA" 
 ZMQ_PORT = 5555
+SLICE_RATE = 10.0  # Slice al secondo (velocità simulata della macchina)
+PREFETCH = 32      # Slice lette/in estrazione in anticipo per ogni stadio
+
+def select_series(series_uid=None, catalog_file=DEFAULT_CATALOG_FILE, rescan=False):
+    """
+    Seleziona una serie dal catalogo SQLite (indicizzato una sola volta).
+    Senza series_uid restituisce la prima serie del catalogo.
+    """
+    catalog = DicomCatalog(catalog_file)
+    try:
+        if rescan or catalog.is_empty():
+            catalog.scan(DATASET_ROOT)
+        if series_uid is None:
+            series_uid = catalog.first_series()
+        files = catalog.series_files(series_uid) if series_uid else []
+        if files:
+            log.info(f"✅ Serie {series_uid}: {len(files)} immagini")
+        else:
+            log.warning(f"❌ Serie {series_uid} non trovata nel catalogo.")
+        return files
+    finally:
+        catalog.close()
 
 def find_dicom_series(root_path):
     """
     Scende ricorsivamente nelle cartelle finché non trova 
     una cartella che contiene file .dcm
+    (percorso senza catalogo, usato con --no-catalog)
     """
-    print(f"🔍 Cerco file DICOM partendo da: {root_path}")
+    log.info(f"🔍 Cerco file DICOM partendo da: {root_path}")
     
     for dirpath, dirnames, filenames in os.walk(root_path):
         # Filtra solo i file .dcm
         dicom_files = [f for f in filenames if f.endswith('.dcm')]
         
         if len(dicom_files) > 0:
-            print(f"✅ Trovata serie DICOM in: {dirpath}")
-            print(f"📦 Numero immagini: {len(dicom_files)}")
+            log.info(f"✅ Trovata serie DICOM in: {dirpath}")
+            log.info(f"📦 Numero immagini: {len(dicom_files)}")
             # Ordiniamo i file per essere sicuri che la sequenza sia corretta
             dicom_files.sort()
             # Ritorniamo il percorso completo di ogni file
             return [os.path.join(dirpath, f) for f in dicom_files]
             
-    print("❌ Nessun file .dcm trovato nella struttura.")
+    log.warning("❌ Nessun file .dcm trovato nella struttura.")
     return []
 
-def process_slice_for_unity(dcm_path):
+# Versione delle feature di slice_packet: va incrementata quando cambia il
+# contenuto dei pacchetti, così la cache su disco non serve quelli vecchi
+PACKET_VERSION = 1
+
+def slice_packet(pixel_array, slice_index="0"):
+    """
+    Riduce una slice (array di pixel, anche una vista sul volume mappato)
+    ai 3 numeri per Unity. pixel_array=None -> valori di fallback.
+    """
+    # 1. Estrarre un valore rappresentativo per il RAGGIO
+    # Usiamo la media dell'intensità dei pixel. 
+    # Più il tessuto è denso (bianco), più grande diventa la sfera.
+    if pixel_array is not None:
+        # Calcoliamo la media, normalizziamo per avere valori tra 10 e 20 circa
+        avg_intensity = np.mean(pixel_array)
+        # Formula empirica per adattare i valori DICOM (spesso 0-4096) alla scala Unity
+        radius_proxy = 10.0 + (avg_intensity / 50.0) 
+    else:
+        radius_proxy = 14.0 # Fallback
+
+    # 2. Estrarre Texture/Rugosità
+    # Usiamo la deviazione standard (quanto varia l'immagine in quella fetta)
+    if pixel_array is not None:
+        texture_proxy = np.std(pixel_array)
+    else:
+        texture_proxy = 5.0
+
+    # 3. Diagnosi Simulata (per il colore)
+    # Se c'è un punto molto luminoso (calcificazione/massa), segna come 'M'
+    max_intensity = np.max(pixel_array) if pixel_array is not None else 0
+    diagnosis = "M" if max_intensity > 2000 else "B" # Soglia fittizia per demo
+
+    # Costruiamo il pacchetto JSON leggero
+    packet = {
+        "id": 1, # ID fisso per il DT
+        "slice_index": slice_index,
+        "diagnosis": diagnosis,
+        "radius_mean": float(radius_proxy),
+        "texture_mean": float(texture_proxy)
+    }
+    return packet
+
+def process_slice_for_unity(dcm_path, timings=None):
     """
     Edge Processing: Legge un file pesante, estrae 3 numeri per Unity.
+    timings: dizionario opzionale riempito con i secondi per fase (read, decode, reduce)
     """
     try:
+        t0 = time.perf_counter()
         ds = pydicom.dcmread(dcm_path)
-        
-        # 1. Estrarre un valore rappresentativo per il RAGGIO
-        # Usiamo la media dell'intensità dei pixel. 
-        # Più il tessuto è denso (bianco), più grande diventa la sfera.
-        if hasattr(ds, 'PixelData'):
-            pixel_array = ds.pixel_array
-            # Calcoliamo la media, normalizziamo per avere valori tra 10 e 20 circa
-            avg_intensity = np.mean(pixel_array)
-            # Formula empirica per adattare i valori DICOM (spesso 0-4096) alla scala Unity
-            radius_proxy = 10.0 + (avg_intensity / 50.0) 
-        else:
-            radius_proxy = 14.0 # Fallback
-
-        # 2. Estrarre Texture/Rugosità
-        # Usiamo la deviazione standard (quanto varia l'immagine in quella fetta)
-        if hasattr(ds, 'PixelData'):
-            texture_proxy = np.std(pixel_array)
-        else:
-            texture_proxy = 5.0
-
-        # 3. Diagnosi Simulata (per il colore)
-        # Se c'è un punto molto luminoso (calcificazione/massa), segna come 'M'
-        max_intensity = np.max(pixel_array) if hasattr(ds, 'PixelData') else 0
-        diagnosis = "M" if max_intensity > 2000 else "B" # Soglia fittizia per demo
-
-        # Costruiamo il pacchetto JSON leggero
-        packet = {
-            "id": 1, # ID fisso per il DT
-            "slice_index": str(ds.InstanceNumber) if 'InstanceNumber' in ds else "0",
-            "diagnosis": diagnosis,
-            "radius_mean": float(radius_proxy),
-            "texture_mean": float(texture_proxy)
-        }
+        t1 = time.perf_counter()
+        pixel_array = ds.pixel_array if hasattr(ds, 'PixelData') else None
+        t2 = time.perf_counter()
+        packet = slice_packet(pixel_array, str(ds.InstanceNumber) if 'InstanceNumber' in ds else "0")
+        if timings is not None:
+            timings.update(read=t1 - t0, decode=t2 - t1, reduce=time.perf_counter() - t2)
         return packet
 
     except Exception as e:
-        print(f"⚠️ Errore lettura slice {dcm_path}: {e}")
+        log.warning(f"⚠️ Errore lettura slice {dcm_path}: {e}")
         return None
 
-def run_player():
+def _decode_slice(raw):
+    # Nel pool: decodifica dai bytes già letti dallo stadio di lettura (nessun I/O nei processi)
+    timings = {}
+    return process_slice_for_unity(io.BytesIO(raw), timings), timings
+
+def player_metrics():
+    """Registro delle metriche del player (fasi DICOM + invio)"""
+    registry = MetricsRegistry("dicom_")
+    for stage in ("io", "read", "decode", "reduce", "serialize", "pixels"):
+        registry.histogram("stage_seconds", "Tempo per fase di elaborazione di una slice", {"stage": stage})
+    registry.histogram("send_seconds", "Durata di socket.send per pacchetto")
+    registry.histogram("lag_seconds", "Ritardo dell'invio rispetto alla scadenza della slice")
+    registry.counter("messages", "Pacchetti inviati")
+    registry.counter("bytes", "Byte inviati")
+    registry.counter("underruns", "Slice non pronte alla scadenza (estrazione in ritardo)")
+    registry.counter("pixel_messages", "Messaggi multipart di pixel/ROI/maschere inviati")
+    registry.counter("pixel_bytes", "Byte di pixel inviati (dopo l'eventuale compressione)")
+    return registry
+
+# --- PIPELINE A STADI: LETTURA -> ESTRAZIONE -> PUBBLICAZIONE ---
+# Lettura da disco ed estrazione girano su thread propri e riempiono code
+# limitate (prefetch): chi pubblica trova la slice già pronta e procede a
+# scadenze fisse, senza sommare il tempo di decodifica all'intervallo.
+# Code piene = gli stadi a monte si fermano (backpressure, memoria limitata).
+# L'estrazione usa un pool di processi: in coda vanno i Future nell'ordine
+# della serie, quindi le slice restano ordinate anche se decodificate in parallelo.
+_END = object()
+
+class SlicePipeline:
+    def __init__(self, files, cached=None, workers=None, prefetch=PREFETCH, metrics=None):
+        """cached: percorso -> pacchetto già in cache (queste slice non vengono rilette)"""
+        self.files = files
+        self.cached = cached or {}
+        self.read_queue = queue.Queue(prefetch)
+        self.ready_queue = queue.Queue(prefetch)
+        missing = sum(1 for f in files if f not in self.cached)
+        self.pool = ProcessPoolExecutor(max_workers=workers) if missing else None
+        self.extracted = []  # (percorso, pacchetto) decodificati ora, da salvare in cache
+        self.stop_event = threading.Event()
+        self.metrics = metrics
+        self.threads = [threading.Thread(target=self._reader, daemon=True),
+                        threading.Thread(target=self._extractor, daemon=True)]
+        if metrics:
+            metrics.gauge("prefetch_depth", "Slice pronte in coda", fn=self.ready_queue.qsize)
+
+    def _observe(self, stage, seconds):
+        if self.metrics:
+            self.metrics.histogram("stage_seconds", labels={"stage": stage}).observe(seconds)
+
+    def _put(self, q, item):
+        # put bloccante ma interrompibile da close()
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    def _reader(self):
+        for file_path in self.files:
+            if file_path in self.cached:
+                item = (file_path, self.cached[file_path], None)
+            else:
+                t0 = time.perf_counter()
+                try:
+                    with open(file_path, "rb") as f:
+                        raw = f.read()
+                except OSError as e:
+                    log.warning(f"⚠️ Errore lettura slice {file_path}: {e}")
+                    raw = None
+                self._observe("io", time.perf_counter() - t0)
+                item = (file_path, None, raw)
+            if not self._put(self.read_queue, item):
+                return
+        self._put(self.read_queue, _END)
+
+    def _extractor(self):
+        while True:
+            item = self._get(self.read_queue)
+            if item is _END:
+                self._put(self.ready_queue, _END)
+                return
+            file_path, packet, raw = item
+            if raw is not None:
+                packet = self.pool.submit(_decode_slice, raw)
+            if not self._put(self.ready_queue, (file_path, packet)):
+                return
+
+    def __iter__(self):
+        for thread in self.threads:
+            thread.start()
+        while True:
+            item = self._get(self.ready_queue)
+            if item is _END:
+                return
+            file_path, packet = item
+            if isinstance(packet, Future):
+                packet, timings = packet.result()
+                for stage, seconds in timings.items():
+                    self._observe(stage, seconds)
+                self.extracted.append((file_path, packet))
+            if packet is not None:
+                yield packet
+
+    def close(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            if thread.is_alive():
+                thread.join()
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+
+def volume_packets(volume, meta, reverse=False, min_lesion_radius=1.0):
+    """
+    Pacchetti calcolati sul volume mappato (nessuna decodifica DICOM):
+    estrattore a batch su tutto lo stack, con metriche 3D delle lesioni.
+    Restituisce (pacchetti, lesioni).
+    """
+    features = extract_volume_features(volume, meta, min_radius_mm=min_lesion_radius)
+    for lesion in features["lesions"]:
+        log.info(f"🎯 Lesione {lesion['label']}: {lesion['volume_mm3']} mm³ | r_eq {lesion['equivalent_radius_mm']} mm")
+    packets = features["slices"]
+    if reverse:
+        packets.reverse()
+    return packets, features["lesions"]
+
+def _save_extracted(pipeline, cache):
+    """Salva in cache le slice decodificate durante lo streaming"""
+    if cache and pipeline.extracted:
+        for file_path, packet in pipeline.extracted:
+            cache.put(file_path, packet)
+        cache.commit()
+        pipeline.extracted = []
+
+def run_player(workers=None, cache_file=DEFAULT_CACHE_FILE,
+               series_uid=None, catalog_file=DEFAULT_CATALOG_FILE, rescan=False,
+               volume_dir=None, reverse=False, min_lesion_radius=1.0, codec="json",
+               metrics_port=None, rate=SLICE_RATE, prefetch=PREFETCH, sndhwm=None, conflate=False,
+               pixels=(), pixel_step=1, pixel_compression="none", pixel_port=ZMQ_PIXEL_PORT):
+    # 0. METRICHE (endpoint /metrics opzionale)
+    metrics = player_metrics()
+    if metrics_port:
+        serve_metrics(metrics, metrics_port)
+        log.info(f"📈 Metriche su http://0.0.0.0:{metrics_port}/metrics")
+    m_serialize = metrics.histogram("stage_seconds", labels={"stage": "serialize"})
+    m_send = metrics.histogram("send_seconds")
+    m_lag = metrics.histogram("lag_seconds")
+    m_messages = metrics.counter("messages")
+    m_bytes = metrics.counter("bytes")
+    m_underruns = metrics.counter("underruns")
+    m_pixels = metrics.histogram("stage_seconds", labels={"stage": "pixels"})
+    m_pixel_messages = metrics.counter("pixel_messages")
+    m_pixel_bytes = metrics.counter("pixel_bytes")
+
     # 1. SETUP RETE
+    encoder = WireEncoder(codec, "dicom_slice")
     context = zmq.Context()
     socket = context.socket(zmq.PUB)
+    if sndhwm is not None:
+        # Limite della coda di uscita per iscritto: oltre, ZeroMQ scarta (PUB non blocca)
+        socket.setsockopt(zmq.SNDHWM, sndhwm)
+    if conflate:
+        # Solo l'ultima slice in coda per iscritto: chi vuole lo stato corrente non legge slice vecchie
+        socket.setsockopt(zmq.CONFLATE, 1)
     socket.bind(f"tcp://0.0.0.0:{ZMQ_PORT}")
-    print(f"🚀 [Edge Node] Pronto su porta {ZMQ_PORT}")
+    log.info(f"🚀 [Edge Node] Pronto su porta {ZMQ_PORT}")
 
     # 2. TROVA I FILE
-    files = find_dicom_series(DATASET_ROOT)
+    if catalog_file:
+        files = select_series(series_uid, catalog_file, rescan)
+    else:
+        files = find_dicom_series(DATASET_ROOT)
     
     if not files:
         return
 
-    print("▶️ Avvio streaming della scansione DICOM al Digital Twin...")
-    print("   (Premi Ctrl+C per interrompere)")
+    # 3. ESTRAZIONE
+    cache = None
+    pipeline = None
+    pixel_streamer = None
+    if volume_dir:
+        # Serie convertita una volta in volume mappato: le slice sono viste zero-copy
+        try:
+            volume, meta = VolumeStore(volume_dir).get_or_build(files, series_uid)
+        except ValueError as e:
+            log.error(f"❌ Volume non costruibile: {e}")
+            return
+        if meta.get("skipped"):
+            log.warning(f"⚠️ {len(meta['skipped'])} slice scartate dal volume (illeggibili o di forma diversa)")
+        source, lesions = volume_packets(volume, meta, reverse, min_lesion_radius)
+        slice_order = list(range(volume.shape[0]))
+        if reverse:
+            slice_order.reverse()
+        if pixels:
+            # Pixel/ROI/maschere come multipart su una porta dedicata
+            pixel_streamer = PixelStreamer(pixel_socket(context, pixel_port, sndhwm), volume, meta,
+                                           pixels, pixel_step, pixel_compression, lesions)
+            log.info(f"🖼️ Pixel ({', '.join(pixels)}) su porta {pixel_port} | riduzione 1/{pixel_step} | "
+                     f"compressione {pixel_compression}")
+    else:
+        # Pipeline a stadi: lo streaming parte subito, la decodifica avanza in anticipo
+        if reverse:
+            files = files[::-1]
+        cached = {}
+        if cache_file:
+            cache = SliceFeatureCache(cache_file, version=PACKET_VERSION)
+            for file_path in files:
+                found, packet = cache.get(file_path)
+                if found:
+                    cached[file_path] = packet
+            log.info(f"🗃️ Cache feature: {cache.hits} hit, {cache.misses} miss")
+        pipeline = SlicePipeline(files, cached, workers, prefetch, metrics)
+        source = pipeline
+
+    log.info(f"▶️ Avvio streaming della scansione DICOM al Digital Twin ({rate:g} slice/s)...")
+    log.info("   (Premi Ctrl+C per interrompere)")
 
+    packets = []  # Dopo il primo passaggio le slice si ripetono dalla memoria
+    pacer = Pacer(rate)
     try:
         # Loop infinito: quando finisce la scansione, ricomincia (effetto loop)
         while True:
-            for file_path in files:
+            for k, data in enumerate(source):
                 # EDGE PROCESSING: Da 500KB di immagine a 100 Byte di JSON
-                data = process_slice_for_unity(file_path)
-                
-                if data:
-                    socket.send_string(json.dumps(data))
-                    print(f"📡 Slice {data['slice_index']} -> R: {data['radius_mean']:.2f} | D: {data['diagnosis']}")
-                
-                # Simuliamo la velocità della macchina (es. 10 slice al secondo)
-                time.sleep(0.1) 
-            
-            print("🔄 Scansione completata. Riavvio loop...")
+                # (estratto dagli stadi a monte: qui si invia solo il pacchetto)
+                t0 = time.perf_counter()
+                if pacer.period:
+                    # Senza cadenza (--rate 0) non c'è scadenza: nessun ritardo da misurare
+                    lag = t0 - pacer.next_deadline
+                    m_lag.observe(max(lag, 0.0))
+                    if lag > pacer.period / 2:
+                        m_underruns.inc()
+                payload = encoder.encode(data)
+                t1 = time.perf_counter()
+                socket.send(payload)
+                m_serialize.observe(t1 - t0)
+                m_send.observe(time.perf_counter() - t1)
+                m_messages.inc()
+                m_bytes.inc(len(payload))
+                if pixel_streamer:
+                    t2 = time.perf_counter()
+                    count, size = pixel_streamer.send_slice(slice_order[k])
+                    m_pixels.observe(time.perf_counter() - t2)
+                    m_pixel_messages.inc(count)
+                    m_pixel_bytes.inc(size)
+                log.debug(f"📡 Slice {data['slice_index']} -> R: {data['radius_mean']:.2f} | D: {data['diagnosis']}")
+                if source is pipeline:
+                    packets.append(data)
+
+                # Scadenze assolute alla velocità della macchina (es. 10 slice al secondo)
+                pacer.wait()
+
+            if source is pipeline:
+                _save_extracted(pipeline, cache)
+                pipeline.close()
+                source = packets
+            log.info("🔄 Scansione completata. Riavvio loop...")
             time.sleep(1)
+            pacer = Pacer(rate)
 
     except KeyboardInterrupt:
-        print("\n⏹️ Stop.")
+        log.info("\n⏹️ Stop.")
+    finally:
+        if source is pipeline:
+            pipeline.close()
+            _save_extracted(pipeline, cache)
+        if cache:
+            cache.close()
         socket.close()
+        if pixel_streamer:
+            pixel_streamer.socket.close()
 
 if __name__ == "__main__":
-    run_player()
+    parser = argparse.ArgumentParser(description="DICOM Player per il Digital Twin")
+    parser.add_argument("--workers", type=int, default=None, help="Processi per l'estrazione (default: tutti i core)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help="File SQLite della cache feature")
+    parser.add_argument("--no-cache", action="store_true", help="Disabilita la cache su disco")
+    parser.add_argument("--series", default=None, help="SeriesInstanceUID da riprodurre (default: la prima)")
+    parser.add_argument("--catalog", default=DEFAULT_CATALOG_FILE, help="File SQLite del catalogo serie")
+    parser.add_argument("--rescan", action="store_true", help="Aggiorna il catalogo prima di partire")
+    parser.add_argument("--list", action="store_true", help="Elenca le serie del catalogo ed esce")
+    parser.add_argument("--no-catalog", action="store_true", help="Usa la prima cartella con .dcm (vecchio comportamento)")
+    parser.add_argument("--volume-dir", default=None, help="Converte la serie in un volume .npy mappato in questa cartella")
+    parser.add_argument("--reverse", action="store_true", help="Riproduce la serie al contrario")
+    parser.add_argument("--codec", choices=CODECS, default="json", help="Formato di trasporto dei pacchetti")
+    parser.add_argument("--min-lesion-radius", type=float, default=1.0, help="Raggio equivalente minimo (mm) per la diagnosi 'M' (con --volume-dir)")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Porta HTTP per /metrics (formato Prometheus)")
+    parser.add_argument("--rate", type=float, default=SLICE_RATE, help="Slice al secondo (0 = senza limiti)")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH, help="Slice in anticipo per stadio della pipeline")
+    parser.add_argument("--sndhwm", type=int, default=None, help="High-water mark ZeroMQ di uscita (messaggi per iscritto)")
+    parser.add_argument("--conflate", action="store_true", help="Tiene in coda solo l'ultima slice per iscritto (ZMQ_CONFLATE)")
+    parser.add_argument("--pixels", default="", help=f"Invia anche i pixel (con --volume-dir): {','.join(PIXEL_KINDS)}")
+    parser.add_argument("--pixel-step", type=int, default=1, help="Riduzione delle immagini (1 = risoluzione piena)")
+    parser.add_argument("--pixel-compression", choices=COMPRESSIONS, default="none", help="Compressione dei buffer di pixel")
+    parser.add_argument("--pixel-port", type=int, default=ZMQ_PIXEL_PORT, help="Porta ZeroMQ dello stream di pixel")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG mostra ogni slice inviata")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    pixels = tuple(k for k in args.pixels.split(",") if k)
+    if pixels and not args.volume_dir:
+        parser.error("--pixels richiede --volume-dir (le slice vengono lette dal volume mappato)")
+
+    if args.list:
+        catalog = DicomCatalog(args.catalog)
+        if args.rescan or catalog.is_empty():
+            catalog.scan(DATASET_ROOT)
+        for s in catalog.list_series():
+            print(f"{s['patient_id']} | {s['series_uid']} | {s['modality']} | {s['num_slices']} slice")
+        catalog.close()
+    else:
+        run_player(workers=args.workers, cache_file=None if args.no_cache else args.cache,
+                   series_uid=args.series, catalog_file=None if args.no_catalog else args.catalog,
+                   rescan=args.rescan, volume_dir=args.volume_dir, reverse=args.reverse,
+                   min_lesion_radius=args.min_lesion_radius, codec=args.codec,
+                   metrics_port=args.metrics_port, rate=args.rate, prefetch=args.prefetch,
+                   sndhwm=args.sndhwm, conflate=args.conflate, pixels=pixels, pixel_step=args.pixel_step,
+                   pixel_compression=args.pixel_compression, pixel_port=args.pixel_port)
@@ -0,0 +1,142 @@
+import os
+import json
+import logging
+import numpy as np
+import pydicom
+
+# --- VOLUME 3D MEMORY-MAPPED PER SERIE DICOM ---
+# Una serie viene convertita UNA volta in un array contiguo .npy (Z, Y, X)
+# più un piccolo sidecar JSON (spacing, orientamento, rescale, posizioni).
+# Le letture successive sono viste zero-copy sul file mappato in memoria:
+# accesso casuale, riproduzione al contrario e loop multipli diventano letture
+# dalla page cache, e la memoria residente non cresce con la dimensione dello studio.
+SIDECAR_VERSION = 1
+
+log = logging.getLogger("dicom_volume")
+
+
+def _file_signature(path):
+    st = os.stat(path)
+    return [os.path.basename(path), st.st_mtime_ns, st.st_size]
+
+
+def _slice_pixels(ds):
+    """Pixel di una slice: solo immagini 2D a un canale (niente multi-frame o RGB)"""
+    pixels = ds.pixel_array
+    if pixels.ndim != 2:
+        raise ValueError(f"slice non 2D, forma {pixels.shape} (multi-frame o RGB non supportati)")
+    return pixels
+
+
+def build_volume(files, npy_path):
+    """
+    Decodifica le slice (già ordinate) e le scrive in un .npy mappato + sidecar JSON.
+    Le slice illeggibili, non 2D o di forma diversa dalla prima valida vengono
+    scartate (come nella riproduzione file per file) ed elencate in meta["skipped"].
+    """
+    first = volume = None
+    positions = []
+    instance_numbers = []
+    skipped = []
+    for path in files:
+        try:
+            ds = pydicom.dcmread(path)
+            pixels = _slice_pixels(ds)
+            if volume is not None and pixels.shape != volume.shape[1:]:
+                raise ValueError(f"forma {pixels.shape} diversa dalla serie {volume.shape[1:]}")
+        except Exception as e:
+            log.warning(f"⚠️ Slice scartata {path}: {e}")
+            skipped.append(os.path.basename(path))
+            continue
+        if volume is None:
+            # La prima slice valida fissa forma e tipo del volume
+            first = ds
+            volume = np.lib.format.open_memmap(npy_path, mode="w+", dtype=pixels.dtype,
+                                               shape=(len(files),) + pixels.shape)
+        volume[len(positions)] = pixels
+        positions.append([float(v) for v in ds.ImagePositionPatient] if "ImagePositionPatient" in ds else None)
+        instance_numbers.append(str(ds.InstanceNumber) if "InstanceNumber" in ds else "0")
+    if volume is None:
+        raise ValueError(f"Nessuna slice leggibile nella serie ({len(files)} file)")
+    _, rows, columns = volume.shape
+    dtype = volume.dtype
+    volume.flush()
+    if skipped:
+        # Il volume era dimensionato su tutti i file: si riscrive con le sole slice valide
+        tmp_path = npy_path + ".tmp.npy"
+        compact = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(len(positions), rows, columns))
+        compact[:] = volume[:len(positions)]
+        compact.flush()
+        del compact
+        del volume
+        os.replace(tmp_path, npy_path)
+    else:
+        del volume
+
+    # Spacing tra le slice dalle posizioni reali (fallback: SliceThickness)
+    slice_spacing = float(first.get("SliceThickness", 1.0) or 1.0)
+    if len(positions) > 1 and positions[0] is not None and positions[-1] is not None:
+        span = np.linalg.norm(np.subtract(positions[-1], positions[0]))
+        if span > 0:
+            slice_spacing = float(span / (len(positions) - 1))
+
+    meta = {
+        "version": SIDECAR_VERSION,
+        "series_uid": str(first.get("SeriesInstanceUID", "")),
+        "patient_id": str(first.get("PatientID", "")),
+        "shape": [len(positions), rows, columns],
+        "dtype": str(dtype),
+        "pixel_spacing": [float(v) for v in first.PixelSpacing] if "PixelSpacing" in first else [1.0, 1.0],
+        "slice_spacing": slice_spacing,
+        "orientation": [float(v) for v in first.ImageOrientationPatient] if "ImageOrientationPatient" in first else None,
+        "rescale_slope": float(first.get("RescaleSlope", 1.0)),
+        "rescale_intercept": float(first.get("RescaleIntercept", 0.0)),
+        "positions": positions,
+        "instance_numbers": instance_numbers,
+        "source_dir": os.path.dirname(files[0]),
+        "sources": [_file_signature(f) for f in files],
+        "skipped": skipped,
+    }
+    with open(sidecar_path(npy_path), "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def sidecar_path(npy_path):
+    return os.path.splitext(npy_path)[0] + ".json"
+
+
+def load_volume(npy_path):
+    """Restituisce (volume memory-mapped in sola lettura, metadati)"""
+    with open(sidecar_path(npy_path)) as f:
+        meta = json.load(f)
+    return np.load(npy_path, mmap_mode="r"), meta
+
+
+class VolumeStore:
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(root_dir, exist_ok=True)
+
+    def path_for(self, series_uid):
+        return os.path.join(self.root_dir, f"{series_uid}.npy")
+
+    def is_fresh(self, npy_path, files):
+        """Il volume è valido se i file sorgente sono gli stessi (nome, mtime, dimensione)"""
+        if not (os.path.exists(npy_path) and os.path.exists(sidecar_path(npy_path))):
+            return False
+        with open(sidecar_path(npy_path)) as f:
+            meta = json.load(f)
+        try:
+            return meta.get("version") == SIDECAR_VERSION and meta["sources"] == [_file_signature(p) for p in files]
+        except OSError:
+            return False
+
+    def get_or_build(self, files, series_uid=None):
+        if series_uid is None:
+            series_uid = str(pydicom.dcmread(files[0], stop_before_pixels=True).get("SeriesInstanceUID", "series"))
+        npy_path = self.path_for(series_uid)
+        if not self.is_fresh(npy_path, files):
+            log.info(f"🧊 Conversione serie in volume mappato: {npy_path}")
+            build_volume(files, npy_path)
+        return load_volume(npy_path)
@@ -0,0 +1,78 @@
+import os
+import json
+import logging
+import sqlite3
+
+# --- CACHE PERSISTENTE DELLE FEATURE PER SLICE ---
+# Il pacchetto estratto da ogni file DICOM viene salvato su disco (SQLite),
+# indicizzato per percorso + mtime + dimensione: se il file non cambia,
+# i passaggi successivi e i riavvii non toccano più i pixel.
+# version (PRAGMA user_version) identifica l'estrattore che ha prodotto i
+# pacchetti: se cambia, tutte le voci (anche i fallimenti) sono da rifare.
+DEFAULT_CACHE_FILE = "dicom_features.sqlite"
+
+log = logging.getLogger("feature_cache")
+
+class SliceFeatureCache:
+    def __init__(self, db_path=DEFAULT_CACHE_FILE, version=0):
+        self.db_path = db_path
+        self.version = version
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS slice_features ("
+            " path TEXT PRIMARY KEY,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " packet TEXT)"
+        )
+        stored = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if stored != version:
+            dropped = self.conn.execute("DELETE FROM slice_features").rowcount
+            if dropped:
+                log.info(f"🗃️ Cache feature di un altro estrattore (v{stored} -> v{version}): {dropped} voci scartate")
+            self.conn.execute(f"PRAGMA user_version = {int(version)}")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def file_key(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, path):
+        """
+        Restituisce (trovato, pacchetto). Il pacchetto può essere None se la
+        slice era illeggibile: anche il fallimento viene ricordato.
+        """
+        try:
+            mtime_ns, size = self.file_key(path)
+        except OSError:
+            return False, None
+        row = self.conn.execute(
+            "SELECT mtime_ns, size, packet FROM slice_features WHERE path = ?", (path,)
+        ).fetchone()
+        if row is None or row[0] != mtime_ns or row[1] != size:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, (json.loads(row[2]) if row[2] is not None else None)
+
+    def put(self, path, packet):
+        """Salva il pacchetto; False (e nessuna voce) se il file non esiste più"""
+        try:
+            mtime_ns, size = self.file_key(path)
+        except OSError:
+            return False
+        self.conn.execute(
+            "INSERT OR REPLACE INTO slice_features (path, mtime_ns, size, packet) VALUES (?, ?, ?, ?)",
+            (path, mtime_ns, size, json.dumps(packet) if packet is not None else None)
+        )
+        return True
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,177 @@
+import time
+import asyncio
+import logging
+import grpc
+from grpc import aio
+
+log = logging.getLogger("grpc_hub")
+
+# --- DIFFUSIONE gRPC: UN PRODUTTORE, N ISCRITTI ---
+# Un solo produttore codifica ogni pacchetto UNA volta (bytes Protobuf già
+# serializzati) e lo mette nella coda limitata di ogni iscritto. GetBioStream è
+# un handler generico a bytes grezzi su grpc.aio: nessun thread per client,
+# nessun limite di max_workers, nessuna ri-serializzazione per stream.
+# Iscritti lenti (coda piena):
+#   drop_oldest -> si scarta il pacchetto più vecchio della loro coda
+#   disconnect  -> lo stream viene chiuso con RESOURCE_EXHAUSTED
+POLICIES = ("drop_oldest", "disconnect")
+DEFAULT_QUEUE_SIZE = 64
+SERVICE_NAME = "BioService"
+METHOD_NAME = "GetBioStream"
+
+_CLOSED = object()  # Segnale di fine stream nella coda di un iscritto
+
+
+class Subscriber:
+    def __init__(self, queue_size, peer=""):
+        self.queue = asyncio.Queue(queue_size)
+        self.peer = peer
+        self.dropped = 0
+        self.disconnected = False
+
+
+class BroadcastHub:
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE, policy="drop_oldest", metrics=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Politica sconosciuta: {policy} (disponibili: {', '.join(POLICIES)})")
+        self.queue_size = queue_size
+        self.policy = policy
+        self.subscribers = set()
+        self.has_subscribers = asyncio.Event()
+        self.has_space = asyncio.Event()  # Un iscritto ha consumato dalla sua coda (o gli iscritti sono cambiati)
+        self.published = 0
+
+        # METRICHE (registro opzionale, es. quello di BioSender)
+        self.m_dropped = self.m_disconnected = None
+        if metrics is not None:
+            metrics.gauge("grpc_subscribers", "Stream gRPC attivi", fn=lambda: len(self.subscribers))
+            self.m_dropped = metrics.counter("grpc_dropped", "Pacchetti scartati per iscritti lenti")
+            self.m_disconnected = metrics.counter("grpc_disconnected", "Iscritti lenti disconnessi")
+
+    def subscribe(self, peer=""):
+        subscriber = Subscriber(self.queue_size, peer)
+        self.subscribers.add(subscriber)
+        self.has_subscribers.set()
+        self.has_space.set()  # Il nuovo iscritto ha la coda vuota: sblocca il produttore a rate 0
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            self.has_subscribers.clear()
+        self.has_space.set()  # Se se ne va l'unico iscritto pieno, il produttore non deve restare fermo
+
+    def _disconnect(self, subscriber):
+        subscriber.disconnected = True
+        self.unsubscribe(subscriber)
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(_CLOSED)
+        if self.m_disconnected is not None:
+            self.m_disconnected.inc()
+        log.warning(f"🐢 Client gRPC troppo lento, disconnesso: {subscriber.peer}")
+
+    def publish(self, payload):
+        """Consegna lo stesso oggetto bytes a tutte le code (nessuna copia)"""
+        self.published += 1
+        for subscriber in list(self.subscribers):
+            queue = subscriber.queue
+            if queue.full():
+                if self.policy == "disconnect":
+                    self._disconnect(subscriber)
+                    continue
+                queue.get_nowait()
+                subscriber.dropped += 1
+                if self.m_dropped is not None:
+                    self.m_dropped.inc()
+            queue.put_nowait(payload)
+
+    def all_full(self):
+        return all(s.queue.full() for s in self.subscribers)
+
+    async def stream(self, subscriber):
+        while True:
+            payload = await subscriber.queue.get()
+            self.has_space.set()
+            if payload is _CLOSED:
+                return
+            yield payload
+
+    def close(self):
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber)
+            while not subscriber.queue.empty():
+                subscriber.queue.get_nowait()
+            subscriber.queue.put_nowait(_CLOSED)
+
+
+async def produce(hub, next_payload, rate, on_published=None):
+    """
+    Produttore unico a scadenze assolute (come Pacer, ma senza bloccare il loop).
+    Senza iscritti resta fermo: nessuna codifica se nessuno guarda.
+    """
+    period = 1.0 / rate if rate and rate > 0 else 0.0
+    i = 0
+    next_deadline = time.perf_counter()
+    while True:
+        if not hub.subscribers:
+            await hub.has_subscribers.wait()
+            next_deadline = time.perf_counter()
+        payload = next_payload(i)
+        hub.publish(payload)
+        if on_published is not None:
+            on_published(i, payload)
+        i += 1
+        if period == 0.0:
+            # Senza cadenza si va al passo dell'iscritto più veloce invece di girare a vuoto scartando
+            while hub.subscribers and hub.all_full():
+                hub.has_space.clear()
+                await hub.has_space.wait()
+            await asyncio.sleep(0)
+            continue
+        next_deadline += period
+        delay = next_deadline - time.perf_counter()
+        if delay < -period:
+            # Troppo in ritardo: si riparte da adesso invece di recuperare a raffica
+            next_deadline = time.perf_counter()
+        await asyncio.sleep(max(delay, 0))
+
+
+def stream_handler(hub, service_name=SERVICE_NAME, method_name=METHOD_NAME, on_sent=None):
+    """Handler generico a bytes grezzi (stesso metodo di BioService, nessuno stub protoc)"""
+    async def get_bio_stream(request, context):
+        subscriber = hub.subscribe(context.peer())
+        log.info(f"🔗 Client connesso allo stream gRPC: {subscriber.peer} ({len(hub.subscribers)} attivi)")
+        try:
+            async for payload in hub.stream(subscriber):
+                started = time.perf_counter()
+                yield payload
+                if on_sent is not None:
+                    on_sent(len(payload), started)
+            if subscriber.disconnected:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Client troppo lento per lo stream")
+        finally:
+            hub.unsubscribe(subscriber)
+            log.info(f"🔌 Client disconnesso: {subscriber.peer} ({len(hub.subscribers)} attivi)")
+
+    return grpc.method_handlers_generic_handler(service_name, {
+        method_name: grpc.unary_stream_rpc_method_handler(get_bio_stream)
+    })
+
+
+async def serve(hub, next_payload, rate, address, service_name=SERVICE_NAME,
+                on_published=None, on_sent=None, started=None):
+    """Avvia server aio e produttore; started (asyncio.Future) riceve la porta effettiva"""
+    server = aio.server()
+    server.add_generic_rpc_handlers((stream_handler(hub, service_name, on_sent=on_sent),))
+    port = server.add_insecure_port(address)
+    await server.start()
+    if started is not None:
+        started.set_result(port)
+    producer = asyncio.create_task(produce(hub, next_payload, rate, on_published))
+    try:
+        await server.wait_for_termination()
+    finally:
+        producer.cancel()
+        hub.close()
+        await server.stop(0)
@@ -0,0 +1,208 @@
+import time
+import bisect
+import threading
+
+# --- METRICHE DEL PERCORSO CRITICO ---
+# Contatori, gauge e istogrammi a bucket fissi, esposti in formato testo
+# Prometheus (GET /metrics) e come dizionario per un topic di statistiche.
+# Aggiornarli costa un'addizione o una bisect: nessun lock sul percorso caldo
+# (sotto il GIL, con un solo thread scrittore per metrica, i valori sono esatti).
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name + "_total" + _label_text(labels), self.value
+
+
+class Gauge:
+    """Valore istantaneo; con fn il valore viene letto al momento dell'esportazione"""
+    kind = "gauge"
+
+    def __init__(self, fn=None):
+        self.value = 0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception:
+            return float("nan")
+
+    def samples(self, name, labels):
+        yield name + _label_text(labels), self.get()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Ultimo = +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def time(self):
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Stima dai bucket (limite superiore del bucket che contiene il quantile)"""
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += n
+            if cumulative >= target:
+                return bound if bound != float("inf") else self.buckets[-1]
+        return self.buckets[-1]
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield name + "_bucket" + _label_text(labels + (("le", repr(bound)),)), cumulative
+        yield name + "_bucket" + _label_text(labels + (("le", "+Inf"),)), self.count
+        yield name + "_sum" + _label_text(labels), self.sum
+        yield name + "_count" + _label_text(labels), self.count
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class MetricsRegistry:
+    def __init__(self, prefix=""):
+        self.prefix = prefix
+        self.metrics = {}  # (nome, etichette) -> metrica
+        self.help = {}
+        self.lock = threading.Lock()  # Solo per la registrazione, non per gli aggiornamenti
+        self.last_snapshot = (time.time(), {})
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        name = self.prefix + name
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            if key not in self.metrics:
+                self.metrics[key] = cls(**kwargs)
+                self.help.setdefault(name, help_text)
+            return self.metrics[key]
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None, fn=None):
+        gauge = self._get(Gauge, name, help_text, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, help_text="", labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Formato di esposizione testuale di Prometheus"""
+        lines = []
+        seen = set()
+        with self.lock:
+            items = sorted(self.metrics.items(), key=lambda kv: kv[0])
+        for (name, labels), metric in items:
+            if name not in seen:
+                seen.add(name)
+                family = name + "_total" if metric.kind == "counter" else name
+                if self.help.get(name):
+                    lines.append(f"# HELP {family} {self.help[name]}")
+                lines.append(f"# TYPE {family} {metric.kind}")
+            for sample, value in metric.samples(name, labels):
+                lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """
+        Riepilogo compatto per il topic di statistiche: valori dei gauge,
+        totali e rate al secondo dei contatori (dall'ultimo snapshot),
+        count / media / p50 / p99 degli istogrammi.
+        """
+        now = time.time()
+        last_time, last_totals = self.last_snapshot
+        interval = max(now - last_time, 1e-9)
+        with self.lock:
+            items = list(self.metrics.items())
+        stats, totals = {}, {}
+        for (name, labels), metric in items:
+            key = name + _label_text(labels)
+            if metric.kind == "counter":
+                totals[key] = metric.value
+                stats[key] = {"total": metric.value,
+                              "rate": round((metric.value - last_totals.get(key, 0)) / interval, 3)}
+            elif metric.kind == "gauge":
+                stats[key] = metric.get()
+            else:
+                stats[key] = {
+                    "count": metric.count,
+                    "mean": round(metric.sum / metric.count, 6) if metric.count else None,
+                    "p50": metric.quantile(0.5),
+                    "p99": metric.quantile(0.99),
+                }
+        self.last_snapshot = (now, totals)
+        return {"timestamp": now, "interval": round(interval, 3), "metrics": stats}
+
+
+# --- ENDPOINT HTTP ---
+def serve_metrics(registry, port, host="0.0.0.0"):
+    """Espone GET /metrics su un thread daemon; restituisce il server (shutdown() per fermarlo)"""
+    # Importato qui: http.server pesa sull'avvio di chi non espone l'endpoint
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # Niente log per ogni scrape
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,179 @@
+import asyncio
+import argparse
+import threading
+import paho.mqtt.client as mqtt
+
+# --- BROKER MQTT MINIMALE (SOLO PER TEST E BENCHMARK IN LOCALE) ---
+# MQTT 3.1.1, QoS 0 (le PUBLISH QoS 1 ricevono il PUBACK ma sono inoltrate a QoS 0),
+# messaggi trattenuti supportati. Nessuna autenticazione, nessuna persistenza:
+# serve a misurare i protocolli senza dipendere da un broker esterno.
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+WRITE_HIGH_WATER = 1 << 20  # Oltre 1 MB in coda verso un client si attende lo svuotamento
+
+
+def _encode_length(length):
+    out = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        out.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(out)
+
+
+def _publish_packet(topic, payload, retain=False):
+    topic_bytes = topic.encode()
+    body = len(topic_bytes).to_bytes(2, "big") + topic_bytes + payload
+    return bytes([(PUBLISH << 4) | (1 if retain else 0)]) + _encode_length(len(body)) + body
+
+
+class MiniBroker:
+    def __init__(self, host="127.0.0.1", port=1883):
+        self.host = host
+        self.port = port
+        self.subscriptions = {}  # writer -> set di filtri
+        self.retained = {}       # topic -> payload
+        self.loop = None
+        self.server = None
+        self.ready = threading.Event()
+        self.messages_in = 0
+        self.messages_out = 0
+
+    # --- CICLO DI VITA ---
+    def start(self):
+        """Avvia il broker in un thread dedicato (con il suo event loop)"""
+        thread = threading.Thread(target=self._thread_main, daemon=True)
+        thread.start()
+        self.ready.wait()
+        return self
+
+    def _thread_main(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self._handle_client, self.host, self.port)
+        )
+        self.port = self.server.sockets[0].getsockname()[1]  # Utile con port=0
+        self.ready.set()
+        self.loop.run_forever()
+
+    def stop(self):
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _shutdown(self):
+        self.server.close()
+        for writer in list(self.subscriptions):
+            writer.close()
+        # Chiusi i socket, ogni _handle_client termina da solo (IncompleteReadError)
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=1.0)
+
+    # --- PROTOCOLLO ---
+    async def _read_packet(self, reader):
+        header = await reader.readexactly(1)
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b""
+        return header[0] >> 4, header[0] & 0x0F, body
+
+    async def _send(self, writer, data):
+        writer.write(data)
+        if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+            await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                packet_type, flags, body = await self._read_packet(reader)
+
+                if packet_type == CONNECT:
+                    writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+
+                elif packet_type == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic_len = int.from_bytes(body[:2], "big")
+                    topic = body[2:2 + topic_len].decode()
+                    offset = 2 + topic_len
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        writer.write(bytes([PUBACK << 4, 2]) + packet_id)
+                    payload = body[offset:]
+                    if flags & 0x01:
+                        if payload:
+                            self.retained[topic] = payload
+                        else:
+                            self.retained.pop(topic, None)
+                    await self._route(topic, payload)
+
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset, granted = body[:2], 2, bytearray()
+                    new_filters = []
+                    while offset < len(body):
+                        flen = int.from_bytes(body[offset:offset + 2], "big")
+                        topic_filter = body[offset + 2:offset + 2 + flen].decode()
+                        offset += 2 + flen + 1
+                        self.subscriptions[writer].add(topic_filter)
+                        new_filters.append(topic_filter)
+                        granted.append(0)
+                    writer.write(bytes([SUBACK << 4]) + _encode_length(2 + len(granted)) + packet_id + bytes(granted))
+                    # Messaggi trattenuti SOLO per i filtri appena sottoscritti
+                    for topic, payload in list(self.retained.items()):
+                        if any(mqtt.topic_matches_sub(f, topic) for f in new_filters):
+                            await self._send(writer, _publish_packet(topic, payload, retain=True))
+
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, offset = body[:2], 2
+                    while offset < len(body):
+                        flen = int.from_bytes(body[offset:offset + 2], "big")
+                        self.subscriptions[writer].discard(body[offset + 2:offset + 2 + flen].decode())
+                        offset += 2 + flen
+                    writer.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+
+                elif packet_type == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+
+                elif packet_type == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            writer.close()
+
+    async def _route(self, topic, payload):
+        self.messages_in += 1
+        packet = None
+        for writer, filters in list(self.subscriptions.items()):
+            if any(mqtt.topic_matches_sub(f, topic) for f in filters):
+                if packet is None:
+                    packet = _publish_packet(topic, payload)
+                self.messages_out += 1
+                await self._send(writer, packet)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broker MQTT minimale per test locali")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    broker = MiniBroker(args.host, args.port).start()
+    print(f"🚀 Broker MQTT locale su {args.host}:{broker.port} (Ctrl+C per uscire)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        broker.stop()
+        print("\n⏹️  Stop broker.")
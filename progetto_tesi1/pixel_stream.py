@@ -0,0 +1,153 @@
+import json
+import zlib
+import numpy as np
+import zmq
+from volume_features import LESION_THRESHOLD
+
+# lz4 opzionale (compressione veloce)
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+# --- STREAMING DI PIXEL / ROI / MASCHERE (ZeroMQ multipart) ---
+# Ogni messaggio ha tre frame:
+#   1. topic ("slice", "roi", "mask"): i SUB filtrano per prefisso
+#   2. intestazione JSON piccola (dtype, shape, compressione, geometria)
+#   3. buffer NumPy grezzo, inviato con copy=False
+# Niente JSON o base64 dei pixel: una slice del volume mappato parte come vista
+# sul file (nessuna copia in Python); ROI e fattori di riduzione creano solo il
+# ritaglio contiguo. Porta separata dal flusso JSON, così i client a frame
+# singolo esistenti non ricevono messaggi multipart.
+ZMQ_PIXEL_PORT = 5556
+PIXEL_KINDS = ("slice", "roi", "mask")
+COMPRESSIONS = ("none", "lz4", "zlib")
+HEADER_VERSION = 1
+
+
+def compress(buffer, method):
+    if method == "none":
+        return buffer
+    if method == "lz4":
+        if lz4 is None:
+            raise RuntimeError("lz4 non installato: pip install lz4 (oppure --pixel-compression zlib)")
+        return lz4.block.compress(buffer, store_size=False)
+    if method == "zlib":
+        return zlib.compress(buffer, 1)
+    raise ValueError(f"Compressione sconosciuta: {method}")
+
+
+def decompress(buffer, method, raw_bytes):
+    if method == "none":
+        return buffer
+    if method == "lz4":
+        if lz4 is None:
+            raise RuntimeError("lz4 non installato: pip install lz4")
+        return lz4.block.decompress(buffer, uncompressed_size=raw_bytes)
+    if method == "zlib":
+        return zlib.decompress(buffer)
+    raise ValueError(f"Compressione sconosciuta: {method}")
+
+
+def encode_frames(kind, array, info=None, compression="none"):
+    """[topic, intestazione, buffer] per un array 2D (il buffer non viene copiato se già contiguo)"""
+    array = np.ascontiguousarray(array)
+    header = {
+        "v": HEADER_VERSION,
+        "kind": kind,
+        "dtype": array.dtype.str,
+        "shape": list(array.shape),
+        "compression": compression,
+        "raw_bytes": array.nbytes,
+    }
+    header.update(info or {})
+    return [kind.encode(), json.dumps(header).encode(), compress(array, compression)]
+
+
+def decode_frames(frames):
+    """
+    (intestazione, array) da un messaggio ricevuto (bytes o zmq.Frame).
+    Senza compressione l'array è una vista in sola lettura sul frame ricevuto.
+    """
+    _, header_frame, data_frame = frames
+    header = json.loads(bytes(getattr(header_frame, "buffer", header_frame)))
+    if header.get("v") != HEADER_VERSION:
+        raise ValueError(f"Versione intestazione non supportata: {header.get('v')}")
+    data = getattr(data_frame, "buffer", data_frame)
+    data = decompress(data, header["compression"], header["raw_bytes"])
+    array = np.frombuffer(data, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+    return header, array
+
+
+def recv_array(socket):
+    """Riceve e decodifica un messaggio (copy=False: niente copie per i buffer non compressi)"""
+    return decode_frames(socket.recv_multipart(copy=False))
+
+
+class PixelStreamer:
+    """
+    Invia le slice del volume mappato come immagini ridotte, ritagli attorno
+    alle lesioni (ROI) o maschere delle lesioni.
+    """
+    def __init__(self, socket, volume, meta, kinds=("slice",), step=1, compression="none",
+                 lesions=None, threshold=LESION_THRESHOLD, roi_margin=8):
+        for kind in kinds:
+            if kind not in PIXEL_KINDS:
+                raise ValueError(f"Tipo sconosciuto: {kind} (disponibili: {', '.join(PIXEL_KINDS)})")
+        compress(b"", compression)  # Errore subito se il metodo non è disponibile
+        self.socket = socket
+        self.volume = volume
+        self.meta = meta
+        self.kinds = kinds
+        self.step = max(1, step)
+        self.compression = compression
+        self.lesions = lesions or []
+        self.threshold = threshold
+        self.roi_margin = roi_margin
+        self.instance_numbers = meta.get("instance_numbers") or [str(z + 1) for z in range(volume.shape[0])]
+        spacing = meta.get("pixel_spacing", [1.0, 1.0])
+        self.base_info = {
+            "series_uid": meta.get("series_uid", ""),
+            "rescale": [meta.get("rescale_slope", 1.0), meta.get("rescale_intercept", 0.0)],
+            "pixel_spacing": [spacing[0] * self.step, spacing[1] * self.step],
+            "step": self.step,
+        }
+
+    def _send(self, kind, array, info):
+        frames = encode_frames(kind, array, dict(self.base_info, **info), self.compression)
+        self.socket.send_multipart(frames, copy=False)
+        return sum(len(f) if isinstance(f, bytes) else f.nbytes for f in frames)
+
+    def send_slice(self, z):
+        """Invia i tipi richiesti per la slice z; restituisce (messaggi, byte)"""
+        image = self.volume[z]
+        info = {"z": int(z), "slice_index": self.instance_numbers[z], "origin": [0, 0]}
+        messages = size = 0
+        if "slice" in self.kinds:
+            size += self._send("slice", image[::self.step, ::self.step], info)
+            messages += 1
+        if "mask" in self.kinds:
+            mask = image[::self.step, ::self.step] > self.threshold
+            size += self._send("mask", mask.view(np.uint8), info)
+            messages += 1
+        if "roi" in self.kinds:
+            rows, columns = image.shape
+            for lesion in self.lesions:
+                (z0, y0, x0), (z1, y1, x1) = lesion["bbox"]
+                if not z0 <= z < z1:
+                    continue
+                y0, x0 = max(0, y0 - self.roi_margin), max(0, x0 - self.roi_margin)
+                y1, x1 = min(rows, y1 + self.roi_margin), min(columns, x1 + self.roi_margin)
+                roi = image[y0:y1:self.step, x0:x1:self.step]
+                size += self._send("roi", roi, dict(info, origin=[y0, x0], label=lesion["label"]))
+                messages += 1
+        return messages, size
+
+
+def pixel_socket(context, port=ZMQ_PIXEL_PORT, sndhwm=None):
+    # ZMQ_CONFLATE non supporta i messaggi multipart: per lo stato corrente si usa un HWM basso
+    socket = context.socket(zmq.PUB)
+    if sndhwm is not None:
+        socket.setsockopt(zmq.SNDHWM, sndhwm)
+    socket.bind(f"tcp://0.0.0.0:{port}")
+    return socket
@@ -0,0 +1,360 @@
+import sys
+import time
+import json
+import struct
+import argparse
+import threading
+import itertools
+from concurrent import futures
+import numpy as np
+import paho.mqtt.client as mqtt
+import zmq
+import asyncio
+import grpc
+from grpc import aio
+
+from mini_broker import MiniBroker
+import grpc_hub
+from payload_ring import PayloadRing, Pacer
+
+# --- BENCHMARK END-TO-END DEI PROTOCOLLI DI universal_sender ---
+# Ogni modalità (mqtt, zmq, grpc) gira contro un sostituto locale:
+#   mqtt -> broker MQTT minimale incorporato + N client paho iscritti
+#   zmq  -> socket PUB + N socket SUB su localhost
+#   grpc -> server grpc.aio con un solo produttore diffuso a N client
+#           (grpc_hub, come BioSender.run_grpc)
+#   grpc_per_client -> vecchio schema: thread pool, un produttore per stream
+# Si variano dimensione del payload, cadenza e numero di iscritti; per ogni punto
+# si misurano throughput, latenza p50/p99/p999, perdita e CPU per messaggio.
+# Il payload è un record JSON di data.csv portato alla dimensione richiesta,
+# con in testa 16 byte (istante di invio in ns + numero di sequenza).
+CSV_FILENAME = "data.csv"
+MQTT_TOPIC = "digitaltwin/breast/data"
+HEADER = struct.Struct("<qQ")
+GRPC_METHOD = "/BioService/GetBioStream"
+DRAIN_TIME = 0.5  # Attesa massima senza nuovi arrivi dopo lo stop del produttore
+
+
+class PayloadFactory:
+    def __init__(self, csv_file, size):
+        ring = PayloadRing.from_csv(csv_file)
+        filler = b"".join(ring.json_payloads)
+        body_size = max(0, size - HEADER.size)
+        self.body = (filler * (body_size // max(1, len(filler)) + 1))[:body_size]
+
+    def make(self, seq):
+        return HEADER.pack(time.perf_counter_ns(), seq) + self.body
+
+
+class Collector:
+    """Latenze e sequenze ricevute da un iscritto"""
+    def __init__(self):
+        self.latencies = []
+        self.received = 0
+
+    def on_payload(self, data):
+        sent_ns, _ = HEADER.unpack_from(data)
+        self.latencies.append(time.perf_counter_ns() - sent_ns)
+        self.received += 1
+
+
+def _drain(collectors, expected):
+    """Attende i messaggi in volo finché ne arrivano (o finché sono arrivati tutti)"""
+    received = -1
+    while True:
+        current = sum(c.received for c in collectors)
+        if current >= expected or current == received:
+            return
+        received = current
+        time.sleep(DRAIN_TIME)
+
+
+def _produce(send, factory, rate, duration, stop):
+    pacer = Pacer(rate)
+    sent = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline and not stop.is_set():
+        send(factory.make(sent))
+        sent += 1
+        pacer.wait()
+    return sent
+
+
+# --- MODALITÀ ---
+def bench_mqtt(factory, rate, subscribers, duration):
+    broker = MiniBroker("127.0.0.1", 0).start()
+    collectors = [Collector() for _ in range(subscribers)]
+    clients = []
+    try:
+        for i, collector in enumerate(collectors):
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"bench_sub_{i}")
+            client.on_message = lambda c, u, msg, col=collector: col.on_payload(msg.payload)
+            client.connect("127.0.0.1", broker.port)
+            client.subscribe(MQTT_TOPIC)
+            client.loop_start()
+            clients.append(client)
+
+        publisher = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="bench_pub")
+        publisher.connect("127.0.0.1", broker.port)
+        publisher.loop_start()
+        clients.append(publisher)
+        time.sleep(0.5)  # Iscrizioni completate
+
+        last = {}
+
+        def send(payload):
+            last["info"] = publisher.publish(MQTT_TOPIC, payload)
+
+        sent = _produce(send, factory, rate, duration, threading.Event())
+        if "info" in last:
+            last["info"].wait_for_publish(timeout=30)  # La coda interna di paho deve svuotarsi
+        _drain(collectors, sent * subscribers)
+        return sent, collectors
+    finally:
+        for client in clients:
+            client.disconnect()
+            client.loop_stop()
+        broker.stop()
+
+
+def bench_zmq(factory, rate, subscribers, duration):
+    context = zmq.Context()
+    pub = context.socket(zmq.PUB)
+    pub.setsockopt(zmq.SNDHWM, 0)
+    port = pub.bind_to_random_port("tcp://127.0.0.1")
+    collectors = [Collector() for _ in range(subscribers)]
+    stop = threading.Event()
+
+    def subscriber(collector):
+        sub = context.socket(zmq.SUB)
+        sub.setsockopt(zmq.RCVHWM, 0)
+        sub.connect(f"tcp://127.0.0.1:{port}")
+        sub.setsockopt(zmq.SUBSCRIBE, b"")
+        while not stop.is_set():
+            if sub.poll(100):
+                collector.on_payload(sub.recv())
+        sub.close()
+
+    threads = [threading.Thread(target=subscriber, args=(c,), daemon=True) for c in collectors]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)  # "Slow joiner" di ZeroMQ
+
+    sent = _produce(pub.send, factory, rate, duration, threading.Event())
+    _drain(collectors, sent * subscribers)
+    stop.set()
+    for t in threads:
+        t.join()
+    pub.close()
+    context.term()
+    return sent, collectors
+
+
+def _grpc_clients(port, subscribers, duration):
+    collectors = [Collector() for _ in range(subscribers)]
+
+    def client(collector):
+        with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+            stream = channel.unary_stream(GRPC_METHOD)(b"")
+            try:
+                for data in stream:
+                    collector.on_payload(data)
+            except grpc.RpcError:
+                pass
+
+    threads = [threading.Thread(target=client, args=(c,), daemon=True) for c in collectors]
+    for t in threads:
+        t.start()
+    return collectors, threads
+
+
+def bench_grpc(factory, rate, subscribers, duration):
+    # Hub asyncio su un thread con il proprio loop; si misura da quando tutti gli iscritti sono connessi.
+    # Come grpc_hub.serve, ma il produttore si ferma prima del server: le code si svuotano come per mqtt/zmq
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    state = {}
+
+    async def main():
+        hub = grpc_hub.BroadcastHub()
+        server = aio.server()
+        server.add_generic_rpc_handlers((grpc_hub.stream_handler(hub),))
+        state["port"] = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        state["hub"] = hub
+        state["done"] = asyncio.Event()
+        producer = asyncio.create_task(grpc_hub.produce(hub, factory.make, rate))
+        state["producer"] = producer
+        ready.set()
+        await state["done"].wait()
+        producer.cancel()
+        hub.close()
+        await server.stop(0)
+
+    async def stop_producer():
+        state["producer"].cancel()
+        return state["hub"].published
+
+    server_thread = threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True)
+    server_thread.start()
+    ready.wait()
+    hub = state["hub"]
+    collectors, threads = _grpc_clients(state["port"], subscribers, duration)
+    while len(hub.subscribers) < subscribers:
+        time.sleep(0.01)
+    # Si misura da quando tutti sono connessi: quanto ricevuto prima non conta
+    start = hub.published
+    for collector in collectors:
+        collector.received = 0
+        collector.latencies.clear()
+    time.sleep(duration)
+    sent = asyncio.run_coroutine_threadsafe(stop_producer(), loop).result() - start
+    _drain(collectors, sent * subscribers)
+    loop.call_soon_threadsafe(state["done"].set)
+    server_thread.join(5)
+    for t in threads:
+        t.join(DRAIN_TIME + 5)
+    loop.close()
+    # Pacchetti ancora in volo al momento dell'azzeramento
+    for collector in collectors:
+        collector.received = min(collector.received, sent)
+    return sent, collectors
+
+
+def bench_grpc_per_client(factory, rate, subscribers, duration):
+    # Servizio generico a bytes grezzi: stesso metodo di BioService, senza file protoc
+    stop = threading.Event()
+    sent_counts = []
+
+    def get_bio_stream(request, context):
+        pacer = Pacer(rate)
+        sent = 0
+        deadline = time.perf_counter() + duration
+        try:
+            while time.perf_counter() < deadline and not stop.is_set() and context.is_active():
+                yield factory.make(sent)
+                sent += 1
+                pacer.wait()
+        finally:
+            sent_counts.append(sent)
+
+    handler = grpc.method_handlers_generic_handler("BioService", {
+        "GetBioStream": grpc.unary_stream_rpc_method_handler(get_bio_stream)
+    })
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max(10, subscribers)))
+    server.add_generic_rpc_handlers((handler,))
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+
+    collectors, threads = _grpc_clients(port, subscribers, duration)
+    for t in threads:
+        t.join(duration + DRAIN_TIME + 5)
+    stop.set()
+    server.stop(0)
+    # Con gRPC ogni client ha il proprio produttore: si confronta per stream
+    return sum(sent_counts) / max(1, len(sent_counts)), collectors
+
+
+MODES = {"mqtt": bench_mqtt, "zmq": bench_zmq, "grpc": bench_grpc, "grpc_per_client": bench_grpc_per_client}
+
+
+# --- MISURA ---
+def run_point(mode, size, rate, subscribers, duration, csv_file=CSV_FILENAME):
+    factory = PayloadFactory(csv_file, size)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    sent, collectors = MODES[mode](factory, rate, subscribers, duration)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    latencies = np.concatenate([np.asarray(c.latencies, dtype=np.int64) for c in collectors]) \
+        if collectors else np.zeros(0, dtype=np.int64)
+    received = sum(c.received for c in collectors)
+    expected = sent * subscribers
+    p50, p99, p999 = (np.percentile(latencies, [50, 99, 99.9]) / 1000.0) if len(latencies) else (None,) * 3
+    return {
+        "mode": mode,
+        "payload_bytes": size,
+        "target_rate": rate,
+        "subscribers": subscribers,
+        "duration_s": duration,
+        "sent": int(sent),
+        "received": int(received),
+        "send_rate_msg_s": round(sent / duration, 1),
+        "loss": round(1.0 - received / expected, 6) if expected else 0.0,
+        "throughput_msg_s": round(received / duration, 1),
+        "throughput_mb_s": round(received * size / duration / 1e6, 3),
+        "latency_p50_us": None if p50 is None else round(float(p50), 1),
+        "latency_p99_us": None if p99 is None else round(float(p99), 1),
+        "latency_p999_us": None if p999 is None else round(float(p999), 1),
+        "cpu_us_per_msg": round(cpu / received * 1e6, 2) if received else None,
+        "cpu_utilization": round(cpu / wall, 3),
+    }
+
+
+def point_key(result):
+    return (result["mode"], result["payload_bytes"], result["target_rate"], result["subscribers"])
+
+
+def find_regressions(results, baseline, tolerance):
+    """Punti peggiorati oltre la tolleranza (throughput più basso o p99 più alto)"""
+    reference = {point_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get(point_key(result))
+        if base is None:
+            continue
+        if base["throughput_msg_s"] and result["throughput_msg_s"] < base["throughput_msg_s"] * (1 - tolerance):
+            regressions.append((result, "throughput_msg_s", base["throughput_msg_s"], result["throughput_msg_s"]))
+        if base["latency_p99_us"] and result["latency_p99_us"] \
+                and result["latency_p99_us"] > base["latency_p99_us"] * (1 + tolerance):
+            regressions.append((result, "latency_p99_us", base["latency_p99_us"], result["latency_p99_us"]))
+    return regressions
+
+
+def _int_list(text):
+    return [int(v) for v in text.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark dei protocolli di universal_sender")
+    parser.add_argument("--modes", default="mqtt,zmq,grpc", help="Modalità da misurare")
+    parser.add_argument("--sizes", default="128,1024,8192", help="Dimensioni del payload (byte)")
+    parser.add_argument("--rates", default="100,1000,0", help="Messaggi/s per produttore (0 = senza limiti)")
+    parser.add_argument("--subscribers", default="1,4", help="Numero di iscritti")
+    parser.add_argument("--duration", type=float, default=2.0, help="Secondi per punto di misura")
+    parser.add_argument("--output", default=None, help="File JSON dei risultati (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="File JSON di riferimento per le regressioni")
+    parser.add_argument("--save-baseline", action="store_true", help="Salva i risultati come nuovo riferimento")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Peggioramento tollerato (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    results = []
+    for mode, size, rate, subscribers in itertools.product(
+            args.modes.split(","), _int_list(args.sizes), _int_list(args.rates), _int_list(args.subscribers)):
+        result = run_point(mode, size, rate, subscribers, args.duration)
+        results.append(result)
+        print(f"[{mode}] {size}B @ {rate or 'max'} msg/s x{subscribers}: "
+              f"{result['throughput_msg_s']} msg/s | p50 {result['latency_p50_us']} µs | "
+              f"p99 {result['latency_p99_us']} µs | loss {result['loss']:.2%} | "
+              f"CPU {result['cpu_us_per_msg']} µs/msg", file=sys.stderr)
+
+    report = {"timestamp": time.time(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.save_baseline and args.baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Riferimento salvato in {args.baseline}", file=sys.stderr)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f)["results"], args.tolerance)
+        for result, metric, before, after in regressions:
+            print(f"❌ REGRESSIONE {point_key(result)} {metric}: {before} -> {after}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ Nessuna regressione rispetto al riferimento.", file=sys.stderr)
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import threading
+
+from mini_broker import MiniBroker
+from dataset_snapshot import snapshot_path
+
+# --- BENCHMARK DI AVVIO A FREDDO DI universal_sender ---
+# Misura il tempo da "processo lanciato" a "primo messaggio ricevuto", cioè
+# quanto paga un riavvio del supervisore: avvio dell'interprete, import,
+# caricamento del dataset, connessione e primo invio.
+# Varianti: con snapshot binario del dataset (primo avvio = ricostruzione,
+# poi avvii a caldo) e senza snapshot (CSV letto ogni volta).
+HERE = os.path.dirname(os.path.abspath(__file__))
+SENDER = os.path.join(HERE, "universal_sender.py")
+CSV_FILENAME = os.path.join(HERE, "data.csv")
+MQTT_TOPIC = "digitaltwin/breast/data"
+ZMQ_ENDPOINT = "tcp://127.0.0.1:5555"
+TIMEOUT = 30.0
+
+
+class FirstMessage:
+    def __init__(self):
+        self.event = threading.Event()
+        self.at = None
+
+    def hit(self):
+        if not self.event.is_set():
+            self.at = time.perf_counter()
+            self.event.set()
+
+    def reset(self):
+        self.event.clear()
+        self.at = None
+
+
+def _mqtt_listener(first):
+    import paho.mqtt.client as mqtt
+
+    broker = MiniBroker("127.0.0.1", 0).start()
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id="startup_bench")
+    client.on_message = lambda c, u, msg: first.hit()
+    client.connect("127.0.0.1", broker.port)
+    client.subscribe(MQTT_TOPIC)
+    client.loop_start()
+
+    def close():
+        client.disconnect()
+        client.loop_stop()
+        broker.stop()
+    return ["--broker", "127.0.0.1", "--port", str(broker.port)], close
+
+
+def _zmq_listener(first):
+    import zmq
+
+    context = zmq.Context()
+    socket = context.socket(zmq.SUB)
+    socket.connect(ZMQ_ENDPOINT)  # ZeroMQ si riconnette da solo quando il sender fa bind
+    socket.setsockopt(zmq.SUBSCRIBE, b"")
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            if socket.poll(50):
+                socket.recv()
+                first.hit()
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+
+    def close():
+        stop.set()
+        thread.join()
+        socket.close()
+        context.term()
+    return [], close
+
+
+LISTENERS = {"mqtt": _mqtt_listener, "zmq": _zmq_listener}
+
+
+def time_to_first_message(mode, extra_args, first):
+    first.reset()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, SENDER, mode, "--log-level", "WARNING"] + extra_args,
+                               cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        if not first.event.wait(TIMEOUT):
+            raise RuntimeError(f"Nessun messaggio entro {TIMEOUT}s: {process.stderr.read1().decode(errors='replace')}")
+        return first.at - started
+    finally:
+        process.kill()
+        process.wait()
+
+
+def import_time(snapshot):
+    """Import + caricamento del dataset senza rete (in un interprete nuovo)"""
+    code = ("import time; t = time.perf_counter(); import universal_sender as u; "
+            f"u.BioSender(u.CSV_FILENAME, snapshot={snapshot}).next_payload(0); "
+            "print(time.perf_counter() - t)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def _summary(values):
+    return {"min_s": round(min(values), 4), "median_s": round(statistics.median(values), 4),
+            "max_s": round(max(values), 4)}
+
+
+def run_mode(mode, runs):
+    first = FirstMessage()
+    listener_args, close = LISTENERS[mode](first)
+    try:
+        results = []
+        # Senza snapshot: CSV letto a ogni avvio
+        cold_csv = [time_to_first_message(mode, listener_args + ["--no-snapshot"], first) for _ in range(runs)]
+        results.append(dict(mode=mode, variant="csv", runs=runs, **_summary(cold_csv)))
+
+        # Con snapshot: il primo avvio lo ricostruisce, i successivi lo caricano
+        if os.path.exists(snapshot_path(CSV_FILENAME)):
+            os.remove(snapshot_path(CSV_FILENAME))
+        rebuild = time_to_first_message(mode, listener_args, first)
+        results.append(dict(mode=mode, variant="snapshot_rebuild", runs=1, **_summary([rebuild])))
+        warm = [time_to_first_message(mode, listener_args, first) for _ in range(runs)]
+        results.append(dict(mode=mode, variant="snapshot", runs=runs, **_summary(warm)))
+        return results
+    finally:
+        close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempo di avvio a freddo di universal_sender")
+    parser.add_argument("--modes", default="mqtt,zmq", help="Modalità da misurare")
+    parser.add_argument("--runs", type=int, default=5, help="Avvii per variante")
+    parser.add_argument("--output", default=None, help="File JSON dei risultati (default: stdout)")
+    args = parser.parse_args()
+
+    results = []
+    for snapshot in (False, True):
+        imports = [import_time(snapshot) for _ in range(args.runs)]
+        results.append(dict(mode="import", variant="snapshot" if snapshot else "csv", runs=args.runs, **_summary(imports)))
+    for mode in args.modes.split(","):
+        results.extend(run_mode(mode, args.runs))
+    for r in results:
+        print(f"[{r['mode']}] {r['variant']}: min {r['min_s'] * 1000:.0f} ms | "
+              f"mediana {r['median_s'] * 1000:.0f} ms | max {r['max_s'] * 1000:.0f} ms", file=sys.stderr)
+
+    report = {"timestamp": time.time(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
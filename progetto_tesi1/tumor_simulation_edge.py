@@ -1,7 +1,10 @@
 import time
-import json
+import math
 import numpy as np
 import threading
+import argparse
+from wire_codec import WireEncoder, CODECS
+from tick_scheduler import TickScheduler, POLICIES
 
 # --- Parametri del Modello Matematico (ispirati al paper MRI-based [cite: 16641, 17197]) ---
 # Equazione semplificata per la tesi: dN/dt = k*N*(1 - N/theta) - lambda*N
@@ -18,10 +21,12 @@ class TumorModel:
         
         self.last_update_time = time.time()
 
-    def update(self):
+    def update(self, dt=None):
         """Calcola il prossimo stato del tumore (Step 2 & 3)"""
+        # dt esplicito = passo fisso deterministico; altrimenti orologio reale
         current_time = time.time()
-        dt = current_time - self.last_update_time
+        if dt is None:
+            dt = current_time - self.last_update_time
         
         # 1. Calcolo Crescita Logistica (Progressione)
         # Formula: Crescita = k * N * (1 - N/theta)
@@ -66,44 +71,83 @@ class TumorModel:
 # Qui userai il tuo 'BioSender' per inviare i dati iniziali a questo script
 # Questo script agirà da SERVER per la simulazione e CLIENT verso Unity
 
-def simulation_loop(protocol_sender_func):
+def simulation_loop(protocol_sender_func, tick=0.1, time_scale=1.0, max_speed=False,
+                    max_step=0.1, max_steps=None, codec="json", overrun_policy="catch_up"):
+    """
+    tick: periodo reale tra due invii (10Hz)
+    time_scale: secondi simulati per secondo reale (es. 1000 = 1000x)
+    max_speed: nessuna attesa tra i tick ("il più veloce possibile")
+    max_step: passo massimo di Eulero; ad alte velocità il tick viene diviso in sotto-passi
+    codec: formato di trasporto (json storico, msgpack, struct...)
+    overrun_policy: tick in ritardo -> "catch_up" (recupera i passi) o "skip"
+    Il passo simulato è fisso (tick * time_scale): la traiettoria non dipende
+    dal jitter dello scheduler ed è riproducibile. I tick seguono scadenze
+    assolute sull'orologio monotono (nessuna deriva) e il timestamp è quello
+    della scadenza, non dell'istante di risveglio.
+    """
     # Inizializziamo il tumore con dati medi dal tuo CSV (es. radius_mean ~17)
     # - Usiamo i dati del dataset per l'init
     tumor = TumorModel(initial_radius=17.0, initial_cellularity=50.0)
+    encoder = WireEncoder(codec, "sim_update")
+    sim_dt = tick * time_scale
+    n_sub = max(1, int(math.ceil(sim_dt / max_step)))
+    sim_time = 0.0
+    drug_cycle = 0
+    steps = 0
+
+    # Simuliamo a 10Hz (real-time fluido) su scadenze assolute
+    scheduler = None
+    if not max_speed:
+        scheduler = TickScheduler(overrun_policy)
+        scheduler.add("tumor", tick)
     
     print("🚀 Avvio Simulazione Edge...")
     
     try:
-        while True:
-            # 1. Calcola la fisica
-            data = tumor.update()
+        while max_steps is None or steps < max_steps:
+            if scheduler is None:
+                ticks, timestamp = 1, time.time()
+            else:
+                (_, ticks, deadline), = scheduler.next_batch()
+                timestamp = scheduler.wall_time(deadline)
+            if max_steps is not None:
+                ticks = min(ticks, max_steps - steps)
+
+            for _ in range(ticks):
+                # 1. Calcola la fisica (più tick se si recupera un ritardo)
+                for _ in range(n_sub):
+                    data = tumor.update(sim_dt / n_sub)
+                sim_time += sim_dt
+                steps += 1
+
+                # SIMULAZIONE INTERAZIONE: a 10s simulati (poi ogni 20s) iniettiamo il farmaco
+                # Nella tesi reale, questo arriverà via MQTT dal "Drug Twin"
+                cycle = int((sim_time + 10.0) // 20.0)
+                if cycle > drug_cycle:
+                    drug_cycle = cycle
+                    if tumor.drug_efficacy < 0.1:
+                        tumor.inject_drug(2.0) # Efficacia alta per vedere l'effetto
             
             # 2. Prepara payload per Unity
-            payload = json.dumps({
+            payload = encoder.encode({
                 "type": "sim_update",
                 "data": data,
-                "timestamp": time.time()
+                "timestamp": timestamp,
+                "sim_time": round(sim_time, 4)
             })
             
             # 3. Invia a Unity (usando la funzione passata come argomento)
             protocol_sender_func(payload)
-            
-            # Simuliamo a 10Hz (real-time fluido)
-            time.sleep(0.1)
-            
-            # SIMULAZIONE INTERAZIONE: Dopo 10 secondi, iniettiamo il farmaco
-            # Nella tesi reale, questo arriverà via MQTT dal "Drug Twin"
-            if 10.0 < time.time() % 20.0 < 10.2 and tumor.drug_efficacy < 0.1:
-                tumor.inject_drug(2.0) # Efficacia alta per vedere l'effetto
                 
     except KeyboardInterrupt:
         print("Stop Simulazione.")
 
 # Esempio di integrazione con il tuo codice MQTT esistente
-import paho.mqtt.client as mqtt
+def run_mqtt_edge(time_scale=1.0, max_speed=False, codec="json", overrun_policy="catch_up"):
+    # paho solo per questo backend: simulation_loop si usa anche senza MQTT
+    import paho.mqtt.client as mqtt
 
-def run_mqtt_edge():
-    client = mqtt.Client("Edge_Simulator")
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "Edge_Simulator")
     client.connect("broker.hivemq.com", 1883, 60)
     client.loop_start()
     
@@ -111,7 +155,15 @@ def run_mqtt_edge():
     def send_wrapper(payload):
         client.publish("digitaltwin/breast/simulation", payload)
         
-    simulation_loop(send_wrapper)
+    simulation_loop(send_wrapper, time_scale=time_scale, max_speed=max_speed, codec=codec,
+                    overrun_policy=overrun_policy)
 
 if __name__ == "__main__":
-    run_mqtt_edge()
+    parser = argparse.ArgumentParser(description="Simulazione tumorale Edge")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Secondi simulati per secondo reale (es. 1000)")
+    parser.add_argument("--max-speed", action="store_true", help="Nessuna attesa tra i tick")
+    parser.add_argument("--codec", choices=CODECS, default="json", help="Formato di trasporto")
+    parser.add_argument("--overrun", choices=POLICIES, default="catch_up", help="Tick in ritardo: recupera o salta")
+    args = parser.parse_args()
+    run_mqtt_edge(time_scale=args.time_scale, max_speed=args.max_speed, codec=args.codec,
+                  overrun_policy=args.overrun)
@@ -1,24 +1,17 @@
 import time
-import pandas as pd
-import json
+import logging
 import argparse
 import sys
-from concurrent import futures
+from payload_ring import PayloadRing, Pacer
+from dataset_snapshot import load_dataset
+from wire_codec import WireEncoder, CODECS
+from metrics import MetricsRegistry, serve_metrics
 
-# --- IMPORT PROTOCOLLI ---
-# 1. MQTT
-import paho.mqtt.client as mqtt
-
-# 2. ZeroMQ
-import zmq
+log = logging.getLogger("universal_sender")
 
-# 3. gRPC (Importiamo i file generati)
-try:
-    import grpc
-    import bio_data_pb2
-    import bio_data_pb2_grpc
-except ImportError:
-    print("⚠️  File gRPC non trovati. Esegui il comando protoc se vuoi usare gRPC.")
+# --- IMPORT PROTOCOLLI ---
+# Ogni backend (paho, zmq, grpc) viene importato solo dalla modalità che lo usa:
+# l'avvio non paga gli import delle librerie che non servono.
 
 # --- CONFIGURAZIONE ---
 CSV_FILENAME = "data.csv"
@@ -31,122 +24,192 @@ ZMQ_PORT = 5555
 GRPC_PORT = 50051
 
 class BioSender:
-    def __init__(self, csv_file):
-        print(f"📂 Caricamento dataset: {csv_file}...")
-        self.df = pd.read_csv(csv_file)
-        self.total_records = len(self.df)
-        print(f"✅ Dataset caricato: {self.total_records} record trovati.")
+    def __init__(self, csv_file, precompiled=False, rate=1.0 / PUBLISH_INTERVAL, codec="json",
+                 metrics_port=None, snapshot=True):
+        log.info(f"📂 Caricamento dataset: {csv_file}...")
+        # Snapshot binario accanto al CSV (ricostruito solo se il CSV cambia)
+        self.dataset, rebuilt = load_dataset(csv_file, use_snapshot=snapshot)
+        self.total_records = len(self.dataset)
+        source = "CSV" if rebuilt else "snapshot"
+        log.info(f"✅ Dataset caricato ({source}): {self.total_records} record trovati.")
+
+        # Formato di trasporto per MQTT/ZeroMQ (json storico, msgpack, struct...)
+        self.encoder = WireEncoder(codec, "bio_record")
+
+        # Modalità precompilata: tutti i payload già serializzati in un buffer circolare
+        self.ring = PayloadRing(self.dataset, self.encoder) if precompiled else None
+        if self.ring:
+            formats = "JSON + Protobuf" if self.ring.proto_messages else "JSON"
+            log.info(f"⚡ Payload pre-serializzati: {len(self.ring)} ({formats})")
+
+        # Cadenza: rate messaggi/s, 0 = senza limiti (generatore di carico)
+        self.rate = rate
+        # Con rate alti un log per messaggio diventerebbe il collo di bottiglia
+        self.log_every = 1 if 0 < rate <= 10 else 1000
+
+        # METRICHE: messaggi, byte e durata dell'invio (endpoint /metrics opzionale)
+        self.metrics = MetricsRegistry("sender_")
+        self.m_send = self.metrics.histogram("send_seconds", "Durata di publish/send/yield per messaggio")
+        self.m_messages = self.metrics.counter("messages", "Messaggi inviati")
+        self.m_bytes = self.metrics.counter("bytes", "Byte di payload inviati")
+        if metrics_port:
+            serve_metrics(self.metrics, metrics_port)
+            log.info(f"📈 Metriche su http://0.0.0.0:{metrics_port}/metrics")
         
     def get_record(self, index):
         """Restituisce il record corrente come dizionario"""
-        real_index = index % self.total_records
-        record = self.df.iloc[real_index].to_dict()
-        # Convertiamo i tipi numpy in tipi nativi python per JSON/Protobuf
-        for key, value in record.items():
-            if pd.isna(value): record[key] = 0.0
-        return record
+        # Tipi Python nativi per JSON/Protobuf, NaN già sostituiti da 0.0
+        return self.dataset.record(index)
+
+    def next_payload(self, i):
+        """(id, payload codificato in bytes) del messaggio i-esimo"""
+        if self.ring:
+            return self.ring.ids[i % self.ring.size], self.ring.wire_bytes(i)
+        data = self.get_record(i)
+        return data.get('id', 'N/A'), self.encoder.encode(data)
+
+    def record_sent(self, nbytes, started):
+        self.m_send.observe(time.perf_counter() - started)
+        self.m_messages.inc()
+        self.m_bytes.inc(nbytes)
 
     # --- LOGICA MQTT ---
-    def run_mqtt(self):
-        print(f"🚀 Avvio modalità MQTT verso {MQTT_BROKER}...")
-        client = mqtt.Client("BioSender_Python")
+    def run_mqtt(self, broker=MQTT_BROKER, port=1883):
+        import paho.mqtt.client as mqtt
+
+        log.info(f"🚀 Avvio modalità MQTT verso {broker}...")
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "BioSender_Python")
+        self.metrics.gauge("mqtt_out_queue", "Pacchetti MQTT in coda di uscita",
+                           fn=lambda: len(client._out_packet))
         try:
-            client.connect(MQTT_BROKER, 1883, 60)
+            client.connect(broker, port, 60)
             client.loop_start()
             
             i = 0
+            pacer = Pacer(self.rate)
             while True:
-                data = self.get_record(i)
-                payload = json.dumps(data, default=str) # Serializzazione JSON
+                record_id, payload = self.next_payload(i) # Serializzazione JSON
+                started = time.perf_counter()
                 client.publish(MQTT_TOPIC, payload)
+                self.record_sent(len(payload), started)
                 
-                print(f"[MQTT] Inviato ID: {data.get('id', 'N/A')} ({i})")
+                if i % self.log_every == 0:
+                    log.info(f"[MQTT] Inviato ID: {record_id} ({i})")
                 i += 1
-                time.sleep(PUBLISH_INTERVAL)
+                pacer.wait()
                 
         except KeyboardInterrupt:
             client.loop_stop()
-            print("\n⏹️  Stop MQTT.")
+            log.info("\n⏹️  Stop MQTT.")
 
     # --- LOGICA ZeroMQ ---
     def run_zeromq(self):
-        print(f"🚀 Avvio modalità ZeroMQ (PUB) sulla porta {ZMQ_PORT}...")
+        import zmq
+
+        log.info(f"🚀 Avvio modalità ZeroMQ (PUB) sulla porta {ZMQ_PORT}...")
         context = zmq.Context()
-        socket = context.socket(zmq.PUB)
+        # XPUB = PUB che riceve anche le iscrizioni: si parte al primo iscritto
+        # invece di aspettare sempre 2 secondi (al massimo 2 secondi senza iscritti)
+        socket = context.socket(zmq.XPUB)
         socket.bind(f"tcp://*:{ZMQ_PORT}")
         
-        print("⏳ Attesa connessioni ZeroMQ...")
-        time.sleep(2)  # Attesa per connessioni
+        log.info("⏳ Attesa connessioni ZeroMQ...")
+        if socket.poll(2000):
+            socket.recv()  # Messaggio di iscrizione
         i = 0
+        pacer = Pacer(self.rate)
         try:
             while True:
-                data = self.get_record(i)
-                # ZeroMQ invia byte, usiamo JSON come stringa
-                payload = json.dumps(data, default=str)
-                socket.send_string(payload)
+                # ZeroMQ invia byte, usiamo il payload già codificato
+                record_id, payload = self.next_payload(i)
+                started = time.perf_counter()
+                socket.send(payload)
+                self.record_sent(len(payload), started)
                 
-                print(f"[ZeroMQ] Pubblicato ID: {data.get('id', 'N/A')} ({i})")
+                if i % self.log_every == 0:
+                    log.info(f"[ZeroMQ] Pubblicato ID: {record_id} ({i})")
                 i += 1
-                time.sleep(PUBLISH_INTERVAL)
+                pacer.wait()
         except KeyboardInterrupt:
             socket.close()
             context.term()
-            print("\n⏹️  Stop ZeroMQ.")
+            log.info("\n⏹️  Stop ZeroMQ.")
 
     # --- LOGICA gRPC ---
-    def run_grpc(self):
-        print(f"🚀 Avvio Server gRPC sulla porta {GRPC_PORT}...")
-        
-        # Classe interna per gestire il servizio
-        # Nota: serve 'self' esterno, quindi usiamo una closure o passiamo il df
-        parent_sender = self
-
-        class BioServiceHandler(bio_data_pb2_grpc.BioServiceServicer):
-            def GetBioStream(self, request, context):
-                print("🔗 Client Unity connesso allo stream gRPC!")
-                i = 0
-                try:
-                    while context.is_active():
-                        record = parent_sender.get_record(i)
-                        
-                        # Creiamo il pacchetto Protobuf strettamente tipizzato
-                        packet = bio_data_pb2.BioPacket(
-                            id=int(record.get('id', 0)),
-                            diagnosis=str(record.get('diagnosis', '')),
-                            radius_mean=float(record.get('radius_mean', 0)),
-                            texture_mean=float(record.get('texture_mean', 0)),
-                            perimeter_mean=float(record.get('perimeter_mean', 0)),
-                            area_mean=float(record.get('area_mean', 0)),
-                            concavity_mean=float(record.get('concavity_mean', 0))
-                        )
-                        
-                        yield packet # 'yield' invia il dato nello stream
-                        print(f"[gRPC] Stream ID: {packet.id}")
-                        
-                        i += 1
-                        time.sleep(PUBLISH_INTERVAL)
-                except Exception as e:
-                    print(f"❌ Errore Stream: {e}")
-
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-        bio_data_pb2_grpc.add_BioServiceServicer_to_server(BioServiceHandler(), server)
-        server.add_insecure_port(f'[::]:{GRPC_PORT}')
-        server.start()
+    def proto_payload(self, i):
+        """BioPacket i-esimo già serializzato (codificato una volta per tutti i client)"""
+        if self.ring and self.ring.proto_payloads:
+            return self.ring.proto_bytes(i)
+        import bio_data_pb2  # Già caricato da run_grpc
+        record = self.get_record(i)
+
+        # Creiamo il pacchetto Protobuf strettamente tipizzato
+        packet = bio_data_pb2.BioPacket(
+            id=int(record.get('id', 0)),
+            diagnosis=str(record.get('diagnosis', '')),
+            radius_mean=float(record.get('radius_mean', 0)),
+            texture_mean=float(record.get('texture_mean', 0)),
+            perimeter_mean=float(record.get('perimeter_mean', 0)),
+            area_mean=float(record.get('area_mean', 0)),
+            concavity_mean=float(record.get('concavity_mean', 0))
+        )
+        return packet.SerializeToString()
+
+    def run_grpc(self, queue_size=None, policy="drop_oldest"):
+        import asyncio
+
+        # gRPC (Importiamo i file generati; lo stream usa l'hub generico a bytes)
+        try:
+            import bio_data_pb2
+            import grpc_hub
+        except ImportError:
+            log.error("⚠️  File gRPC non trovati. Esegui il comando protoc se vuoi usare gRPC.")
+            return
+
+        log.info(f"🚀 Avvio Server gRPC (asyncio, un produttore per tutti i client) sulla porta {GRPC_PORT}...")
+        # Nome completo del servizio dal .proto (include l'eventuale package)
+        service_name = bio_data_pb2.DESCRIPTOR.services_by_name["BioService"].full_name
+
+        async def main():
+            # L'hub (code asyncio) va creato dentro il loop che lo userà
+            hub = grpc_hub.BroadcastHub(queue_size or grpc_hub.DEFAULT_QUEUE_SIZE, policy, self.metrics)
+
+            def on_published(i, payload):
+                if i % self.log_every == 0:
+                    record_id = self.ring.ids[i % self.ring.size] if self.ring else self.get_record(i).get('id', 'N/A')
+                    log.info(f"[gRPC] Stream ID: {record_id} ({i}) -> {len(hub.subscribers)} client")
+
+            await grpc_hub.serve(hub, self.proto_payload, self.rate, f'[::]:{GRPC_PORT}', service_name,
+                                 on_published=on_published, on_sent=self.record_sent)
+
         try:
-            server.wait_for_termination()
+            asyncio.run(main())
         except KeyboardInterrupt:
-            print("\n⏹️  Stop gRPC.")
+            log.info("\n⏹️  Stop gRPC.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="BioData Sender per Tesi")
     parser.add_argument("mode", choices=["mqtt", "zmq", "grpc"], help="Protocollo da usare")
+    parser.add_argument("--precompiled", action="store_true", help="Pre-serializza tutti i record all'avvio")
+    parser.add_argument("--rate", type=float, default=1.0 / PUBLISH_INTERVAL, help="Messaggi al secondo (0 = senza limiti)")
+    parser.add_argument("--codec", choices=CODECS, default="json", help="Formato di trasporto per mqtt/zmq")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Porta HTTP per /metrics (formato Prometheus)")
+    parser.add_argument("--broker", default=MQTT_BROKER, help="Broker MQTT")
+    parser.add_argument("--port", type=int, default=1883, help="Porta del broker MQTT")
+    parser.add_argument("--no-snapshot", action="store_true", help="Legge sempre il CSV (nessuno snapshot binario)")
+    parser.add_argument("--grpc-queue", type=int, default=64, help="Pacchetti in coda per client gRPC")
+    parser.add_argument("--slow-client", choices=["drop_oldest", "disconnect"], default="drop_oldest",
+                        help="Client gRPC lenti: scarta i pacchetti più vecchi o chiudi lo stream")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING, ERROR")
     args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
 
-    sender = BioSender(CSV_FILENAME)
+    sender = BioSender(CSV_FILENAME, precompiled=args.precompiled, rate=args.rate, codec=args.codec,
+                       metrics_port=args.metrics_port, snapshot=not args.no_snapshot)
 
     if args.mode == "mqtt":
-        sender.run_mqtt()
+        sender.run_mqtt(args.broker, args.port)
     elif args.mode == "zmq":
         sender.run_zeromq()
     elif args.mode == "grpc":
-        sender.run_grpc()
+        sender.run_grpc(args.grpc_queue, args.slow_client)
@@ -0,0 +1,161 @@
+import math
+import logging
+import numpy as np
+
+# scipy serve solo per le componenti connesse 3D
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
+log = logging.getLogger("volume_features")
+
+# --- ESTRATTORE VOLUMETRICO A BATCH ---
+# Lavora sull'intero stack (Z, Y, X) di una serie invece che slice per slice:
+#  - statistiche per slice (media, deviazione standard, massimo) in un'unica
+#    passata per blocco di slice
+#  - maschera delle lesioni (soglia), componenti connesse 3D e, per ognuna,
+#    volume, raggio equivalente e bounding box
+#  - i valori per slice derivano dalla stessa passata e alimentano i campi
+#    radius_mean / texture_mean / diagnosis del pacchetto per Unity
+LESION_THRESHOLD = 2000  # Stessa soglia della diagnosi per slice
+
+
+def slice_statistics(volume, chunk_size=16):
+    """Media, deviazione standard e massimo di ogni slice (una lettura del volume per blocco)"""
+    depth = volume.shape[0]
+    n_pixels = volume.shape[1] * volume.shape[2]
+    mean = np.empty(depth)
+    std = np.empty(depth)
+    maximum = np.empty(depth)
+    for z0 in range(0, depth, chunk_size):
+        block = np.asarray(volume[z0:z0 + chunk_size], dtype=np.float64).reshape(-1, n_pixels)
+        s1 = block.sum(axis=1)
+        s2 = np.einsum("ij,ij->i", block, block)
+        m = s1 / n_pixels
+        mean[z0:z0 + len(block)] = m
+        std[z0:z0 + len(block)] = np.sqrt(np.maximum(s2 / n_pixels - m * m, 0.0))
+        maximum[z0:z0 + len(block)] = block.max(axis=1)
+    return mean, std, maximum
+
+
+def _find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:  # Compressione del cammino
+        parent[i], i = root, parent[i]
+    return root
+
+
+def lesion_components(volume, voxel_size, threshold=LESION_THRESHOLD, chunk_size=16):
+    """
+    Componenti connesse 3D dei voxel sopra soglia, a blocchi di slice.
+    Maschera ed etichette esistono solo per un blocco alla volta (memoria
+    limitata anche per volumi mappati enormi); le componenti che attraversano
+    il confine tra due blocchi vengono unite (union-find sugli id dei blocchi).
+    Restituisce (lesioni con volume, raggio equivalente e bounding box, oppure
+    None senza scipy; pixel sopra soglia per slice).
+    """
+    depth = volume.shape[0]
+    above = np.zeros(depth, dtype=np.int64)
+    if ndimage is None:
+        log.warning("⚠️  scipy non trovato: metriche delle lesioni 3D disabilitate.")
+    parent, voxels, boxes = [], [], []  # Per id globale (0, 1, ...) dei pezzi di componente
+    previous = None  # Ultima slice del blocco precedente: id globale + 1 (0 = sfondo)
+    for z0 in range(0, depth, chunk_size):
+        mask = np.asarray(volume[z0:z0 + chunk_size]) > threshold
+        above[z0:z0 + len(mask)] = mask.sum(axis=(1, 2))
+        if ndimage is None:
+            continue
+        labels, count = ndimage.label(mask)
+        offset = len(parent)
+        counts = np.bincount(labels.ravel(), minlength=count + 1)
+        for label, box in enumerate(ndimage.find_objects(labels), start=1):
+            parent.append(offset + label - 1)
+            voxels.append(int(counts[label]))
+            boxes.append([box[0].start + z0, box[1].start, box[2].start,
+                          box[0].stop + z0, box[1].stop, box[2].stop])
+        first = np.where(labels[0] > 0, labels[0] + offset, 0)
+        if previous is not None:
+            # Voxel sovrapposti tra le due slice di confine = stessa componente
+            touching = (previous > 0) & (first > 0)
+            for a, b in set(zip(previous[touching].tolist(), first[touching].tolist())):
+                ra, rb = _find(parent, a - 1), _find(parent, b - 1)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)  # La radice resta l'id più basso
+        previous = np.where(labels[-1] > 0, labels[-1] + offset, 0)
+
+    if ndimage is None:
+        return None, above
+
+    # Radici in ordine di id = stesso ordine (e numerazione) di ndimage.label sull'intero volume
+    roots = np.array([_find(parent, i) for i in range(len(parent))], dtype=np.intp)
+    _, group = np.unique(roots, return_inverse=True)
+    count = int(group.max()) + 1 if len(group) else 0
+    boxes = np.array(boxes, dtype=np.int64).reshape(-1, 6)
+    sizes = np.bincount(group, weights=voxels, minlength=count)
+    low = np.full((count, 3), np.iinfo(np.int64).max)
+    high = np.zeros((count, 3), dtype=np.int64)
+    np.minimum.at(low, group, boxes[:, :3])
+    np.maximum.at(high, group, boxes[:, 3:])
+
+    voxel_volume = float(np.prod(voxel_size))
+    lesions = []
+    for label in range(1, count + 1):
+        volume_mm3 = float(sizes[label - 1]) * voxel_volume
+        lesions.append({
+            "label": label,
+            "voxels": int(sizes[label - 1]),
+            "volume_mm3": round(volume_mm3, 3),
+            "equivalent_radius_mm": round((3.0 * volume_mm3 / (4.0 * math.pi)) ** (1.0 / 3.0), 3),
+            # (z0, y0, x0) - (z1, y1, x1) esclusivo
+            "bbox": [low[label - 1].tolist(), high[label - 1].tolist()],
+        })
+    return lesions, above
+
+
+def extract_volume_features(volume, meta=None, threshold=LESION_THRESHOLD, min_radius_mm=1.0):
+    """
+    Feature di tutta la serie in un colpo solo.
+    Restituisce {"slices": [pacchetti per Unity], "lesions": [componenti 3D]}.
+    Una slice è 'M' se interseca una lesione con raggio equivalente >= min_radius_mm.
+    """
+    meta = meta or {}
+    depth = volume.shape[0]
+    pixel_spacing = meta.get("pixel_spacing", [1.0, 1.0])
+    voxel_size = (meta.get("slice_spacing", 1.0), pixel_spacing[0], pixel_spacing[1])
+    instance_numbers = meta.get("instance_numbers", [str(z + 1) for z in range(depth)])
+
+    mean, std, maximum = slice_statistics(volume)
+
+    lesions, above = lesion_components(volume, voxel_size, threshold)
+    lesion_area = above * pixel_spacing[0] * pixel_spacing[1]
+
+    # Per ogni slice: la lesione più grande che la attraversa. Una componente
+    # connessa occupa TUTTE le slice tra z0 e z1 (per passare da una slice
+    # all'altra deve attraversare quelle in mezzo): basta la bounding box.
+    slice_lesion = [None] * depth
+    for lesion in sorted(lesions or [], key=lambda l: l["voxels"]):
+        (z0, _, _), (z1, _, _) = lesion["bbox"]
+        for z in range(z0, z1):
+            slice_lesion[z] = lesion
+
+    slices = []
+    for z in range(depth):
+        lesion = slice_lesion[z]
+        if lesions is None:
+            # Senza componenti 3D: stessa regola della diagnosi per slice
+            malignant = maximum[z] > threshold
+        else:
+            malignant = lesion is not None and lesion["equivalent_radius_mm"] >= min_radius_mm
+        slices.append({
+            "id": 1,
+            "slice_index": instance_numbers[z],
+            "diagnosis": "M" if malignant else "B",
+            "radius_mean": float(10.0 + mean[z] / 50.0),
+            "texture_mean": float(std[z]),
+            "lesion_area_mm2": round(float(lesion_area[z]), 3),
+            "lesion_radius_mm": lesion["equivalent_radius_mm"] if lesion else 0.0,
+        })
+    return {"slices": slices, "lesions": lesions or []}
@@ -0,0 +1,97 @@
+import math
+
+# --- PUBBLICAZIONE A VARIAZIONE (DELTA + KEYFRAME) ---
+# Un tumore viene ripubblicato solo quando almeno un campo si è allontanato
+# dall'ULTIMO VALORE INVIATO più della sua banda morta (così l'errore visto dai
+# client resta sempre entro la banda, senza deriva). Ogni keyframe_interval
+# secondi si invia lo stato completo. Ogni messaggio ha un numero di sequenza:
+# un buco nella sequenza dice al client di risincronizzarsi (keyframe o stato trattenuto).
+DEFAULT_DEADBAND = {"radius": 0.005, "cellularity": 0.1, "drug_level": 0.01}
+DEFAULT_KEYFRAME_INTERVAL = 10.0
+DEFAULT_RETAIN_INTERVAL = 1.0  # Secondi minimi tra due aggiornamenti dello stato trattenuto
+
+
+def parse_deadband(spec):
+    """'radius=0.01,cellularity=0.5' -> dizionario (i campi mancanti restano ai default)"""
+    deadband = dict(DEFAULT_DEADBAND)
+    for item in filter(None, (spec or "").split(",")):
+        field, _, value = item.partition("=")
+        deadband[field.strip()] = float(value)
+    return deadband
+
+
+class DeltaStream:
+    """Stato di pubblicazione di uno stream (un paziente)"""
+    def __init__(self, deadband=None, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL):
+        self.deadband = deadband or dict(DEFAULT_DEADBAND)
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.sent = {}  # tumore -> ultimo stato inviato (ciò che vedono i client)
+        self.next_keyframe = -math.inf
+
+    def _changed(self, old, new):
+        if old is None:
+            return True
+        for field, value in new.items():
+            # Bande percentili degli ensemble (es. radius_p95): stessa banda morta del campo
+            band = self.deadband.get(field, self.deadband.get(field.rpartition("_p")[0]))
+            if band is None:
+                if old.get(field) != value:  # Campi non numerici (es. status): ogni cambio conta
+                    return True
+            elif abs(value - old.get(field, 0.0)) > band:
+                return True
+        return False
+
+    def update(self, tumors, now):
+        """
+        tumors: stato corrente completo {nome: {campo: valore}}.
+        Restituisce (tumori da inviare, keyframe) oppure None se nulla è cambiato.
+        """
+        keyframe = now >= self.next_keyframe
+        if keyframe:
+            changed = tumors
+            self.next_keyframe = now + self.keyframe_interval
+        else:
+            changed = {name: state for name, state in tumors.items()
+                       if self._changed(self.sent.get(name), state)}
+            if not changed:
+                return None
+        self.sent.update(changed)
+        self.seq += 1
+        return changed, keyframe
+
+    def force_keyframe(self):
+        self.next_keyframe = -math.inf
+
+    def snapshot(self):
+        """Ultimo stato inviato di tutti i tumori (per il messaggio trattenuto)"""
+        return dict(self.sent)
+
+
+class DeltaFollower:
+    """
+    Lato client: ricostruisce lo stato completo da keyframe e delta.
+    apply() restituisce False se c'è un buco di sequenza e lo stato non è
+    affidabile fino al prossimo keyframe (o al messaggio trattenuto).
+    """
+    def __init__(self):
+        self.tumors = {}
+        self.seq = None
+        self.synced = False
+        self.gaps = 0
+
+    def apply(self, message):
+        seq = message.get("seq")
+        if message.get("keyframe"):
+            self.tumors = dict(message.get("tumors", {}))
+            self.synced = True
+        else:
+            if self.seq is not None and seq is not None and seq <= self.seq:
+                return self.synced  # Duplicato o già coperto dallo stato trattenuto
+            if self.seq is not None and seq is not None and seq != self.seq + 1:
+                self.gaps += 1
+                self.synced = False
+            self.tumors.update(message.get("tumors", {}))
+        if seq is not None:
+            self.seq = seq
+        return self.synced
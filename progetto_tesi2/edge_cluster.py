@@ -0,0 +1,323 @@
+import os
+import time
+import json
+import bisect
+import hashlib
+import logging
+import argparse
+import threading
+import multiprocessing
+import paho.mqtt.client as mqtt
+from tick_scheduler import POLICIES
+from integrators import INTEGRATORS
+
+# --- CLUSTER EDGE A PROCESSI (SHARDING PER PAZIENTE) ---
+# Un supervisore avvia N processi worker, ognuno con il proprio EdgeServer
+# (quindi il proprio GIL). Ogni bootstrap su digitaltwin/breast/bootstrap viene
+# instradato a uno shard con hashing consistente del patient_id:
+# aggiungere o perdere un worker sposta solo i pazienti di quello shard.
+# Anche i comandi digitaltwin/breast/<id>/control passano dal supervisore,
+# che li inoltra sul topic admin del solo shard proprietario.
+TOPIC_BOOTSTRAP = "digitaltwin/breast/bootstrap"
+TOPIC_CONTROL = "digitaltwin/breast/+/control"
+TOPIC_STATUS = "digitaltwin/system/status"
+TOPIC_SHARD = "digitaltwin/cluster/shard/{shard}/{kind}"  # kind: bootstrap | status | admin
+
+STATUS_INTERVAL = 1.0   # Secondi tra due stati aggregati
+WORKER_TIMEOUT = 5.0    # Uno shard muto per più di così è considerato morto
+STARTUP_TIMEOUT = 60.0  # Tempo concesso per il primo stato (import, connessione, iscrizioni)
+
+log = logging.getLogger("edge_cluster")
+
+
+class HashRing:
+    """Hashing consistente con nodi virtuali"""
+    def __init__(self, nodes=(), vnodes=64):
+        self.vnodes = vnodes
+        self.keys = []
+        self.owners = {}
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key):
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+    def add(self, node):
+        self.nodes.add(node)
+        for v in range(self.vnodes):
+            h = self._hash(f"{node}#{v}")
+            bisect.insort(self.keys, h)
+            self.owners[h] = node
+
+    def remove(self, node):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        for v in range(self.vnodes):
+            h = self._hash(f"{node}#{v}")
+            self.keys.remove(h)
+            del self.owners[h]
+
+    def node_for(self, key):
+        if not self.keys:
+            return None
+        i = bisect.bisect(self.keys, self._hash(key)) % len(self.keys)
+        return self.owners[self.keys[i]]
+
+
+# --- WORKER (un processo per shard) ---
+def run_shard(shard_id, broker, port, server_options, metrics_port=None, log_level="INFO"):
+    # Import nel processo figlio: ogni worker ha il suo interprete
+    from edge_server import EdgeServer
+
+    logging.basicConfig(level=log_level, format=f"[Shard {shard_id}] %(message)s")
+
+    server = EdgeServer(
+        broker, port,
+        client_id=f"EdgeServer_Shard_{shard_id}_{os.getpid()}",
+        bootstrap_topic=TOPIC_SHARD.format(shard=shard_id, kind="bootstrap"),
+        status_topic=TOPIC_SHARD.format(shard=shard_id, kind="status"),
+        control_topic=None,
+        admin_topic=TOPIC_SHARD.format(shard=shard_id, kind="admin"),
+        mirror_legacy=False,
+        metrics_port=metrics_port,
+        **server_options
+    )
+    log.info(f"Avviato (pid {os.getpid()})")
+    try:
+        while True:
+            status = dict(server.status(), shard=shard_id, pid=os.getpid(), timestamp=time.time())
+            server.mqtt_client.publish(server.topic_status, json.dumps(status))
+            time.sleep(STATUS_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+
+
+# --- SUPERVISORE ---
+class ClusterSupervisor:
+    def __init__(self, workers, broker="localhost", port=1883, server_options=None,
+                 metrics_port=None, log_level="INFO"):
+        self.broker = broker
+        self.port = port
+        self.server_options = server_options or {}
+        self.metrics_port = metrics_port
+        self.log_level = log_level
+        self.processes = {}     # shard_id -> Process
+        self.started = {}       # shard_id -> istante di avvio
+        self.slots = {}         # shard_id -> posizione 0..workers-1 (porta /metrics = base + posizione)
+        self.shard_status = {}  # shard_id -> ultimo stato ricevuto
+        self.patients = {}      # patient_id -> payload di bootstrap (per il ribilanciamento)
+        self.owner = {}         # patient_id -> shard_id (None = in attesa di uno shard)
+        self.ring = HashRing()
+        self.next_shard = 0
+        # spawn, non fork: il supervisore ha già il thread di rete paho e self.lock
+        # in uso, e un fork a metà di un'acquisizione bloccherebbe il figlio
+        self.context = multiprocessing.get_context("spawn")
+        self.lock = threading.Lock()
+
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=f"EdgeCluster_{os.getpid()}")
+        self.client.on_message = self.on_message
+        self.client.connect(broker, port)
+        self.client.subscribe([
+            (TOPIC_BOOTSTRAP, 0),
+            (TOPIC_CONTROL, 0),
+            (TOPIC_SHARD.format(shard="+", kind="status"), 0),
+        ])
+        self.client.loop_start()
+
+        for _ in range(workers):
+            self.add_worker()
+
+        # HANDSHAKE invariato per Physical Twin e Unity (READY trattenuto);
+        # lo stato aggregato viaggia sullo stesso topic come JSON non trattenuto
+        self.client.publish(TOPIC_STATUS, "READY", retain=True)
+        log.info(f"[Cluster] {workers} shard avviati, stato READY inviato.")
+
+    # --- GESTIONE WORKER ---
+    def add_worker(self):
+        """
+        Avvia un worker. Entra nell'anello solo al suo primo stato (quando è
+        connesso e iscritto), così nessun bootstrap viene inviato nel vuoto.
+        """
+        shard_id = self.next_shard
+        self.next_shard += 1
+        with self.lock:
+            # Il sostituto di uno shard morto ne riprende la posizione (e la porta /metrics)
+            slot = min(set(range(len(self.slots) + 1)) - set(self.slots.values()))
+            self.slots[shard_id] = slot
+        metrics_port = self.metrics_port + slot if self.metrics_port else None
+        process = self.context.Process(
+            target=run_shard, daemon=True,
+            args=(shard_id, self.broker, self.port, self.server_options, metrics_port, self.log_level)
+        )
+        process.start()
+        with self.lock:
+            self.processes[shard_id] = process
+            self.started[shard_id] = time.time()
+        return shard_id
+
+    def join_ring(self, shard_id):
+        with self.lock:
+            if shard_id in self.ring.nodes or shard_id not in self.processes:
+                return
+            self.ring.add(shard_id)
+        log.info(f"[Cluster] ✅ Shard {shard_id} pronto")
+        self.rebalance()
+
+    def remove_worker(self, shard_id, terminate=True):
+        with self.lock:
+            process = self.processes.pop(shard_id, None)
+            self.started.pop(shard_id, None)
+            self.slots.pop(shard_id, None)
+            self.ring.remove(shard_id)
+            self.shard_status.pop(shard_id, None)
+            for patient_id, owner in list(self.owner.items()):
+                if owner == shard_id:
+                    del self.owner[patient_id]  # Sessione persa con il worker
+        if terminate and process is not None and process.is_alive():
+            process.terminate()
+        self.rebalance()
+
+    def rebalance(self):
+        """
+        Riassegna i pazienti il cui shard è cambiato.
+        La sessione riparte dal bootstrap sul nuovo shard (lo stato non migra).
+        """
+        moves = []
+        with self.lock:
+            for patient_id, payload in self.patients.items():
+                target = self.ring.node_for(patient_id)
+                if target is not None and self.owner.get(patient_id) != target:
+                    moves.append((patient_id, self.owner.get(patient_id), target, payload))
+                    self.owner[patient_id] = target
+        for patient_id, old, new, payload in moves:
+            if old is not None:
+                self.client.publish(TOPIC_SHARD.format(shard=old, kind="admin"),
+                                    json.dumps({"command": "evict", "patient_id": patient_id}))
+            self.client.publish(TOPIC_SHARD.format(shard=new, kind="bootstrap"), payload)
+        if moves:
+            log.info(f"[Cluster] Ribilanciamento: {len(moves)} pazienti spostati")
+
+    # --- MESSAGGI ---
+    def on_message(self, client, userdata, msg):
+        try:
+            if msg.topic == TOPIC_BOOTSTRAP:
+                data = json.loads(msg.payload.decode())
+                patient_id = str(data.get("meta", {}).get("patient_id", "default"))
+                with self.lock:
+                    if patient_id in self.patients:
+                        log.info(f"[Cluster] Ignorato bootstrap ({patient_id}: sessione già attiva).")
+                        return
+                    shard_id = self.ring.node_for(patient_id)
+                    self.patients[patient_id] = msg.payload
+                    self.owner[patient_id] = shard_id
+                if shard_id is None:
+                    log.warning(f"[Cluster] 📩 {patient_id} in attesa di uno shard pronto")
+                    return
+                self.client.publish(TOPIC_SHARD.format(shard=shard_id, kind="bootstrap"), msg.payload)
+                log.info(f"[Cluster] 📩 {patient_id} -> shard {shard_id}")
+            elif mqtt.topic_matches_sub(TOPIC_CONTROL, msg.topic):
+                self.route_control(msg.topic.split("/")[2], json.loads(msg.payload.decode()))
+            elif mqtt.topic_matches_sub(TOPIC_SHARD.format(shard="+", kind="status"), msg.topic):
+                if msg.payload == b"READY":
+                    return
+                status = json.loads(msg.payload.decode())
+                status["last_seen"] = time.time()
+                with self.lock:
+                    known = status.get("shard") in self.processes
+                    if known:
+                        self.shard_status[status["shard"]] = status
+                if known:
+                    self.join_ring(status["shard"])
+        except Exception as e:
+            log.error(f"[Cluster] Errore messaggio: {e}")
+
+    def route_control(self, patient_id, data):
+        """Inoltra il comando allo shard proprietario (gli altri non lo vedono)"""
+        command = data.get("command")
+        with self.lock:
+            if patient_id not in self.patients:
+                log.warning(f"[Cluster] Comando '{command}' per paziente sconosciuto: {patient_id}")
+                return
+            shard_id = self.owner.get(patient_id)
+            if command == "evict":
+                del self.patients[patient_id]
+                self.owner.pop(patient_id, None)
+        if shard_id is None:
+            log.warning(f"[Cluster] {patient_id} in attesa di uno shard: comando '{command}' non inoltrato")
+            return
+        self.client.publish(TOPIC_SHARD.format(shard=shard_id, kind="admin"),
+                            json.dumps(dict(data, patient_id=patient_id)))
+
+    def aggregate_status(self):
+        now = time.time()
+        with self.lock:
+            shards = {}
+            for shard_id, process in self.processes.items():
+                status = self.shard_status.get(shard_id, {})
+                if "last_seen" in status:
+                    responsive = now - status["last_seen"] < WORKER_TIMEOUT
+                else:
+                    # Ancora in avvio: il battito conta solo dal primo stato ricevuto
+                    responsive = now - self.started[shard_id] < STARTUP_TIMEOUT
+                shards[str(shard_id)] = {
+                    "alive": process.is_alive() and responsive,
+                    "ready": shard_id in self.ring.nodes,
+                    "pid": process.pid,
+                    "sessions": status.get("sessions", 0),
+                    "running": status.get("running", 0),
+                }
+            return {
+                "state": "READY",
+                "timestamp": now,
+                "workers": len(self.processes),
+                "patients": len(self.patients),
+                "sessions": sum(s["sessions"] for s in shards.values()),
+                "shards": shards,
+            }
+
+    def run(self, respawn=True):
+        try:
+            while True:
+                time.sleep(STATUS_INTERVAL)
+                status = self.aggregate_status()
+                self.client.publish(TOPIC_STATUS, json.dumps(status))
+
+                # Worker morti (processo terminato o muto): fuori dall'anello, pazienti ridistribuiti
+                for shard_id, info in status["shards"].items():
+                    if not info["alive"]:
+                        log.warning(f"[Cluster] ❌ Shard {shard_id} non risponde: ribilanciamento")
+                        self.remove_worker(int(shard_id))
+                        if respawn:
+                            self.add_worker()
+        except KeyboardInterrupt:
+            log.info("[Cluster] Stop.")
+            for process in self.processes.values():
+                process.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cluster Edge Server a processi")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Numero di processi worker")
+    parser.add_argument("--broker", default="localhost", help="Indirizzo del broker MQTT")
+    parser.add_argument("--port", type=int, default=1883, help="Porta del broker MQTT")
+    parser.add_argument("--no-respawn", action="store_true", help="Non sostituire i worker morti")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="fixed", help="Metodo di integrazione degli shard")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Secondi simulati per secondo reale")
+    parser.add_argument("--delta", action="store_true", help="Gli shard pubblicano solo le variazioni (delta + keyframe)")
+    parser.add_argument("--overrun", choices=POLICIES, default="catch_up", help="Tick in ritardo negli shard: recupera o salta")
+    parser.add_argument("--replicas", type=int, default=1, help="Repliche Monte Carlo per tumore negli shard")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Porta base di /metrics (un worker per porta: base .. base + workers - 1)")
+    parser.add_argument("--log-level", default="INFO", help="Livello di log di supervisore e shard")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+
+    supervisor = ClusterSupervisor(
+        args.workers, args.broker, args.port,
+        server_options={"integrator": args.integrator, "time_scale": args.time_scale, "delta": args.delta,
+                        "overrun_policy": args.overrun, "replicas": args.replicas},
+        metrics_port=args.metrics_port, log_level=args.log_level.upper()
+    )
+    supervisor.run(respawn=not args.no_respawn)
@@ -1,8 +1,20 @@
+import math
 import time
 import json
+import hashlib
 import threading
 import paho.mqtt.client as mqtt
 import random
+import logging
+import argparse
+from integrators import INTEGRATORS
+from tumor_population import TumorPopulation, DEFAULT_BANDS
+from wire_codec import WireEncoder, CODECS, ENSEMBLE_BANDS, parse_topic_codecs
+from metrics import MetricsRegistry, serve_metrics
+from delta_stream import DeltaStream, DEFAULT_KEYFRAME_INTERVAL, DEFAULT_RETAIN_INTERVAL, parse_deadband
+from tick_scheduler import TickScheduler, POLICIES, DEFAULT_COALESCE
+
+log = logging.getLogger("edge_server")
 
 # --- 1. MODELLO MATEMATICO PIÙ REALISTICO ---
 class TumorModel:
@@ -19,9 +31,11 @@ class TumorModel:
         
         self.last_update_time = time.time()
 
-    def update(self):
+    def update(self, dt=None):
+        # dt esplicito = passo fisso deterministico; altrimenti orologio reale
         current_time = time.time()
-        dt = current_time - self.last_update_time
+        if dt is None:
+            dt = current_time - self.last_update_time
         
         # FATTORE RANDOMICO (CAOS BIOLOGICO)
         # La crescita varia del +/- 20% ogni volta per non sembrare robotica
@@ -55,91 +69,446 @@ class TumorModel:
             "status": "growing" if delta_cellularity > 0 else "healing"
         }
 
+# --- SESSIONE PAZIENTE ---
+class PatientSession:
+    def __init__(self, patient_id, tumors, topic, state_topic=None, stream=None, tick_rate=0.1):
+        self.patient_id = patient_id
+        self.tumors = tumors          # nome -> indice nella popolazione condivisa
+        self.topic = topic            # digitaltwin/breast/<patient_id>/tumor
+        self.state_topic = state_topic  # digitaltwin/breast/<patient_id>/state (trattenuto)
+        self.stream = stream          # DeltaStream (None = stato completo a ogni tick)
+        self.tick_rate = tick_rate    # Secondi reali tra due tick di questa sessione
+        self.seq = 0
+        self.running = True
+        self.sim_time = 0.0
+        self.next_retain = float("-inf")  # Prossimo aggiornamento dello stato trattenuto
+        self.created_at = time.time()
+
 # --- SERVER EDGE ---
 class EdgeServer:
-    def __init__(self, broker_address="localhost", broker_port=1883):
+    def __init__(self, broker_address="localhost", broker_port=1883,
+                 integrator="fixed", time_scale=1.0, max_speed=False, seed=None,
+                 codec="json", topic_codecs=None, client_id="EdgeServer_Node",
+                 bootstrap_topic="digitaltwin/breast/bootstrap",
+                 status_topic="digitaltwin/system/status",
+                 control_topic="digitaltwin/breast/+/control", admin_topic=None, mirror_legacy=True,
+                 metrics_port=None, stats_topic=None, stats_interval=5.0,
+                 delta=False, deadband=None, keyframe_interval=DEFAULT_KEYFRAME_INTERVAL,
+                 retain_interval=DEFAULT_RETAIN_INTERVAL,
+                 tick_rate=0.1, overrun_policy="catch_up", coalesce=DEFAULT_COALESCE,
+                 replicas=1, bands=DEFAULT_BANDS):
         self.is_running = False
-        self.tick_rate = 0.1 
+        self.tick_rate = tick_rate  # Default per le sessioni (il bootstrap può chiederne un altro)
+
+        # TEMPO SIMULATO: ogni tick avanza di tick_rate * time_scale secondi,
+        # indipendentemente dal jitter dello scheduler (traiettorie riproducibili).
+        # max_speed=True elimina l'attesa tra i tick ("il più veloce possibile").
+        self.integrator = integrator
+        self.time_scale = time_scale
+        self.max_speed = max_speed
+        # Senza --seed se ne estrae uno: le chiavi del rumore restano diverse a ogni avvio
+        self.seed = seed if seed is not None else random.getrandbits(32)
+
+        # SESSIONI MULTI-PAZIENTE: tutte nella stessa popolazione vettoriale,
+        # avanzate da un unico scheduler (un solo thread per tutti i pazienti)
+        # Il rumore "counter" con chiave per tumore (paziente + nome + seed) rende la
+        # traiettoria di un paziente riproducibile qualunque siano le altre sessioni
+        # sul nodo e comunque vengano raggruppati i batch.
+        # ENSEMBLE: con replicas > 1 ogni tumore gira come K repliche e si pubblicano
+        # mediana + bande percentili.
+        self.replicas = replicas
+        self.population = TumorPopulation(integrator=self.integrator, seed=self.seed, noise="counter",
+                                          replicas=replicas, bands=bands)
+        self.sessions = {}
+        self.lock = threading.Lock()
 
-        self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id="EdgeServer_Node")
+        # SCADENZE ASSOLUTE: ogni sessione ha la sua griglia epoch + k * tick_rate
+        # sull'orologio monotono (niente deriva); le sessioni in scadenza nello
+        # stesso istante arrivano in un unico batch. Tick in ritardo: catch_up
+        # recupera i passi persi, skip salta alla prossima scadenza.
+        self.scheduler = TickScheduler(overrun_policy, coalesce)
+        self.sessions_changed = threading.Event()  # Sveglia il ciclo max_speed senza sessioni attive
+
+        self.mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id)
         self.broker_address = broker_address
         self.broker_port = broker_port
         
-        self.topic_pub = "digitaltwin/breast/tumor"
-        self.topic_sub = "digitaltwin/breast/bootstrap"
-        self.topic_status = "digitaltwin/system/status" # NUOVO TOPIC DI STATO
+        self.topic_pub = "digitaltwin/breast/tumor"  # Topic storico (Unity, sessione singola)
+        self.topic_sub = bootstrap_topic
+        self.topic_status = status_topic # NUOVO TOPIC DI STATO
+        self.mirror_legacy = mirror_legacy
+        # Topic per paziente
+        self.topic_patient_pub = "digitaltwin/breast/{patient_id}/tumor"
+        self.topic_control = control_topic  # {"command": "start" | "stop" | "evict"}
+        # Topic di amministrazione (cluster): {"command": ..., "patient_id": ...}
+        # Negli shard control_topic=None: i comandi arrivano solo da qui, via supervisore
+        self.topic_admin = admin_topic
+
+        # PUBBLICAZIONE A VARIAZIONE: solo i tumori usciti dalla banda morta,
+        # keyframe completi periodici, numeri di sequenza e ultimo stato
+        # completo trattenuto per chi si iscrive dopo
+        self.delta = delta
+        self.deadband = deadband
+        self.keyframe_interval = keyframe_interval
+        self.retain_interval = retain_interval
+        self.topic_patient_state = "digitaltwin/breast/{patient_id}/state"
+        # Stati trattenuti da cancellare dopo un evict: li pubblica il thread della
+        # simulazione, DOPO gli eventuali messaggi della sessione già in uscita
+        self.retained_clears = []
+
+        # FORMATO DI TRASPORTO: codec di default + eventuali codec per topic
+        # (il JSON storico resta il default per i client Unity)
+        self.codec = codec
+        self.topic_codecs = topic_codecs or {}
+        self.encoders = {}
+        # Gli ensemble hanno il loro schema struct (con bande e repliche), a colonne fisse
+        self.wire_schema = "tumor_ensemble" if replicas > 1 else "tumor_state"
+        if (replicas > 1 and tuple(float(b) for b in bands) != ENSEMBLE_BANDS
+                and "struct" in {codec, *self.topic_codecs.values()}):
+            raise ValueError(f"Il codec struct trasporta solo le bande {ENSEMBLE_BANDS}: "
+                             f"usa json/msgpack per --bands {','.join(f'{b:g}' for b in bands)}")
+
+        # STRUMENTAZIONE: durata dei tick, sforamenti, latenza di publish,
+        # messaggi/byte inviati, sessioni e coda in uscita del client MQTT
+        self.metrics = MetricsRegistry("edge_")
+        self.m_tick = self.metrics.histogram("tick_seconds", "Durata di un tick (step + payload + publish)")
+        self.m_step = self.metrics.histogram("step_seconds", "Durata dello step vettoriale della popolazione")
+        self.m_overruns = self.metrics.counter("tick_overruns", "Tick più lunghi di tick_rate")
+        self.m_lag = self.metrics.histogram("tick_lag_seconds", "Ritardo dell'avvio del tick rispetto alla scadenza")
+        self.metrics.gauge("ticks_skipped", "Tick saltati (skip o oltre il limite di recupero)",
+                           fn=lambda: self.scheduler.skipped)
+        self.metrics.gauge("ticks_caught_up", "Tick recuperati in ritardo (catch_up)",
+                           fn=lambda: self.scheduler.caught_up)
+        self.m_publish = self.metrics.histogram("publish_seconds", "Durata di codifica + mqtt publish per messaggio")
+        self.m_messages = self.metrics.counter("messages", "Messaggi pubblicati")
+        self.m_bytes = self.metrics.counter("bytes", "Byte di payload pubblicati")
+        self.m_suppressed = self.metrics.counter("suppressed", "Aggiornamenti non inviati (entro la banda morta)")
+        self.m_keyframes = self.metrics.counter("keyframes", "Keyframe inviati")
+        self.metrics.gauge("sessions", "Sessioni paziente", fn=lambda: len(self.sessions))
+        self.metrics.gauge("sessions_running", "Sessioni in esecuzione",
+                           fn=lambda: sum(1 for s in list(self.sessions.values()) if s.running))
+        self.metrics.gauge("tumors", "Tumori nella popolazione", fn=lambda: int(self.population.active.sum()))
+        # Pacchetti in attesa di scrittura sul socket (attributo interno di paho)
+        self.metrics.gauge("mqtt_out_queue", "Pacchetti MQTT in coda di uscita",
+                           fn=lambda: len(self.mqtt_client._out_packet))
+        self.metrics_server = serve_metrics(self.metrics, metrics_port) if metrics_port else None
+        self.topic_stats = stats_topic
+        self.stats_interval = stats_interval
         
         self.mqtt_client.on_message = self.on_message
 
         try:
             self.mqtt_client.connect(self.broker_address, self.broker_port)
-            self.mqtt_client.subscribe(self.topic_sub)
+            topics = [(self.topic_sub, 0)]
+            if self.topic_control:
+                topics.append((self.topic_control, 0))
+            if self.topic_admin:
+                topics.append((self.topic_admin, 0))
+            self.mqtt_client.subscribe(topics)
             self.mqtt_client.loop_start()
             
             # --- NOTIFICA DI DISPONIBILITÀ (HANDSHAKE) ---
             # retain=True significa: "tieni questo messaggio in memoria per chi arriva dopo"
             self.mqtt_client.publish(self.topic_status, "READY", retain=True)
-            print(f"[MQTT] Connesso e inviato stato READY.")
+            log.info("[MQTT] Connesso e inviato stato READY.")
             
         except Exception as e:
-            print(f"[MQTT] ERRORE: {e}")
+            log.error(f"[MQTT] ERRORE: {e}")
+        if self.metrics_server:
+            log.info(f"[Metrics] Endpoint http://0.0.0.0:{metrics_port}/metrics")
+
+    def encoder_for(self, topic):
+        if topic not in self.encoders:
+            codec = self.codec
+            for pattern, topic_codec in self.topic_codecs.items():
+                if mqtt.topic_matches_sub(pattern, topic):
+                    codec = topic_codec
+                    break
+            self.encoders[topic] = WireEncoder(codec, self.wire_schema)
+        return self.encoders[topic]
 
     def on_message(self, client, userdata, msg):
         topic = msg.topic
+        is_control = bool(self.topic_control) and mqtt.topic_matches_sub(self.topic_control, topic)
+        if topic not in (self.topic_sub, self.topic_admin) and not is_control:
+            return  # Messaggi trattenuti di altri topic consegnati da alcuni broker
         try:
             payload_str = msg.payload.decode()
             data = json.loads(payload_str)
             
             if topic == self.topic_sub:
-                if not self.is_running:
-                    print(f"\n[Server] 📩 BOOTSTRAP RICEVUTO! Configurazione in corso...")
+                patient_id = str(data.get("meta", {}).get("patient_id", "default"))
+                if patient_id not in self.sessions:
+                    log.info(f"[Server] 📩 BOOTSTRAP RICEVUTO ({patient_id})! Configurazione in corso...")
                     self.initialize_session(data)
                 else:
-                    print("[Server] Ignorato bootstrap (simulazione già attiva).")
+                    log.info(f"[Server] Ignorato bootstrap ({patient_id}: sessione già attiva).")
+            elif is_control:
+                self.handle_control(topic.split("/")[2], data.get("command"))
+            elif topic == self.topic_admin:
+                self.handle_control(str(data.get("patient_id")), data.get("command"))
         except Exception as e:
-            print(f"[MQTT] Errore parsing: {e}")
+            log.warning(f"[MQTT] Errore parsing: {e}")
 
     def initialize_session(self, patient_data):
-        print(f"[Server] Paziente: {patient_data['meta']['patient_id']}")
+        meta = patient_data.get("meta", {})
+        patient_id = str(meta.get("patient_id", "default"))
+        initial_state = patient_data.get("initial_state", {})
+        tick_rate = float(meta.get("tick_rate") or self.tick_rate)
+        if not (tick_rate > 0 and math.isfinite(tick_rate)):
+            # Un periodo nullo o negativo bloccherebbe lo scheduler (e con lui tutto il server)
+            log.warning(f"[Server] tick_rate non valido ({tick_rate}) per {patient_id}: uso {self.tick_rate}s")
+            tick_rate = self.tick_rate
+        log.info(f"[Server] Paziente: {patient_id}")
         # Inizializza due tumori con parametri leggermente diversi
-        self.tumors = {
-            "left": TumorModel(initial_radius=0.5, initial_cellularity=10.0),
-            "right": TumorModel(initial_radius=0.7, initial_cellularity=20.0) 
-        }
+        # (tutti i tumori vivono in un'unica popolazione vettoriale)
+        with self.lock:
+            tumors = {
+                "left": self.population.add(initial_radius=initial_state.get("left_tumor_radius", 0.5),
+                                            initial_cellularity=10.0,
+                                            noise_key=self.noise_key(patient_id, "left")),
+                "right": self.population.add(initial_radius=initial_state.get("right_tumor_radius", 0.7),
+                                             initial_cellularity=20.0,
+                                             noise_key=self.noise_key(patient_id, "right"))
+            }
+            self.sessions[patient_id] = PatientSession(
+                patient_id, tumors, self.topic_patient_pub.format(patient_id=patient_id),
+                state_topic=self.topic_patient_state.format(patient_id=patient_id),
+                stream=DeltaStream(self.deadband, self.keyframe_interval) if self.delta else None,
+                tick_rate=tick_rate
+            )
+            self.scheduler.add(patient_id, tick_rate)
+        self.sessions_changed.set()
         self.start_simulation()
+        return self.sessions[patient_id]
+
+    def noise_key(self, patient_id, tumor):
+        digest = hashlib.blake2b(f"{patient_id}:{tumor}:{self.seed}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little")
+
+    def handle_control(self, patient_id, command):
+        with self.lock:
+            session = self.sessions.get(patient_id)
+            if session is None:
+                log.warning(f"[Server] Comando '{command}' per paziente sconosciuto: {patient_id}")
+                return
+            indices = list(session.tumors.values())
+            if command == "stop":
+                session.running = False
+                self.population.set_active(indices, False)
+                self.scheduler.remove(patient_id)
+            elif command == "start":
+                session.running = True
+                self.population.set_active(indices, True)
+                self.scheduler.add(patient_id, session.tick_rate)
+                self.sessions_changed.set()
+                if session.stream:
+                    session.stream.force_keyframe()
+            elif command == "evict":
+                self.population.remove(indices)
+                self.scheduler.remove(patient_id)
+                del self.sessions[patient_id]
+                if self.delta:
+                    self.retained_clears.append(session.state_topic)
+            else:
+                log.warning(f"[Server] Comando sconosciuto: {command}")
+                return
+        log.info(f"[Server] {patient_id}: {command} (sessioni attive: {len(self.sessions)})")
+
+    def set_tick_rate(self, patient_id, tick_rate):
+        """Cambia la cadenza di una sessione (la nuova griglia parte dalla prossima scadenza)"""
+        if not (tick_rate > 0 and math.isfinite(tick_rate)):
+            raise ValueError(f"tick_rate non valido: {tick_rate}")
+        with self.lock:
+            session = self.sessions[patient_id]
+            session.tick_rate = tick_rate
+            if session.running:
+                self.scheduler.add(patient_id, tick_rate)
+
+    def status(self):
+        """Riepilogo delle sessioni (usato dal supervisore del cluster)"""
+        with self.lock:
+            return {
+                "sessions": len(self.sessions),
+                "running": sum(1 for s in self.sessions.values() if s.running),
+                "patients": sorted(self.sessions),
+            }
 
     def start_simulation(self):
+        # Un solo scheduler condiviso, avviato alla prima sessione
+        if self.is_running:
+            return
         self.is_running = True
-        print(f"[Server] 🚀 Simulazione avviata.")
-        simulation_thread = threading.Thread(target=self._run_loop)
+        log.info("[Server] 🚀 Simulazione avviata.")
+        simulation_thread = threading.Thread(target=self._run_loop, daemon=True)
         simulation_thread.start()
 
+    def publish(self, topic, payload, retain=False):
+        start = time.perf_counter()
+        data = self.encoder_for(topic).encode(payload)
+        self.mqtt_client.publish(topic, data, retain=retain)
+        self.m_publish.observe(time.perf_counter() - start)
+        self.m_messages.inc()
+        self.m_bytes.inc(len(data))
+
+    def _due_sessions(self):
+        """[(sessione, tick, scadenza)] da eseguire adesso"""
+        if self.max_speed:
+            # Nessuna attesa: un tick per ogni sessione attiva a ogni giro
+            self.sessions_changed.clear()
+            with self.lock:
+                due = [(s, 1, None) for s in self.sessions.values() if s.running]
+            if not due:
+                # Niente da eseguire: si attende una sessione (come next_batch) invece di girare a vuoto
+                self.sessions_changed.wait(0.5)
+            return due
+        batch = self.scheduler.next_batch(timeout=0.5)
+        now = self.scheduler.clock()
+        due = []
+        with self.lock:
+            for patient_id, ticks, deadline in batch:
+                session = self.sessions.get(patient_id)
+                if session is None or not session.running:
+                    continue
+                self.m_lag.observe(now - deadline)
+                due.append((session, ticks, deadline))
+        return due
+
     def _run_loop(self):
+        next_stats = time.monotonic() + self.stats_interval
         while self.is_running:
-            start_time = time.time()
-            
-            status_left = self.tumors["left"].update()
-            status_right = self.tumors["right"].update()
+            due = self._due_sessions()
+            tick_start = time.perf_counter()
 
-            payload = json.dumps({
-                "timestamp": time.time(),
-                "tumors": { "left": status_left, "right": status_right }
-            })
-            
-            self.mqtt_client.publish(self.topic_pub, payload)
-            
-            # Debug ogni tanto
-            if random.random() < 0.05:
-                print(f">> [SIM] L: {status_left['radius']} | R: {status_right['radius']}")
+            with self.lock:
+                # Sessioni con la stessa cadenza e gli stessi tick da recuperare:
+                # un solo step vettoriale per gruppo (di solito un gruppo per batch)
+                groups = {}
+                for session, ticks, deadline in due:
+                    if session.running and self.sessions.get(session.patient_id) is session:  # Non rimossa nel frattempo
+                        groups.setdefault((session.tick_rate, ticks), []).append((session, deadline))
+                with self.m_step.time():
+                    for (tick_rate, ticks), members in groups.items():
+                        sim_dt = tick_rate * self.time_scale
+                        indices = [i for session, _ in members for i in session.tumors.values()]
+                        for _ in range(ticks):
+                            self.population.step(sim_dt, indices)
+                        for session, _ in members:
+                            session.sim_time += sim_dt * ticks
+
+                members = [m for group in groups.values() for m in group]
+                running = sum(1 for s in self.sessions.values() if s.running)
+
+                # Una sola conversione array -> payload per tutte le sessioni
+                indices = [i for s, _ in members for i in s.tumors.values()]
+                states = iter(self.population.payloads(indices))
+                messages = [
+                    (session, deadline, {name: next(states) for name in session.tumors})
+                    for session, deadline in members
+                ]
 
-            elapsed = time.time() - start_time
-            sleep_time = self.tick_rate - elapsed
-            if sleep_time > 0: time.sleep(sleep_time)
+            wall_now = time.time()
+            for session, deadline, tumors_state in messages:
+                # Timestamp = scadenza del tick (griglia esatta, senza il jitter del risveglio)
+                now = wall_now if deadline is None else self.scheduler.wall_time(deadline)
+                payload = {
+                    "timestamp": now,
+                    "sim_time": round(session.sim_time, 4),
+                    "patient_id": session.patient_id,
+                    "tumors": tumors_state
+                }
+                if self.replicas > 1:
+                    payload["replicas"] = self.replicas
+                if session.stream is None:
+                    session.seq += 1
+                    payload.update(seq=session.seq, keyframe=True)
+                    self.publish(session.topic, payload)
+                    # Con un solo paziente si pubblica anche sul topic storico (client Unity)
+                    if self.mirror_legacy and running == 1:
+                        self.publish(self.topic_pub, payload)
+                    continue
+
+                update = session.stream.update(tumors_state, now)
+                if update is None:
+                    self.m_suppressed.inc()
+                    continue
+                changed, keyframe = update
+                if keyframe:
+                    self.m_keyframes.inc()
+                payload.update(seq=session.stream.seq, keyframe=keyframe, tumors=changed)
+                self.publish(session.topic, payload)
+                # Stato completo trattenuto ai keyframe e al più ogni retain_interval:
+                # chi si iscrive dopo parte da dati recenti senza che ogni variazione
+                # riscriva il messaggio trattenuto sul broker
+                if keyframe or now >= session.next_retain:
+                    session.next_retain = now + self.retain_interval
+                    self.publish(session.state_topic,
+                                 dict(payload, keyframe=True, tumors=session.stream.snapshot()), retain=True)
+                # Con un solo paziente, stato completo sul topic storico (Unity si
+                # aspetta sempre entrambi i tumori)
+                if self.mirror_legacy and running == 1:
+                    self.publish(self.topic_pub, dict(payload, keyframe=True, tumors=session.stream.snapshot()))
+
+            # Messaggio vuoto trattenuto = cancella l'ultimo stato dal broker (sessioni rimosse)
+            with self.lock:
+                clears, self.retained_clears = self.retained_clears, []
+            for topic in clears:
+                self.mqtt_client.publish(topic, b"", retain=True)
+
+            # Debug ogni tanto (solo con --log-level DEBUG)
+            if messages and log.isEnabledFor(logging.DEBUG) and random.random() < 0.05:
+                session, _, tumors_state = messages[0]
+                log.debug(f">> [SIM] {len(messages)} pazienti | {session.patient_id} "
+                          f"L: {tumors_state['left']['radius']} | R: {tumors_state['right']['radius']}")
+
+            if self.topic_stats and time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + self.stats_interval
+                self.mqtt_client.publish(self.topic_stats, json.dumps(self.metrics.snapshot()))
+
+            if not messages:
+                continue
+            tick_elapsed = time.perf_counter() - tick_start
+            self.m_tick.observe(tick_elapsed)
+            if tick_elapsed > min(session.tick_rate for session, _, _ in messages):
+                self.m_overruns.inc()
 
 if __name__ == "__main__":
-    server = EdgeServer()
-    print("[Main] Server attivo. In attesa di Physical Twin...")
+    parser = argparse.ArgumentParser(description="Edge Server Digital Twin")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="fixed", help="Metodo di integrazione (euler: un solo passo per tick, instabile con --time-scale alto)")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Secondi simulati per secondo reale (es. 1000)")
+    parser.add_argument("--max-speed", action="store_true", help="Nessuna attesa tra i tick")
+    parser.add_argument("--tick-rate", type=float, default=0.1, help="Secondi reali tra due tick (default per sessione)")
+    parser.add_argument("--overrun", choices=POLICIES, default="catch_up", help="Tick in ritardo: recupera o salta")
+    parser.add_argument("--coalesce", type=float, default=DEFAULT_COALESCE, help="Finestra (s) per raggruppare le scadenze")
+    parser.add_argument("--replicas", type=int, default=1, help="Repliche Monte Carlo per tumore (1 = singola traiettoria)")
+    parser.add_argument("--bands", default=",".join(f"{b:g}" for b in DEFAULT_BANDS), help="Percentili pubblicati con la mediana, es. '5,25,75,95'")
+    parser.add_argument("--seed", type=int, default=None, help="Seed per traiettorie riproducibili")
+    parser.add_argument("--codec", choices=CODECS, default="json", help="Formato di trasporto di default")
+    parser.add_argument("--topic-codecs", default="", help="Codec per topic, es. 'digitaltwin/breast/tumor=struct'")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Porta HTTP per /metrics (formato Prometheus)")
+    parser.add_argument("--stats-topic", default=None, help="Topic MQTT per le statistiche periodiche (JSON)")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="Secondi tra due pubblicazioni delle statistiche")
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING, ERROR")
+    parser.add_argument("--delta", action="store_true", help="Pubblica solo le variazioni oltre la banda morta")
+    parser.add_argument("--deadband", default="", help="Banda morta per campo, es. 'radius=0.005,cellularity=0.1'")
+    parser.add_argument("--keyframe-interval", type=float, default=DEFAULT_KEYFRAME_INTERVAL, help="Secondi tra due keyframe completi")
+    parser.add_argument("--retain-interval", type=float, default=DEFAULT_RETAIN_INTERVAL, help="Secondi minimi tra due aggiornamenti dello stato trattenuto (con --delta)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(message)s")
+    if not (args.tick_rate > 0 and math.isfinite(args.tick_rate)):
+        parser.error("--tick-rate deve essere un numero positivo")
+
+    server = EdgeServer(integrator=args.integrator, time_scale=args.time_scale,
+                        max_speed=args.max_speed, seed=args.seed,
+                        codec=args.codec, topic_codecs=parse_topic_codecs(args.topic_codecs),
+                        metrics_port=args.metrics_port, stats_topic=args.stats_topic,
+                        stats_interval=args.stats_interval, delta=args.delta,
+                        deadband=parse_deadband(args.deadband), keyframe_interval=args.keyframe_interval,
+                        retain_interval=args.retain_interval,
+                        tick_rate=args.tick_rate, overrun_policy=args.overrun, coalesce=args.coalesce,
+                        replicas=args.replicas, bands=[float(b) for b in args.bands.split(",") if b])
+    log.info("[Main] Server attivo. In attesa di Physical Twin...")
     try:
         while True: time.sleep(1)
     except KeyboardInterrupt:
-        print("Stop.")
\ No newline at end of file
+        log.info("Stop.")
\ No newline at end of file
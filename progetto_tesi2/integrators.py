@@ -0,0 +1,134 @@
+import numpy as np
+
+# --- INTEGRATORI PER IL MODELLO TUMORALE ---
+# Equazioni (per ogni tumore, con k = tasso di proliferazione * random_flux):
+#   dN/dt = k*N*(1 - N/theta) - d*N
+#   dd/dt = -beta*d
+# Tutte le funzioni lavorano su array (un elemento per tumore) e restituiscono
+# (N, d) dopo un intervallo dt. Il random_flux resta costante dentro lo step.
+
+INTEGRATORS = ("euler", "fixed", "rk45", "exact")
+
+
+def _rhs(N, d, k, theta, beta):
+    return k * N * (1 - N / theta) - d * N, -beta * d
+
+
+def euler_step(N, d, k, theta, beta, dt):
+    """Un singolo passo di Eulero esplicito (comportamento storico di TumorModel)"""
+    dN, dd = _rhs(N, d, k, theta, beta)
+    N = np.maximum(N + dN * dt, 0.0)
+    d = np.maximum(d + dd * dt, 0.0)
+    return N, d
+
+
+def fixed_step(N, d, k, theta, beta, dt, max_step=0.1):
+    """Eulero esplicito a passo fisso: dt viene diviso in sotto-passi <= max_step"""
+    n_sub = max(1, int(np.ceil(dt / max_step)))
+    h = dt / n_sub
+    for _ in range(n_sub):
+        N, d = euler_step(N, d, k, theta, beta, h)
+    return N, d
+
+
+# Coefficienti Dormand-Prince 5(4)
+_DP_A = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+_DP_B5 = (35 / 384, 0.0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0.0)
+_DP_B4 = (5179 / 57600, 0.0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40)
+
+
+def rk45_step(N, d, k, theta, beta, dt, rtol=1e-6, atol=1e-9, first_step=None):
+    """
+    Runge-Kutta adattivo (Dormand-Prince 5(4)).
+    Il passo è condiviso da tutta la popolazione e viene scelto sull'errore peggiore.
+    """
+    t = 0.0
+    h = dt if first_step is None else min(first_step, dt)
+    while t < dt:
+        h = min(h, dt - t)
+        kN, kd = [], []
+        for stage in range(7):
+            Ns, ds = N, d
+            for j, a in enumerate(_DP_A[stage]):
+                Ns = Ns + h * a * kN[j]
+                ds = ds + h * a * kd[j]
+            fN, fd = _rhs(Ns, ds, k, theta, beta)
+            kN.append(fN)
+            kd.append(fd)
+
+        N5 = N + h * sum(b * f for b, f in zip(_DP_B5, kN))
+        d5 = d + h * sum(b * f for b, f in zip(_DP_B5, kd))
+        N4 = N + h * sum(b * f for b, f in zip(_DP_B4, kN))
+        d4 = d + h * sum(b * f for b, f in zip(_DP_B4, kd))
+
+        scale_N = atol + rtol * np.maximum(np.abs(N), np.abs(N5))
+        scale_d = atol + rtol * np.maximum(np.abs(d), np.abs(d5))
+        err = max(
+            float(np.max(np.abs(N5 - N4) / scale_N, initial=0.0)),
+            float(np.max(np.abs(d5 - d4) / scale_d, initial=0.0)),
+        )
+
+        if err <= 1.0:
+            t += h
+            N, d = np.maximum(N5, 0.0), np.maximum(d5, 0.0)
+        # Controllo del passo classico (fattore di sicurezza 0.9, limiti 0.2-5)
+        factor = 5.0 if err == 0.0 else min(5.0, max(0.2, 0.9 * err ** -0.2))
+        h *= factor
+    return N, d
+
+
+def exact_step(N, d, k, theta, beta, dt, rtol=1e-6, atol=1e-9):
+    """
+    Soluzione esatta dove esiste in forma chiusa:
+      - farmaco nullo o costante (beta = 0): logistica con tasso r = k - d
+      - farmaco: d(t) = d0 * exp(-beta*t) sempre esatto
+    Con farmaco attivo E decadimento (d > 0 e beta > 0) l'integrale non è
+    elementare: per quei tumori si ricade su rk45_step.
+    """
+    N = np.asarray(N, dtype=float)
+    d = np.asarray(d, dtype=float)
+    k = np.broadcast_to(k, N.shape)
+    beta = np.broadcast_to(beta, N.shape)
+
+    N_new = np.empty_like(N)
+    d_new = d * np.exp(-beta * dt)
+
+    closed = (d == 0) | (beta == 0)
+    if closed.any():
+        r = k[closed] - d[closed]
+        rt = np.clip(r * dt, -700.0, 700.0)
+        # (1 - e^{-rt}) / r, con limite t per r -> 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            growth = np.where(r != 0, -np.expm1(-rt) / r, dt)
+        N0 = N[closed]
+        N_new[closed] = N0 / (np.exp(-rt) + N0 * (k[closed] / theta) * growth)
+
+    if (~closed).any():
+        open_ = ~closed
+        N_new[open_], d_new[open_] = rk45_step(
+            N[open_], d[open_], k[open_], theta, beta[open_], dt, rtol=rtol, atol=atol
+        )
+    return np.maximum(N_new, 0.0), d_new
+
+
+def integrate(method, N, d, k, theta, beta, dt, **options):
+    """Punto di ingresso unico: method in INTEGRATORS"""
+    if method == "euler":
+        return euler_step(N, d, k, theta, beta, dt)
+    if method == "fixed":
+        return fixed_step(N, d, k, theta, beta, dt, max_step=options.get("max_step", 0.1))
+    if method == "rk45":
+        return rk45_step(N, d, k, theta, beta, dt,
+                         rtol=options.get("rtol", 1e-6), atol=options.get("atol", 1e-9))
+    if method == "exact":
+        return exact_step(N, d, k, theta, beta, dt,
+                          rtol=options.get("rtol", 1e-6), atol=options.get("atol", 1e-9))
+    raise ValueError(f"Integratore sconosciuto: {method} (disponibili: {', '.join(INTEGRATORS)})")
@@ -1,7 +1,12 @@
 import time
 import json
 import random
+import asyncio
+import argparse
+import csv
+import numpy as np
 import paho.mqtt.client as mqtt
+from wire_codec import decode
 
 # Variabile per coordinare l'invio
 server_is_ready = False
@@ -26,16 +31,268 @@ def get_patient_data(patient_id):
         "config": { "risk_factors": { "genetic": 0.05 } }
     }
 
-if __name__ == "__main__":
-    BROKER = "127.0.0.1"
-    PORT = 1883
 
+# --- GENERATORE DI CARICO: N PHYSICAL TWIN SU ASYNCIO ---
+# Ogni paziente simulato è un dispositivo con il proprio client MQTT (una
+# connessione per paziente, come in reparto). Tutti i client girano in un solo
+# thread: i socket di paho sono registrati sul loop asyncio (add_reader /
+# add_writer) invece di avere un thread loop_start() ciascuno.
+# Per ogni paziente: connessione, iscrizione al suo topic di aggiornamento,
+# bootstrap con un record di data.csv; gli arrivi seguono un processo
+# configurabile. Misure: tempo bootstrap -> primo aggiornamento, frequenza
+# degli aggiornamenti e messaggi persi (buchi nei numeri di sequenza).
+CSV_FILENAME = "data.csv"
+ARRIVALS = ("poisson", "uniform", "burst")
+TOPIC_STATUS = "digitaltwin/system/status"
+TOPIC_BOOTSTRAP = "digitaltwin/breast/bootstrap"
+TOPIC_UPDATES = "digitaltwin/breast/{patient_id}/tumor"
+TOPIC_CONTROL = "digitaltwin/breast/{patient_id}/control"
+
+
+def load_records(csv_file=CSV_FILENAME):
+    with open(csv_file, newline="") as f:
+        return [row for row in csv.DictReader(f) if row.get("id")]
+
+
+def bootstrap_payload(patient_id, record):
+    """Bootstrap da un record del dataset (raggi iniziali = radius_mean / radius_worst)"""
+    features = {k: float(v) for k, v in record.items() if k and k not in ("id", "diagnosis") and v}
+    return {
+        "meta": {"timestamp": time.time(), "patient_id": patient_id, "source_id": record["id"],
+                 "diagnosis": record.get("diagnosis")},
+        "initial_state": {
+            "left_tumor_radius": features.get("radius_mean", 0.5),
+            "right_tumor_radius": features.get("radius_worst", 0.7),
+        },
+        "features": features,
+    }
+
+
+def arrival_delays(process, count, rate, rng):
+    """Attese tra un arrivo e il successivo (secondi)"""
+    if process == "burst" or rate <= 0:
+        return [0.0] * count
+    if process == "uniform":
+        return [1.0 / rate] * count
+    if process == "poisson":
+        return [rng.expovariate(rate) for _ in range(count)]
+    raise ValueError(f"Processo di arrivo sconosciuto: {process} (disponibili: {', '.join(ARRIVALS)})")
+
+
+class AsyncioMqtt:
+    """Collega il socket di un client paho al loop asyncio (niente thread di rete)"""
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc is not None:
+            self.misc.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        # Keepalive e ritrasmissioni (quello che loop_forever fa ogni secondo)
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+
+async def connect(loop, client_id, broker, port):
+    client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id)
+    AsyncioMqtt(loop, client)
+    connected = loop.create_future()
+
+    def on_connect(client, userdata, flags, rc):
+        if connected.done():
+            return
+        if rc == 0:
+            connected.set_result(client)
+        else:
+            connected.set_exception(ConnectionError(f"Connessione rifiutata (rc={rc})"))
+    client.on_connect = on_connect
+    client.connect(broker, port, 60)
+    return await connected
+
+
+async def subscribe(loop, client, topic):
+    subscribed = loop.create_future()
+    client.on_subscribe = lambda c, u, mid, qos: subscribed.done() or subscribed.set_result(qos)
+    client.subscribe(topic)
+    return await subscribed
+
+
+class SimulatedPatient:
+    def __init__(self, patient_id, record):
+        self.patient_id = patient_id
+        self.record = record
+        self.topic = TOPIC_UPDATES.format(patient_id=patient_id)
+        self.client = None
+        self.connect_seconds = None
+        self.bootstrap_at = None     # perf_counter all'invio del bootstrap
+        self.first_update_at = None
+        self.last_update_at = None
+        self.received = 0
+        self.last_seq = 0
+        self.reordered = 0           # Sequenza non crescente (duplicati o fuori ordine)
+        self.errors = 0
+
+    def on_message(self, client, userdata, msg):
+        now = time.perf_counter()
+        if msg.topic != self.topic:
+            return  # Messaggi trattenuti di altri topic consegnati da alcuni broker
+        try:
+            seq = int(decode(msg.payload).get("seq", 0))
+        except Exception:
+            self.errors += 1
+            return
+        if self.first_update_at is None:
+            self.first_update_at = now
+        self.last_update_at = now
+        self.received += 1
+        if seq <= self.last_seq:
+            self.reordered += 1
+        self.last_seq = max(self.last_seq, seq)
+
+    async def start(self, loop, broker, port):
+        started = time.perf_counter()
+        self.client = await connect(loop, f"PhysicalTwin_{self.patient_id}", broker, port)
+        self.client.on_message = self.on_message
+        # Iscrizione confermata PRIMA del bootstrap: nessun aggiornamento perso all'avvio
+        await subscribe(loop, self.client, self.topic)
+        self.connect_seconds = time.perf_counter() - started
+        self.bootstrap_at = time.perf_counter()
+        self.client.publish(TOPIC_BOOTSTRAP, json.dumps(bootstrap_payload(self.patient_id, self.record)))
+
+    def report(self):
+        first = None if self.first_update_at is None else self.first_update_at - self.bootstrap_at
+        span = (self.last_update_at - self.first_update_at) if self.received > 1 else 0.0
+        # Il server numera da 1: tutto ciò che manca fino all'ultima sequenza vista è perso
+        lost = max(0, self.last_seq - (self.received - self.reordered))
+        return {
+            "patient_id": self.patient_id,
+            "connect_s": None if self.connect_seconds is None else round(self.connect_seconds, 4),
+            "first_update_s": None if first is None else round(first, 4),
+            "updates": self.received,
+            "rate_hz": round((self.received - 1) / span, 3) if span > 0 else 0.0,
+            "lost": lost,
+            "loss_ratio": round(lost / self.last_seq, 5) if self.last_seq else 0.0,
+            "reordered": self.reordered,
+            "errors": self.errors,
+        }
+
+
+def _summary(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"min": round(min(values), 4), "p50": round(float(p50), 4), "p95": round(float(p95), 4),
+            "p99": round(float(p99), 4), "max": round(max(values), 4)}
+
+
+async def wait_ready(loop, broker, port, timeout):
+    """Attende il READY (trattenuto) dell'Edge Server senza polling"""
+    client = await connect(loop, f"PhysicalTwin_LoadControl_{random.getrandbits(32):08x}", broker, port)
+    ready = loop.create_future()
+
+    def on_status(client, userdata, msg):
+        if msg.topic == TOPIC_STATUS and msg.payload == b"READY" and not ready.done():
+            ready.set_result(True)
+    client.on_message = on_status
+    await subscribe(loop, client, TOPIC_STATUS)
+    try:
+        await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        client.disconnect()
+        raise TimeoutError(f"L'Edge Server non risponde entro {timeout:.0f}s. È acceso?")
+    return client
+
+
+async def run_load(patients, broker="127.0.0.1", port=1883, arrival="poisson", arrival_rate=10.0,
+                   duration=10.0, csv_file=CSV_FILENAME, seed=None, evict=True, ready_timeout=30.0,
+                   connect_timeout=10.0):
+    """Simula `patients` physical twin; restituisce il rapporto (dizionario)"""
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    records = load_records(csv_file)
+    run_tag = f"{random.getrandbits(24):06x}"  # Id unici per esecuzione (anche con seed): i bootstrap ripetuti verrebbero ignorati
+
+    control = await wait_ready(loop, broker, port, ready_timeout)
+    print(f"[Carico] ✅ Edge Server pronto. {patients} pazienti, arrivi {arrival} ({arrival_rate}/s)")
+
+    simulated = [SimulatedPatient(f"LOAD_{run_tag}_{i:05d}", rng.choice(records)) for i in range(patients)]
+    started = time.perf_counter()
+    tasks = []
+    for patient, delay in zip(simulated, arrival_delays(arrival, patients, arrival_rate, rng)):
+        # Broker saturo = connessione fallita (conteggiata), non un'attesa infinita
+        tasks.append(asyncio.create_task(asyncio.wait_for(patient.start(loop, broker, port), connect_timeout)))
+        await asyncio.sleep(delay)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failed = [r for r in results if isinstance(r, Exception)]
+    arrivals_s = time.perf_counter() - started
+    print(f"[Carico] 🚀 Bootstrap inviati in {arrivals_s:.2f}s ({len(failed)} connessioni fallite). "
+          f"Osservazione per {duration:.0f}s...")
+    await asyncio.sleep(duration)
+
+    if evict:
+        for patient in simulated:
+            control.publish(TOPIC_CONTROL.format(patient_id=patient.patient_id), json.dumps({"command": "evict"}))
+    for patient in simulated:
+        if patient.client is not None:
+            patient.client.disconnect()
+    control.disconnect()
+    await asyncio.sleep(0.5)  # Lascia partire evict e DISCONNECT
+
+    rows = [p.report() for p in simulated]
+    return {
+        "timestamp": time.time(),
+        "patients": patients,
+        "arrival": arrival,
+        "arrival_rate": arrival_rate,
+        "arrivals_s": round(arrivals_s, 3),
+        "duration_s": duration,
+        "failed_connections": len(failed),
+        "without_updates": sum(1 for r in rows if r["updates"] == 0),
+        "connect_s": _summary([r["connect_s"] for r in rows]),
+        "first_update_s": _summary([r["first_update_s"] for r in rows]),
+        "rate_hz": _summary([r["rate_hz"] for r in rows if r["updates"] > 1]),
+        "lost": sum(r["lost"] for r in rows),
+        "loss_ratio": _summary([r["loss_ratio"] for r in rows if r["updates"]]),
+        "per_patient": rows,
+    }
+
+
+def print_report(report):
+    print(f"[Carico] {report['patients']} pazienti | senza aggiornamenti: {report['without_updates']} | "
+          f"connessioni fallite: {report['failed_connections']} | messaggi persi: {report['lost']}")
+    for name, unit in (("connect_s", "s"), ("first_update_s", "s"), ("rate_hz", "Hz"), ("loss_ratio", "")):
+        s = report[name]
+        if s:
+            print(f"   {name:<15} p50 {s['p50']}{unit} | p95 {s['p95']}{unit} | p99 {s['p99']}{unit} | max {s['max']}{unit}")
+
+
+# --- INVIO SINGOLO (HANDSHAKE STORICO) ---
+def run_single(broker, port):
     client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, "PhysicalTwin_Sender")
     client.on_connect = on_connect
     client.on_message = on_message
     
     try:
-        client.connect(BROKER, PORT, 60)
+        client.connect(broker, port, 60)
         client.loop_start() # Avvia il thread di ascolto
         
         print("[Mondo Fisico] In attesa del segnale 'READY' dall'Edge Server...")
@@ -49,7 +306,7 @@ if __name__ == "__main__":
                 print(f"... in attesa ({timeout}s) ...")
             if timeout > 30:
                 print("❌ TIMEOUT: L'Edge Server non risponde. È acceso?")
-                exit()
+                return
 
         # SE SIAMO QUI, IL SERVER È PRONTO
         paziente = "PAZIENTE_TESI_01"
@@ -64,4 +321,29 @@ if __name__ == "__main__":
         client.disconnect()
         
     except Exception as e:
-        print(f"❌ ERRORE: {e}")
\ No newline at end of file
+        print(f"❌ ERRORE: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Physical Twin: bootstrap singolo o generatore di carico")
+    parser.add_argument("--broker", default="127.0.0.1", help="Indirizzo del broker MQTT")
+    parser.add_argument("--port", type=int, default=1883, help="Porta del broker MQTT")
+    parser.add_argument("--load", type=int, default=0, help="Pazienti simulati (0 = un solo bootstrap, come prima)")
+    parser.add_argument("--arrival", choices=ARRIVALS, default="poisson", help="Processo di arrivo dei pazienti")
+    parser.add_argument("--arrival-rate", type=float, default=10.0, help="Arrivi al secondo (poisson/uniform)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Secondi di osservazione dopo l'ultimo arrivo")
+    parser.add_argument("--csv", default=CSV_FILENAME, help="Dataset da cui estrarre i bootstrap")
+    parser.add_argument("--seed", type=int, default=None, help="Seed per arrivi e scelta dei record")
+    parser.add_argument("--keep", action="store_true", help="Non rimuovere (evict) le sessioni alla fine")
+    parser.add_argument("--output", default=None, help="File JSON del rapporto (default: riepilogo a video)")
+    args = parser.parse_args()
+
+    if args.load <= 0:
+        run_single(args.broker, args.port)
+    else:
+        report = asyncio.run(run_load(args.load, args.broker, args.port, args.arrival, args.arrival_rate,
+                                      args.duration, args.csv, args.seed, evict=not args.keep))
+        print_report(report)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
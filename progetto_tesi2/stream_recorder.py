@@ -0,0 +1,377 @@
+import os
+import sys
+import json
+import time
+import zlib
+import bisect
+import struct
+import argparse
+import threading
+import numpy as np
+import paho.mqtt.client as mqtt
+
+# ZeroMQ opzionale (stream del DICOM player)
+try:
+    import zmq
+except ImportError:
+    zmq = None
+
+# --- REGISTRAZIONE E RIPRODUZIONE DEGLI STREAM DEL TWIN ---
+# File append-only a blocchi compressi (zlib), ogni blocco a colonne:
+#   istanti (float64) | id topic (uint16) | flag (uint8) | lunghezze (uint32) | payload concatenati
+# preceduti dalla tabella dei topic del blocco (JSON), così ogni blocco è autonomo.
+# Indice sparso (una voce per blocco: primo/ultimo istante, offset) in un file
+# accanto (.idx), ricostruibile scandendo le intestazioni dei blocchi.
+# I messaggi ZeroMQ (DICOM player) sono registrati con topic "zmq://<endpoint>".
+MAGIC = b"DTREC1\n"
+CHUNK = struct.Struct("<4sIIdd")  # b"CHNK", record, byte compressi, primo istante, ultimo istante
+INDEX = struct.Struct("<ddQI")    # primo istante, ultimo istante, offset, record
+FLAG_RETAIN = 1
+ZMQ_PREFIX = "zmq://"
+
+DEFAULT_TOPICS = ["digitaltwin/#"]
+CHUNK_RECORDS = 2000
+CHUNK_SECONDS = 1.0
+
+
+def _pack_chunk(records, level):
+    topics = sorted({topic for _, topic, _, _ in records})
+    topic_ids = {topic: i for i, topic in enumerate(topics)}
+    table = json.dumps(topics).encode()
+    columns = [
+        np.array([r[0] for r in records], dtype="<f8").tobytes(),
+        np.array([topic_ids[r[1]] for r in records], dtype="<u2").tobytes(),
+        np.array([r[3] for r in records], dtype="u1").tobytes(),
+        np.array([len(r[2]) for r in records], dtype="<u4").tobytes(),
+    ]
+    body = struct.pack("<I", len(table)) + table + b"".join(columns) + b"".join(r[2] for r in records)
+    return zlib.compress(body, level)
+
+
+def _unpack_chunk(blob, count):
+    body = zlib.decompress(blob)
+    (table_len,) = struct.unpack_from("<I", body)
+    topics = json.loads(body[4:4 + table_len])
+    offset = 4 + table_len
+    timestamps = np.frombuffer(body, dtype="<f8", count=count, offset=offset)
+    offset += 8 * count
+    topic_ids = np.frombuffer(body, dtype="<u2", count=count, offset=offset)
+    offset += 2 * count
+    flags = np.frombuffer(body, dtype="u1", count=count, offset=offset)
+    offset += count
+    lengths = np.frombuffer(body, dtype="<u4", count=count, offset=offset)
+    offset += 4 * count
+    ends = offset + np.cumsum(lengths, dtype=np.int64)
+    starts = ends - lengths
+    view = memoryview(body)
+    return [
+        (t, topics[i], view[a:b], f)
+        for t, i, a, b, f in zip(timestamps.tolist(), topic_ids.tolist(), starts.tolist(), ends.tolist(), flags.tolist())
+    ]
+
+
+# --- REGISTRATORE ---
+class StreamRecorder:
+    def __init__(self, path, chunk_records=CHUNK_RECORDS, chunk_seconds=CHUNK_SECONDS, level=6):
+        self.path = path
+        self.chunk_records = chunk_records
+        self.chunk_seconds = chunk_seconds
+        self.level = level
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(MAGIC)
+        self.index = open(path + ".idx", "ab")
+        self.buffer = []
+        self.buffer_started = None
+        self.lock = threading.Lock()
+        self.records = 0
+        self.chunks = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.clients = []
+        self.stop_event = threading.Event()
+
+    def append(self, topic, payload, retain=False, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            if not self.buffer:
+                self.buffer_started = time.monotonic()
+            self.buffer.append((timestamp, topic, bytes(payload), FLAG_RETAIN if retain else 0))
+            self.raw_bytes += len(payload)
+            if len(self.buffer) >= self.chunk_records:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        records.sort(key=lambda r: r[0])  # Più sorgenti (thread): ordine per istante
+        blob = _pack_chunk(records, self.level)
+        offset = self.file.tell()
+        self.file.write(CHUNK.pack(b"CHNK", len(records), len(blob), records[0][0], records[-1][0]))
+        self.file.write(blob)
+        self.file.flush()
+        self.index.write(INDEX.pack(records[0][0], records[-1][0], offset, len(records)))
+        self.index.flush()
+        self.records += len(records)
+        self.chunks += 1
+        self.stored_bytes += CHUNK.size + len(blob)
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def _flush_loop(self):
+        # I blocchi si chiudono anche a traffico basso (al massimo chunk_seconds di dati persi)
+        while not self.stop_event.wait(self.chunk_seconds / 4):
+            with self.lock:
+                if self.buffer and time.monotonic() - self.buffer_started >= self.chunk_seconds:
+                    self._flush_locked()
+
+    # --- SORGENTI ---
+    def record_mqtt(self, broker="localhost", port=1883, topics=DEFAULT_TOPICS):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=f"StreamRecorder_{os.getpid()}")
+        client.on_message = lambda c, u, msg: self.append(msg.topic, msg.payload, msg.retain)
+        client.connect(broker, port)
+        client.subscribe([(topic, 0) for topic in topics])
+        client.loop_start()
+        self.clients.append(client)
+        return client
+
+    def record_zmq(self, endpoint):
+        if zmq is None:
+            raise RuntimeError("pyzmq non installato: pip install pyzmq")
+        topic = ZMQ_PREFIX + endpoint.split("://", 1)[-1]
+
+        def loop():
+            context = zmq.Context.instance()
+            socket = context.socket(zmq.SUB)
+            socket.connect(endpoint)
+            socket.setsockopt(zmq.SUBSCRIBE, b"")
+            while not self.stop_event.is_set():
+                if socket.poll(100):
+                    self.append(topic, socket.recv())
+            socket.close()
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def start(self):
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+        return self
+
+    def close(self):
+        self.stop_event.set()
+        for client in self.clients:
+            client.loop_stop()
+            client.disconnect()
+        self.flush()
+        self.file.close()
+        self.index.close()
+
+
+# --- LETTORE ---
+class StreamLog:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} non è una registrazione del twin")
+        self.index = self._load_index()
+
+    def _load_index(self):
+        """Indice sparso dal file .idx; se manca o è incompleto si rilegge dalle intestazioni"""
+        entries = []
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                data = f.read()
+            entries = [INDEX.unpack_from(data, i) for i in range(0, len(data) - INDEX.size + 1, INDEX.size)]
+        except OSError:
+            pass
+        size = os.path.getsize(self.path)
+        end = entries[-1][2] + CHUNK.size if entries else 0
+        if entries:
+            self.file.seek(entries[-1][2])
+            end += CHUNK.unpack(self.file.read(CHUNK.size))[2]
+        if not entries or end != size:
+            entries = self._scan()
+        return entries
+
+    def _scan(self):
+        entries = []
+        offset = len(MAGIC)
+        size = os.path.getsize(self.path)
+        while offset + CHUNK.size <= size:
+            self.file.seek(offset)
+            magic, count, length, first, last = CHUNK.unpack(self.file.read(CHUNK.size))
+            if magic != b"CHNK" or offset + CHUNK.size + length > size:
+                break  # Blocco troncato (registrazione interrotta)
+            entries.append((first, last, offset, count))
+            offset += CHUNK.size + length
+        return entries
+
+    @property
+    def start_time(self):
+        return self.index[0][0] if self.index else None
+
+    @property
+    def end_time(self):
+        return max(e[1] for e in self.index) if self.index else None
+
+    def read_chunk(self, entry):
+        self.file.seek(entry[2])
+        magic, count, length, _, _ = CHUNK.unpack(self.file.read(CHUNK.size))
+        return _unpack_chunk(self.file.read(length), count)
+
+    def records(self, start=None, end=None, topics=None):
+        """(istante, topic, payload, flag) da start (assoluto) a end, con salto diretto al blocco giusto"""
+        lasts = [e[1] for e in self.index]
+        first_chunk = bisect.bisect_left(lasts, start) if start is not None else 0
+        for entry in self.index[first_chunk:]:
+            if end is not None and entry[0] > end:
+                return
+            for record in self.read_chunk(entry):
+                if start is not None and record[0] < start:
+                    continue
+                if end is not None and record[0] > end:
+                    return
+                if topics is None or record[1] in topics:
+                    yield record
+
+    def info(self):
+        counts = {}
+        for entry in self.index:
+            for _, topic, payload, _ in self.read_chunk(entry):
+                n, size = counts.get(topic, (0, 0))
+                counts[topic] = (n + 1, size + len(payload))
+        return {
+            "chunks": len(self.index),
+            "records": sum(e[3] for e in self.index),
+            "start": self.start_time,
+            "duration": (self.end_time - self.start_time) if self.index else 0.0,
+            "file_bytes": os.path.getsize(self.path),
+            "topics": {t: {"messages": n, "bytes": b} for t, (n, b) in sorted(counts.items())},
+        }
+
+    def close(self):
+        self.file.close()
+
+
+# --- RIPRODUZIONE ---
+class StreamReplayer:
+    """
+    Ripubblica una registrazione: speed=1 tempo reale, N = N volte più veloce,
+    0 = il più veloce possibile. I topic zmq:// escono da un socket PUB.
+    """
+    def __init__(self, log, broker="localhost", port=1883, zmq_bind=None, client_id=None):
+        self.log = log
+        self.client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION1, client_id=client_id or f"StreamReplayer_{os.getpid()}")
+        self.client.connect(broker, port)
+        self.client.loop_start()
+        self.zmq_socket = None
+        if zmq_bind:
+            if zmq is None:
+                raise RuntimeError("pyzmq non installato: pip install pyzmq")
+            self.zmq_socket = zmq.Context.instance().socket(zmq.PUB)
+            self.zmq_socket.bind(zmq_bind)
+        self.sent = 0
+
+    def replay(self, speed=1.0, seek=0.0, end=None, topics=None, loop=False):
+        """seek/end: secondi dall'inizio della registrazione"""
+        origin = self.log.start_time
+        if origin is None:
+            return 0
+        while True:
+            start = origin + seek
+            stop = origin + end if end is not None else None
+            wall_start = time.perf_counter()
+            first = None
+            for timestamp, topic, payload, flags in self.log.records(start, stop, topics):
+                if first is None:
+                    first = timestamp
+                if speed > 0:
+                    delay = (timestamp - first) / speed - (time.perf_counter() - wall_start)
+                    if delay > 0:
+                        time.sleep(delay)
+                if topic.startswith(ZMQ_PREFIX):
+                    if self.zmq_socket is not None:
+                        self.zmq_socket.send(payload, copy=False)
+                else:
+                    self.client.publish(topic, bytes(payload), retain=bool(flags & FLAG_RETAIN))
+                self.sent += 1
+            if not loop:
+                return self.sent
+
+    def close(self):
+        self.client.loop_stop()
+        self.client.disconnect()
+        if self.zmq_socket is not None:
+            self.zmq_socket.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Registrazione e riproduzione degli stream del Digital Twin")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Registra i topic MQTT (e gli stream ZeroMQ) su file")
+    rec.add_argument("file")
+    rec.add_argument("--broker", default="localhost")
+    rec.add_argument("--port", type=int, default=1883)
+    rec.add_argument("--topics", default=",".join(DEFAULT_TOPICS), help="Filtri MQTT separati da virgola")
+    rec.add_argument("--zmq", action="append", default=[], help="Endpoint ZeroMQ da registrare (es. tcp://localhost:5555)")
+    rec.add_argument("--chunk-records", type=int, default=CHUNK_RECORDS)
+    rec.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS)
+    rec.add_argument("--level", type=int, default=6, help="Livello di compressione zlib (1-9)")
+
+    play = sub.add_parser("replay", help="Ripubblica una registrazione")
+    play.add_argument("file")
+    play.add_argument("--broker", default="localhost")
+    play.add_argument("--port", type=int, default=1883)
+    play.add_argument("--speed", type=float, default=1.0, help="1 = tempo reale, N = N volte, 0 = massima velocità")
+    play.add_argument("--seek", type=float, default=0.0, help="Secondi dall'inizio da cui partire")
+    play.add_argument("--end", type=float, default=None, help="Secondi dall'inizio a cui fermarsi")
+    play.add_argument("--topics", default="", help="Solo questi topic (separati da virgola)")
+    play.add_argument("--zmq-bind", default=None, help="Ripubblica i topic zmq:// su questo endpoint (es. tcp://*:5555)")
+    play.add_argument("--loop", action="store_true", help="Ricomincia dalla posizione di seek alla fine")
+
+    show = sub.add_parser("info", help="Riepilogo di una registrazione")
+    show.add_argument("file")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        recorder = StreamRecorder(args.file, args.chunk_records, args.chunk_seconds, args.level).start()
+        recorder.record_mqtt(args.broker, args.port, [t for t in args.topics.split(",") if t])
+        for endpoint in args.zmq:
+            recorder.record_zmq(endpoint)
+        print(f"⏺️  Registrazione su {args.file} (Ctrl+C per fermare)")
+        try:
+            while True:
+                time.sleep(5)
+                print(f"   {recorder.records + len(recorder.buffer)} messaggi | "
+                      f"{recorder.raw_bytes / 1e6:.2f} MB -> {recorder.stored_bytes / 1e6:.2f} MB su disco")
+        except KeyboardInterrupt:
+            recorder.close()
+            print(f"\n⏹️  {recorder.records} messaggi in {recorder.chunks} blocchi.")
+
+    elif args.command == "replay":
+        log = StreamLog(args.file)
+        replayer = StreamReplayer(log, args.broker, args.port, args.zmq_bind)
+        topics = set(t for t in args.topics.split(",") if t) or None
+        print(f"▶️  Riproduzione di {args.file} da {args.seek}s a velocità {args.speed or 'massima'}")
+        start = time.perf_counter()
+        try:
+            sent = replayer.replay(args.speed, args.seek, args.end, topics, args.loop)
+            elapsed = time.perf_counter() - start
+            print(f"✅ {sent} messaggi in {elapsed:.2f}s ({sent / max(elapsed, 1e-9):.0f} msg/s)")
+        except KeyboardInterrupt:
+            print("\n⏹️  Stop.")
+        replayer.close()
+        log.close()
+
+    elif args.command == "info":
+        log = StreamLog(args.file)
+        json.dump(log.info(), sys.stdout, indent=2)
+        print()
+        log.close()
@@ -0,0 +1,105 @@
+import os
+import pytest
+from tick_scheduler import TickScheduler
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make(policy="catch_up", **kwargs):
+    clock = FakeClock()
+    return TickScheduler(policy, clock=clock, **kwargs), clock
+
+
+# --- CADENZA REGOLARE ---
+def test_one_tick_per_deadline_on_a_fixed_grid():
+    scheduler, clock = make()
+    scheduler.add("a", 0.5)
+    assert scheduler.next_batch(timeout=0) == [("a", 1, 100.0)]
+    clock.now = 100.5
+    assert scheduler.next_batch(timeout=0) == [("a", 1, 100.5)]
+    assert scheduler.next_batch(timeout=0) == []  # Prossima scadenza 101.0
+
+
+def test_entries_due_together_share_a_batch():
+    scheduler, clock = make()
+    scheduler.add("a", 0.5)
+    scheduler.add("b", 0.5)
+    assert sorted(k for k, _, _ in scheduler.next_batch(timeout=0)) == ["a", "b"]
+
+
+def test_removed_entry_is_not_returned():
+    scheduler, clock = make()
+    scheduler.add("a", 0.5)
+    scheduler.remove("a")
+    assert scheduler.next_batch(timeout=0) == []
+
+
+# --- TICK IN RITARDO ---
+def test_catch_up_runs_the_missed_ticks():
+    scheduler, clock = make("catch_up")
+    scheduler.add("a", 0.5)
+    clock.now = 101.6  # Scadenze 100.0 .. 101.5 (quattro)
+    assert scheduler.next_batch(timeout=0) == [("a", 4, 101.5)]
+    assert scheduler.caught_up == 3 and scheduler.skipped == 0
+
+
+def test_catch_up_is_bounded_by_max_catch_up():
+    scheduler, clock = make("catch_up", max_catch_up=2)
+    scheduler.add("a", 0.5)
+    clock.now = 104.9  # Dieci scadenze
+    assert scheduler.next_batch(timeout=0) == [("a", 3, 104.5)]
+    assert scheduler.caught_up == 2 and scheduler.skipped == 7
+
+
+def test_skip_runs_one_tick_and_keeps_the_grid():
+    scheduler, clock = make("skip")
+    scheduler.add("a", 0.5)
+    clock.now = 101.6
+    assert scheduler.next_batch(timeout=0) == [("a", 1, 101.5)]
+    assert scheduler.skipped == 3
+    clock.now = 102.0
+    assert scheduler.next_batch(timeout=0) == [("a", 1, 102.0)]
+
+
+# --- PERIODO PIÙ BREVE DI COALESCE ---
+@pytest.mark.parametrize("policy", ["catch_up", "skip"])
+def test_short_period_appears_once_per_batch(policy):
+    scheduler, clock = make(policy, coalesce=0.002)
+    scheduler.add("a", 0.0005)
+    clock.now = 100.0051
+    batch = scheduler.next_batch(timeout=0)
+    assert [k for k, _, _ in batch] == ["a"]
+    ticks = batch[0][1]
+    # Scadenze coperte fino a now + coalesce: 100.0000 .. 100.0070 (quindici)
+    assert ticks + scheduler.skipped == 15
+    assert ticks == (11 if policy == "catch_up" else 1)
+
+
+# --- PERIODI NON VALIDI ---
+@pytest.mark.parametrize("period", [0, -0.1, float("nan"), float("inf")])
+def test_invalid_period_raises(period):
+    scheduler, _ = make()
+    with pytest.raises(ValueError):
+        scheduler.add("a", period)
+    assert scheduler.next_batch(timeout=0) == []
+
+
+def test_unknown_policy_raises():
+    with pytest.raises(ValueError):
+        TickScheduler("sometimes")
+
+
+# --- COPIA IN progetto_tesi1 ---
+def test_tesi1_copy_is_identical():
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "tick_scheduler.py"), "rb") as f:
+        ours = f.read().replace(b"\r\n", b"\n")
+    with open(os.path.join(here, "..", "progetto_tesi1", "tick_scheduler.py"), "rb") as f:
+        theirs = f.read().replace(b"\r\n", b"\n")
+    assert ours == theirs
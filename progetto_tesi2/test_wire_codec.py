@@ -0,0 +1,118 @@
+import os
+import json
+import pytest
+import wire_codec
+from wire_codec import (WireEncoder, CODECS, SCHEMAS, BIO_COLUMNS, TableSchema, TUMOR_ROWS,
+                        WIRE_VERSION, CODEC_STRUCT, decode, peek_codec, parse_topic_codecs)
+
+# --- ANDATA E RITORNO PER OGNI SCHEMA E CODEC ---
+SAMPLES = {
+    "bio_record": dict({"id": 842302, "diagnosis": "M"}, **{c: 0.5 + i for i, c in enumerate(BIO_COLUMNS)}),
+    "dicom_slice": {"id": 1, "slice_index": "12", "diagnosis": "M", "radius_mean": 25.5,
+                    "texture_mean": 550.25, "lesion_area_mm2": 49.0, "lesion_radius_mm": 4.75},
+    "tumor_state": {"timestamp": 1700000000.125, "sim_time": 12.5, "patient_id": "PAZIENTE_TESI_01",
+                    "seq": 42, "keyframe": False, "tumors": {
+        "left": {"radius": 0.5, "cellularity": 10.25, "drug_level": 0.0, "status": "growing"},
+        "right": {"radius": 0.75, "cellularity": 20.5, "drug_level": 1.5, "status": "healing"}}},
+    "tumor_ensemble": {"timestamp": 1700000000.125, "sim_time": 12.5, "patient_id": "PAZIENTE_TESI_01",
+                       "seq": 7, "keyframe": True, "replicas": 128, "tumors": {
+        "left": {"radius": 0.5, "cellularity": 10.25, "drug_level": 0.0, "status": "growing",
+                 "radius_p5": 0.25, "radius_p95": 0.75, "cellularity_p5": 9.5, "cellularity_p95": 11.0,
+                 "drug_level_p5": 0.0, "drug_level_p95": 0.0}}},
+    "sim_update": {"type": "sim_update", "timestamp": 1700000000.125, "sim_time": 0.5,
+                   "data": {"radius": 17.0, "cellularity": 50.5, "drug_level": 0.0, "status": "growing"}},
+}
+
+
+def test_every_schema_has_a_sample():
+    assert set(SAMPLES) == set(SCHEMAS)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+@pytest.mark.parametrize("schema", sorted(SAMPLES))
+def test_round_trip(schema, codec):
+    if codec == "msgpack" and wire_codec.msgpack is None:
+        pytest.skip("msgpack non installato")
+    data = WireEncoder(codec, schema).encode(SAMPLES[schema])
+    assert peek_codec(data) == codec
+    assert decode(data) == SAMPLES[schema]
+
+
+def test_struct_drops_fields_outside_the_schema():
+    payload = dict(SAMPLES["sim_update"], extra="non trasportato")
+    assert decode(WireEncoder("struct", "sim_update").encode(payload)) == SAMPLES["sim_update"]
+
+
+# --- JSON STORICO (SENZA INTESTAZIONE) ---
+def test_legacy_json_is_detected_from_the_first_byte():
+    data = json.dumps(SAMPLES["tumor_state"]).encode()
+    assert peek_codec(data) == "json"
+    assert decode(data) == SAMPLES["tumor_state"]
+    assert decode(data.decode()) == SAMPLES["tumor_state"]
+
+
+def test_json_codec_output_has_no_header():
+    data = WireEncoder("json").encode({"a": 1})
+    assert data == b'{"a": 1}'
+
+
+# --- VERSIONI DEGLI SCHEMI ---
+def test_historical_tumor_state_v1_still_decodes():
+    v1 = wire_codec.SCHEMA_VERSIONS[(3, 1)]
+    payload = {"timestamp": 1.5, "sim_time": 2.0, "tumors": {
+        "left": {"radius": 0.5, "cellularity": 10.25, "drug_level": 0.0, "status": "growing"}}}
+    data = bytes([(WIRE_VERSION << 4) | CODEC_STRUCT, 3, 1]) + v1.pack(payload)
+    assert decode(data) == payload
+
+
+def test_encoder_uses_the_current_version():
+    data = WireEncoder("struct", "tumor_state").encode(SAMPLES["tumor_state"])
+    assert data[1:3] == bytes([3, SCHEMAS["tumor_state"].version])
+
+
+def test_unknown_schema_raises():
+    data = bytes([(WIRE_VERSION << 4) | CODEC_STRUCT, 99, 1]) + b"\0" * 16
+    with pytest.raises(ValueError):
+        decode(data)
+
+
+def test_unknown_schema_version_raises():
+    data = WireEncoder("struct", "tumor_state").encode(SAMPLES["tumor_state"])
+    with pytest.raises(ValueError):
+        decode(data[:2] + bytes([99]) + data[3:])
+
+
+def test_unknown_codec_header_raises():
+    with pytest.raises(ValueError):
+        decode(bytes([(WIRE_VERSION << 4) | 0x0F]) + b"{}")
+
+
+def test_encoder_rejects_bad_configuration():
+    with pytest.raises(ValueError):
+        WireEncoder("xml")
+    with pytest.raises(ValueError):
+        WireEncoder("struct")
+    with pytest.raises(ValueError):
+        WireEncoder("struct", "sconosciuto")
+
+
+def test_table_schema_without_rows():
+    schema = TableSchema("vuota", 250, 1, [("seq", "u4")], "rows", "S8", TUMOR_ROWS)
+    assert schema.unpack(schema.pack({"seq": 3})) == {"seq": 3, "rows": {}}
+
+
+def test_parse_topic_codecs():
+    assert parse_topic_codecs("a/b=msgpack, c/+=struct") == {"a/b": "msgpack", "c/+": "struct"}
+    assert parse_topic_codecs("") == {}
+    with pytest.raises(ValueError):
+        parse_topic_codecs("a=xml")
+
+
+# --- COPIA IN progetto_tesi1 ---
+def test_tesi1_copy_is_identical():
+    here = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(here, "wire_codec.py"), "rb") as f:
+        ours = f.read().replace(b"\r\n", b"\n")
+    with open(os.path.join(here, "..", "progetto_tesi1", "wire_codec.py"), "rb") as f:
+        theirs = f.read().replace(b"\r\n", b"\n")
+    assert ours == theirs
@@ -0,0 +1,127 @@
+import math
+import time
+import heapq
+import threading
+
+# --- SCHEDULER A SCADENZE ASSOLUTE (OROLOGIO MONOTONO) ---
+# Ogni voce (es. una sessione paziente) ha il proprio periodo e una griglia di
+# scadenze epoch + k * periodo: il tempo speso nel tick non si somma all'attesa,
+# quindi niente deriva. Le griglie con lo stesso periodo sono allineate, così le
+# voci in scadenza nello stesso istante (entro `coalesce` secondi) arrivano in
+# un unico batch e si elaborano insieme.
+# Tick in ritardo di uno o più periodi:
+#   catch_up -> si recuperano i tick persi (al massimo max_catch_up per batch)
+#   skip     -> si esegue un solo tick e si salta alla prossima scadenza futura
+# In entrambi i casi la griglia non cambia: le scadenze successive restano esatte.
+POLICIES = ("catch_up", "skip")
+DEFAULT_COALESCE = 0.002
+DEFAULT_MAX_CATCH_UP = 10
+
+
+class TickScheduler:
+    def __init__(self, policy="catch_up", coalesce=DEFAULT_COALESCE, max_catch_up=DEFAULT_MAX_CATCH_UP,
+                 clock=time.monotonic):
+        if policy not in POLICIES:
+            raise ValueError(f"Politica sconosciuta: {policy} (disponibili: {', '.join(POLICIES)})")
+        self.policy = policy
+        self.coalesce = coalesce
+        self.max_catch_up = max_catch_up
+        self.clock = clock
+        self.epoch = clock()
+        self.wall_offset = time.time() - self.epoch  # Scadenza monotona -> istante di calendario
+        self.heap = []      # (scadenza, versione, chiave)
+        self.entries = {}   # chiave -> (periodo, versione)
+        self.version = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.skipped = 0    # Tick saltati (skip, o oltre max_catch_up)
+        self.caught_up = 0  # Tick recuperati in ritardo (catch_up)
+
+    def add(self, key, period):
+        """Aggiunge (o ripianifica) una voce; prima scadenza = prossimo punto della griglia"""
+        if not (period > 0 and math.isfinite(period)):
+            raise ValueError(f"Periodo non valido per {key}: {period} (serve un numero positivo)")
+        with self.condition:
+            self.version += 1
+            now = self.clock()
+            k = max(0, math.ceil((now - self.epoch) / period))
+            deadline = self.epoch + k * period
+            self.entries[key] = (period, self.version)
+            heapq.heappush(self.heap, (deadline, self.version, key))
+            self.condition.notify()
+
+    def remove(self, key):
+        with self.condition:
+            self.entries.pop(key, None)  # La voce nell'heap diventa obsoleta e viene scartata
+
+    def period(self, key):
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    def wall_time(self, deadline):
+        return deadline + self.wall_offset
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def _discard_stale(self):
+        while self.heap:
+            _, version, key = self.heap[0]
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == version:
+                return
+            heapq.heappop(self.heap)
+
+    def next_batch(self, timeout=None):
+        """
+        Attende la prossima scadenza e restituisce le voci dovute:
+        [(chiave, tick da eseguire, ultima scadenza coperta)].
+        Lista vuota se scade timeout o lo scheduler viene chiuso.
+        """
+        give_up = None if timeout is None else self.clock() + timeout
+        with self.condition:
+            while True:
+                if self.closed:
+                    return []
+                self._discard_stale()
+                now = self.clock()
+                if self.heap and self.heap[0][0] <= now + self.coalesce:
+                    break
+                wait = self.heap[0][0] - now if self.heap else None
+                if give_up is not None:
+                    if now >= give_up:
+                        return []
+                    wait = give_up - now if wait is None else min(wait, give_up - now)
+                self.condition.wait(wait)  # add() sveglia prima se arriva una scadenza più vicina
+
+            # Con periodo < coalesce la stessa voce torna più volte nello stesso
+            # batch: le scadenze coperte si sommano e la voce compare una volta sola
+            covered = {}  # chiave -> [scadenze coperte, ultima scadenza] (ordine di scadenza)
+            limit = now + self.coalesce
+            while self.heap and self.heap[0][0] <= limit:
+                deadline, version, key = heapq.heappop(self.heap)
+                entry = self.entries.get(key)
+                if entry is None or entry[1] != version:
+                    continue
+                period = entry[0]
+                missed = max(0, int((now - deadline) // period))  # Scadenze passate oltre la prima
+                last = deadline + missed * period
+                heapq.heappush(self.heap, (last + period, version, key))
+                if key in covered:
+                    covered[key][0] += 1 + missed
+                    covered[key][1] = last
+                else:
+                    covered[key] = [1 + missed, last]
+
+            batch = []
+            for key, (count, last) in covered.items():
+                if self.policy == "catch_up":
+                    ticks = min(count, 1 + self.max_catch_up)
+                    self.caught_up += ticks - 1
+                else:
+                    ticks = 1
+                self.skipped += count - ticks
+                batch.append((key, ticks, last))
+            return batch
@@ -0,0 +1,114 @@
+import sqlite3
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# --- CACHE DELLE TRAIETTORIE (MEMORIA LRU + DISCO) ---
+# Chiave = hash del contenuto: stato iniziale, parametri, eventi di dose e
+# chiave del rumore. Due livelli: un OrderedDict LRU limitato in memoria davanti
+# a un archivio SQLite su disco. I valori sono vettori float64 a lunghezza fissa
+# (stato del tumore + metriche accumulate), salvati come bytes.
+DEFAULT_CACHE_FILE = "trajectory_cache.sqlite"
+DEFAULT_MEMORY_ITEMS = 200_000
+SQL_BATCH = 500  # Chiavi per query IN (...) (limite delle variabili SQLite)
+
+
+def content_key(*parts):
+    """Hash a 16 byte di parti bytes/str (chiave della cache)"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+        h.update(b"\0")
+    return h.digest()
+
+
+def chain_key(previous, payload):
+    """Chiave del prefisso esteso di un evento (h_{i+1} = H(h_i, evento))"""
+    return hashlib.blake2b(previous + payload, digest_size=16).digest()
+
+
+class TrajectoryCache:
+    def __init__(self, db_path=DEFAULT_CACHE_FILE, memory_items=DEFAULT_MEMORY_ITEMS):
+        self.memory = OrderedDict()
+        self.memory_items = memory_items
+        self.db_path = db_path
+        self.conn = None
+        if db_path:
+            self.conn = sqlite3.connect(db_path)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS trajectories ("
+                " key BLOB PRIMARY KEY,"
+                " value BLOB NOT NULL)"
+            )
+            self.conn.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """{chiave: vettore} per le chiavi presenti (memoria, poi disco in blocchi)"""
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+                found[key] = value
+                self.memory_hits += 1
+            else:
+                missing.append(key)
+        if self.conn is not None and missing:
+            for start in range(0, len(missing), SQL_BATCH):
+                batch = missing[start:start + SQL_BATCH]
+                rows = self.conn.execute(
+                    f"SELECT key, value FROM trajectories WHERE key IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    value = np.frombuffer(blob, dtype=np.float64)
+                    found[key] = value
+                    self._remember(key, value)
+                self.disk_hits += len(rows)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """items: iterabile di (chiave, vettore float64)"""
+        rows = []
+        for key, value in items:
+            value = np.ascontiguousarray(value, dtype=np.float64)
+            self._remember(key, value)
+            rows.append((key, value.tobytes()))
+        if self.conn is not None and rows:
+            self.conn.executemany("INSERT OR REPLACE INTO trajectories (key, value) VALUES (?, ?)", rows)
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self.memory),
+        }
+
+    def commit(self):
+        if self.conn is not None:
+            self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
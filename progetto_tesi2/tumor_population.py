@@ -0,0 +1,277 @@
+import numpy as np
+from integrators import INTEGRATORS, integrate
+
+NOISE_MODES = ("rng", "counter")
+DEFAULT_BANDS = (5.0, 95.0)
+PER_REPLICA = ("radius", "cellularity", "drug_efficacy", "last_delta")  # Stato (n, K) in modalità ensemble
+
+
+def counter_uniform(key, counter):
+    """
+    Uniformi in [0, 1) da (chiave, contatore) con splitmix64, vettoriale.
+    Ogni tumore ha il suo flusso: il valore allo step k non dipende dagli
+    altri tumori nel batch, e riprendere da k richiede solo k.
+    """
+    with np.errstate(over="ignore"):
+        z = key * np.uint64(0x9E3779B97F4A7C15) + counter
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+# --- POPOLAZIONE VETTORIALE DI TUMORI ---
+# Stesso modello di TumorModel (edge_server.py), ma lo stato di tutti i tumori
+# vive in array NumPy: un solo step aggiorna migliaia di tumori insieme.
+# ENSEMBLE MONTE CARLO (replicas = K > 1): ogni tumore ha K repliche con
+# estrazioni casuali indipendenti; lo stato diventa una matrice (tumori, K)
+# avanzata nello stesso step, e i payload riportano la mediana e le bande
+# percentili invece di un singolo campione rumoroso.
+class TumorPopulation:
+    def __init__(self, capacity=64,
+                 base_proliferation_rate=0.01,
+                 carrying_capacity=100.0,
+                 drug_decay=0.005,
+                 radius_coupling=0.05,
+                 flux_range=(0.8, 1.2),
+                 integrator="fixed",
+                 integrator_options=None,
+                 seed=None,
+                 noise="rng",
+                 replicas=1,
+                 bands=DEFAULT_BANDS):
+        # Parametri condivisi (uguali a TumorModel)
+        self.carrying_capacity = carrying_capacity
+        self.radius_coupling = radius_coupling  # Il raggio segue la cellularità
+        self.flux_low, self.flux_high = flux_range
+        self.default_proliferation_rate = base_proliferation_rate
+        self.default_drug_decay = drug_decay
+
+        # Integratore: "euler" (storico, instabile con dt grandi), "fixed", "rk45" o "exact".
+        # "fixed" coincide con "euler" finché dt <= 0.1 e resta stabile ad alto time_scale
+        if integrator not in INTEGRATORS:
+            raise ValueError(f"Integratore sconosciuto: {integrator}")
+        self.integrator = integrator
+        self.integrator_options = integrator_options or {}
+
+        # Con un seed fisso e dt fissi le traiettorie sono riproducibili.
+        # noise="counter": flusso casuale per tumore (chiave, step), indipendente
+        # dalla composizione del batch (esploratore what-if, cache delle traiettorie)
+        if noise not in NOISE_MODES:
+            raise ValueError(f"Modalità di rumore sconosciuta: {noise}")
+        self.noise = noise
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.free_slots = []  # Indici liberati da remove(), riusati da add()
+
+        # Ensemble: K repliche per tumore (K = 1 -> array 1D, comportamento storico)
+        if replicas < 1:
+            raise ValueError(f"Numero di repliche non valido: {replicas}")
+        self.replicas = replicas
+        self.replica_shape = (replicas,) if replicas > 1 else ()
+        self.replica_ids = np.arange(replicas, dtype=np.uint64)
+        self.bands = tuple(bands)
+        # Quantili (mediana + bande) come interpolazione lineare tra due ranghi
+        # delle repliche ordinate (stesso risultato di np.quantile, metodo "linear")
+        position = np.array((50.0,) + self.bands) / 100.0 * (replicas - 1)
+        self.rank_low = np.floor(position).astype(np.intp)
+        self.rank_high = np.minimum(self.rank_low + 1, replicas - 1)
+        self.rank_frac = position - self.rank_low
+
+        # Stato per-tumore (array pre-allocati, crescono raddoppiando)
+        self.radius = np.zeros((capacity,) + self.replica_shape)
+        self.cellularity = np.zeros((capacity,) + self.replica_shape)
+        self.drug_efficacy = np.zeros((capacity,) + self.replica_shape)
+        self.proliferation_rate = np.zeros(capacity)
+        self.drug_decay = np.zeros(capacity)
+        self.last_delta = np.zeros((capacity,) + self.replica_shape)
+        self.noise_key = np.zeros(capacity, dtype=np.uint64)
+        self.noise_step = np.zeros(capacity, dtype=np.uint64)
+        self.active = np.zeros(capacity, dtype=bool)  # False = in pausa o slot libero
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        capacity = len(self.radius)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("radius", "cellularity", "drug_efficacy", "proliferation_rate",
+                     "drug_decay", "last_delta", "noise_key", "noise_step", "active"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, initial_radius, initial_cellularity,
+            proliferation_rate=None, drug_decay=None, noise_key=0, noise_step=0):
+        """Aggiunge un tumore e restituisce il suo indice nella popolazione"""
+        if self.free_slots:
+            i = self.free_slots.pop()
+        else:
+            if self.size >= len(self.radius):
+                self._grow(self.size + 1)
+            i = self.size
+            self.size += 1
+        self.radius[i] = initial_radius
+        self.cellularity[i] = initial_cellularity
+        self.drug_efficacy[i] = 0.0
+        self.proliferation_rate[i] = (self.default_proliferation_rate
+                                      if proliferation_rate is None else proliferation_rate)
+        self.drug_decay[i] = self.default_drug_decay if drug_decay is None else drug_decay
+        self.last_delta[i] = 0.0
+        self.noise_key[i] = noise_key
+        self.noise_step[i] = noise_step
+        self.active[i] = True
+        return i
+
+    def add_many(self, radius, cellularity, proliferation_rate=None, drug_decay=None,
+                 drug_efficacy=None, noise_key=None, noise_step=None):
+        """Aggiunge un blocco di tumori (array) in coda; restituisce i loro indici"""
+        count = len(radius)
+        if self.size + count > len(self.radius):
+            self._grow(self.size + count)
+        idx = np.arange(self.size, self.size + count)
+        self.size += count
+        self.radius[idx] = self._per_replica(radius)
+        self.cellularity[idx] = self._per_replica(cellularity)
+        self.drug_efficacy[idx] = 0.0 if drug_efficacy is None else self._per_replica(drug_efficacy)
+        self.proliferation_rate[idx] = (self.default_proliferation_rate
+                                        if proliferation_rate is None else proliferation_rate)
+        self.drug_decay[idx] = self.default_drug_decay if drug_decay is None else drug_decay
+        self.last_delta[idx] = 0.0
+        self.noise_key[idx] = 0 if noise_key is None else noise_key
+        self.noise_step[idx] = 0 if noise_step is None else noise_step
+        self.active[idx] = True
+        return idx
+
+    def remove(self, indices):
+        """Libera gli slot (lo stato viene azzerato e l'indice riusato)"""
+        for i in np.atleast_1d(indices):
+            self.radius[i] = self.cellularity[i] = self.drug_efficacy[i] = self.last_delta[i] = 0.0
+            self.active[i] = False
+            self.free_slots.append(int(i))
+
+    def _per_replica(self, values):
+        """Valori per tumore -> colonna che si estende alle K repliche"""
+        values = np.asarray(values)
+        return values[:, None] if self.replicas > 1 and values.ndim == 1 else values
+
+    def set_active(self, indices, active):
+        """Mette in pausa (False) o riprende (True) l'evoluzione di alcuni tumori"""
+        self.active[indices] = active
+
+    def inject_drug(self, index, efficacy):
+        """Somministra il farmaco a uno o più tumori (indice o array di indici)"""
+        self.drug_efficacy[index] += efficacy
+
+    def step(self, dt, indices=None):
+        """
+        Avanza tutti i tumori di dt secondi (una sola passata vettoriale).
+        indices: solo questi tumori (es. le sessioni in scadenza nello stesso batch)
+        """
+        n = self.size
+        if n == 0:
+            return
+        N = self.cellularity[:n]
+        drug = self.drug_efficacy[:n]
+        active = self.active[:n]
+        if indices is not None:
+            selected = np.zeros(n, dtype=bool)
+            selected[indices] = True
+            active = active & selected
+
+        # FATTORE RANDOMICO: un'estrazione indipendente per ogni tumore (e replica)
+        if self.noise == "counter":
+            key, step = self.noise_key[:n], self.noise_step[:n]
+            if self.replicas > 1:
+                # Chiave per replica: (chiave del tumore, indice di replica)
+                with np.errstate(over="ignore"):
+                    key = key[:, None] * np.uint64(self.replicas) + self.replica_ids
+                step = step[:, None]
+            u = counter_uniform(key, step)
+            random_flux = self.flux_low + (self.flux_high - self.flux_low) * u
+            self.noise_step[:n] += active
+        else:
+            random_flux = self.rng.uniform(self.flux_low, self.flux_high, size=(n,) + self.replica_shape)
+
+        # 1. Crescita (Logistica) con random  /  2. Effetto Farmaco  /  3. Decadimento
+        N_new, drug_new = integrate(
+            self.integrator, N, drug,
+            self._per_replica(self.proliferation_rate[:n]) * random_flux,
+            self.carrying_capacity, self._per_replica(self.drug_decay[:n]), dt,
+            **self.integrator_options
+        )
+
+        # I tumori in pausa (o gli slot liberi, o fuori da indices) non cambiano
+        active = self._per_replica(active)
+        N_new = np.where(active, N_new, N)
+        drug_new = np.where(active, drug_new, drug)
+
+        # Il raggio segue la variazione di cellularità
+        delta_cellularity = N_new - N
+        self.radius[:n] += delta_cellularity * self.radius_coupling
+        np.maximum(self.radius[:n], 0.0, out=self.radius[:n])
+
+        self.cellularity[:n] = N_new
+        self.drug_efficacy[:n] = drug_new
+        self.last_delta[:n] = np.where(active, delta_cellularity, self.last_delta[:n])
+
+    def payload(self, index):
+        """Stesso dizionario restituito da TumorModel.update()"""
+        if self.replicas > 1:
+            return self.payloads([index])[0]
+        return {
+            "radius": round(float(self.radius[index]), 4),
+            "cellularity": round(float(self.cellularity[index]), 4),
+            "drug_level": round(float(self.drug_efficacy[index]), 4),
+            "status": "growing" if self.last_delta[index] > 0 else "healing"
+        }
+
+    def payloads(self, indices=None):
+        """Payload di più tumori con una sola conversione array -> liste Python"""
+        if indices is None:
+            indices = np.arange(self.size)
+        indices = np.asarray(indices, dtype=np.intp)
+        if self.replicas > 1:
+            return self._ensemble_payloads(indices)
+        radius = np.round(self.radius[indices], 4).tolist()
+        cellularity = np.round(self.cellularity[indices], 4).tolist()
+        drug = np.round(self.drug_efficacy[indices], 4).tolist()
+        growing = (self.last_delta[indices] > 0).tolist()
+        return [
+            {
+                "radius": r,
+                "cellularity": c,
+                "drug_level": d,
+                "status": "growing" if g else "healing"
+            }
+            for r, c, d, g in zip(radius, cellularity, drug, growing)
+        ]
+
+    def _ensemble_payloads(self, indices):
+        """
+        Mediana delle repliche nei campi storici (i client esistenti non cambiano)
+        più le bande percentili, es. radius_p5 / radius_p95.
+        """
+        fields = {"radius": self.radius, "cellularity": self.cellularity, "drug_level": self.drug_efficacy}
+        stats = []
+        for values in fields.values():
+            # Un sort lungo l'asse delle repliche (molto più rapido di
+            # np.quantile / np.partition su tante righe corte)
+            ordered = values[indices]
+            ordered.sort(axis=1)
+            low, high = ordered[:, self.rank_low], ordered[:, self.rank_high]
+            stats.append(np.round(low + (high - low) * self.rank_frac, 4).tolist())  # (tumore, quantile)
+        # "growing" se cresce la maggioranza delle repliche
+        growing = ((self.last_delta[indices] > 0).sum(axis=1) * 2 > self.replicas).tolist()
+        keys = [[name] + [f"{name}_p{band:g}" for band in self.bands] for name in fields]
+        payloads = []
+        for j, g in enumerate(growing):
+            payload = {}
+            for field_keys, rows in zip(keys, stats):
+                payload[field_keys[0]] = rows[j][0]
+            payload["status"] = "growing" if g else "healing"
+            for field_keys, rows in zip(keys, stats):
+                payload.update(zip(field_keys[1:], rows[j][1:]))
+            payloads.append(payload)
+        return payloads
@@ -0,0 +1,435 @@
+import os
+import time
+import struct
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from integrators import INTEGRATORS
+from tumor_population import TumorPopulation
+from trajectory_cache import TrajectoryCache, DEFAULT_CACHE_FILE, DEFAULT_MEMORY_ITEMS, content_key, chain_key
+
+# Parquet opzionale (altrimenti .npz)
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# --- ESPLORATORE WHAT-IF DEI PROTOCOLLI DI SOMMINISTRAZIONE ---
+# Ogni scenario = paziente (stato iniziale da data.csv) + schema di dosi
+# (prima dose, intervallo, numero di dosi, efficacia) + parametri biologici.
+# Migliaia di scenari vengono simulati insieme come un'unica TumorPopulation
+# (uno step vettoriale per tutti), a blocchi su un pool di processi.
+# Tutti gli scenari di uno stesso paziente condividono la stessa sequenza
+# casuale (rumore "counter", chiave = paziente + seed): le differenze tra
+# protocolli non sono mascherate dal caso (numeri casuali comuni).
+CSV_FILENAME = "data.csv"
+DEFAULT_GRID = {
+    "first_dose": [10.0, 30.0, 60.0],
+    "interval": [20.0, 40.0, 80.0],
+    "n_doses": [1, 3, 5, 8],
+    "efficacy": [0.05, 0.1, 0.2, 0.5],
+    "drug_decay": [0.005, 0.01],
+    "proliferation_rate": [0.01],
+}
+
+
+# --- PAZIENTI ---
+def load_patients(csv_file=CSV_FILENAME, limit=None, ids=None):
+    """
+    Stato iniziale dai record di data.csv:
+    raggio = radius_mean (come tumor_simulation_edge), cellularità = area_mean
+    relativa all'area massima del dataset (scala 1..100 della capacità portante).
+    """
+    df = pd.read_csv(csv_file)
+    area_max = df["area_mean"].max()
+    if ids:
+        df = df[df["id"].isin(ids)]
+    if limit:
+        df = df.head(limit)
+    return pd.DataFrame({
+        "patient_id": df["id"].astype(np.int64).to_numpy(),
+        "initial_radius": df["radius_mean"].to_numpy(dtype=np.float64),
+        "initial_cellularity": np.clip(100.0 * df["area_mean"].to_numpy(dtype=np.float64) / area_max, 1.0, 100.0),
+    })
+
+
+def noise_key(patient_id, seed):
+    digest = hashlib.blake2b(f"{patient_id}:{seed}".encode(), digest_size=8).digest()
+    return np.uint64(int.from_bytes(digest, "little"))
+
+
+# --- SCENARI ---
+def grid_schedules(grid):
+    """Prodotto cartesiano delle liste di valori -> dizionario di colonne"""
+    names = list(grid)
+    rows = list(itertools.product(*(grid[name] for name in names)))
+    return {name: np.array([row[i] for row in rows]) for i, name in enumerate(names)}
+
+
+def random_schedules(grid, count, rng):
+    """Campionamento uniforme tra minimo e massimo di ogni lista (n_doses intero)"""
+    columns = {}
+    for name, values in grid.items():
+        low, high = min(values), max(values)
+        if name == "n_doses":
+            columns[name] = rng.integers(low, high + 1, size=count)
+        else:
+            columns[name] = rng.uniform(low, high, size=count)
+    return columns
+
+
+def build_scenarios(patients, schedules, seed=0):
+    """Ogni schema applicato a ogni paziente: tabella a colonne (una riga per scenario)"""
+    n_sched = len(next(iter(schedules.values())))
+    n_pat = len(patients)
+    columns = {
+        name: np.repeat(patients[name].to_numpy(), n_sched)
+        for name in ("patient_id", "initial_radius", "initial_cellularity")
+    }
+    for name, values in schedules.items():
+        columns[name] = np.tile(np.asarray(values), n_pat)
+    columns["n_doses"] = columns["n_doses"].astype(np.int64)
+    keys = np.array([noise_key(pid, seed) for pid in patients["patient_id"]], dtype=np.uint64)
+    columns["noise_key"] = np.repeat(keys, n_sched)
+    columns["schedule"] = np.tile(np.arange(n_sched), n_pat)
+    return columns
+
+
+def dose_times(first_dose, interval, n_doses, max_doses):
+    """Matrice (scenari x max_doses) degli istanti di somministrazione (inf = nessuna dose)"""
+    k = np.arange(max_doses)
+    times = first_dose[:, None] + interval[:, None] * k[None, :]
+    return np.where(k[None, :] < n_doses[:, None], times, np.inf)
+
+
+def schedule_events(columns, dt, n_steps):
+    """
+    Eventi di dose entro l'orizzonte, uno per (scenario, step): le dosi che cadono
+    sullo stesso step si sommano. Le dosi cadono sul primo step il cui istante
+    raggiunge il tempo previsto. Ordinati per scenario e poi per step.
+    """
+    n_doses = np.asarray(columns["n_doses"])
+    max_doses = int(n_doses.max()) if len(n_doses) else 0
+    dose_steps = np.ceil(dose_times(np.asarray(columns["first_dose"], dtype=np.float64),
+                                    np.asarray(columns["interval"], dtype=np.float64),
+                                    n_doses, max_doses) / dt - 1e-9)
+    scenario_of, k = np.nonzero(dose_steps < n_steps)
+    steps = dose_steps[scenario_of, k].astype(np.int64)
+    pairs, counts = np.unique(scenario_of * (n_steps + 1) + steps, return_counts=True)
+    scenario_of, steps = pairs // (n_steps + 1), pairs % (n_steps + 1)
+    doses = counts * np.asarray(columns["efficacy"], dtype=np.float64)[scenario_of]
+    return scenario_of, steps, doses
+
+
+# --- SIMULAZIONE A BLOCCHI ---
+# Stato salvato nei checkpoint (dopo ogni dose) e a fine orizzonte
+CHECKPOINT_FIELDS = ("radius", "cellularity", "drug_efficacy", "last_delta", "noise_step",
+                     "min_cellularity", "time_to_threshold", "cellularity_auc")
+
+
+def simulate_batch(columns, horizon, dt, threshold, integrator="fixed",
+                   events=None, pending=None, start_step=None, start_state=None):
+    """
+    Simula un blocco di scenari e restituisce (metriche finali, checkpoint).
+    events: (scenario, step, dose) da schedule_events; pending: eventi ancora da
+    applicare (gli altri sono già nello stato di partenza). start_step/start_state:
+    scenari che ripartono da un checkpoint (step dopo la dose + CHECKPOINT_FIELDS).
+    checkpoint: una riga CHECKPOINT_FIELDS per evento applicato (NaN per gli altri).
+    """
+    n = len(columns["initial_cellularity"])
+    n_steps = int(round(horizon / dt))
+    ev_scenario, ev_step, ev_dose = events if events is not None else schedule_events(columns, dt, n_steps)
+    if pending is None:
+        pending = np.ones(len(ev_scenario), dtype=bool)
+    if start_step is None:
+        start_step = np.zeros(n, dtype=np.int64)
+
+    population = TumorPopulation(capacity=max(n, 1), integrator=integrator, noise="counter")
+    idx = population.add_many(
+        columns["initial_radius"], columns["initial_cellularity"],
+        proliferation_rate=columns["proliferation_rate"], drug_decay=columns["drug_decay"],
+        noise_key=columns["noise_key"]
+    )
+    min_cellularity = population.cellularity[idx].copy()
+    time_to_threshold = np.where(min_cellularity <= threshold, 0.0, np.inf)
+    auc = np.zeros(n)
+
+    # Ripartenza dai checkpoint
+    if start_state is not None:
+        resumed = np.flatnonzero(start_step > 0)
+        state = start_state[resumed]
+        rows = idx[resumed]
+        population.radius[rows] = state[:, 0]
+        population.cellularity[rows] = state[:, 1]
+        population.drug_efficacy[rows] = state[:, 2]
+        population.last_delta[rows] = state[:, 3]
+        population.noise_step[rows] = state[:, 4].astype(np.uint64)
+        min_cellularity[resumed] = state[:, 5]
+        time_to_threshold[resumed] = state[:, 6]
+        auc[resumed] = state[:, 7]
+    population.active[idx] = start_step == 0
+
+    # Eventi da applicare ordinati per step, e scenari da attivare per step
+    todo = np.flatnonzero(pending)
+    todo = todo[np.argsort(ev_step[todo], kind="stable")]
+    event_bounds = np.searchsorted(ev_step[todo], np.arange(n_steps + 1))
+    late = np.argsort(start_step, kind="stable")
+    start_bounds = np.searchsorted(start_step[late], np.arange(n_steps + 1))
+    checkpoints = np.full((len(ev_scenario), len(CHECKPOINT_FIELDS)), np.nan)
+
+    first_step = int(start_step.min()) if n else n_steps
+    for step in range(first_step, n_steps):
+        if start_bounds[step] < start_bounds[step + 1]:
+            # Scenari il cui checkpoint è a questo step (la dose è già applicata)
+            population.active[idx[late[start_bounds[step]:start_bounds[step + 1]]]] = True
+        if event_bounds[step] < event_bounds[step + 1]:
+            hit = todo[event_bounds[step]:event_bounds[step + 1]]
+            rows = idx[ev_scenario[hit]]
+            population.drug_efficacy[rows] += ev_dose[hit]
+            local = ev_scenario[hit]
+            checkpoints[hit] = np.column_stack((
+                population.radius[rows], population.cellularity[rows], population.drug_efficacy[rows],
+                population.last_delta[rows], population.noise_step[rows].astype(np.float64),
+                min_cellularity[local], time_to_threshold[local], auc[local]
+            ))
+        population.step(dt)
+        active = population.active[idx]
+        cellularity = population.cellularity[idx]
+        auc += np.where(active, cellularity * dt, 0.0)
+        np.minimum(min_cellularity, np.where(active, cellularity, np.inf), out=min_cellularity)
+        reached = active & (cellularity <= threshold) & np.isinf(time_to_threshold)
+        time_to_threshold[reached] = (step + 1) * dt
+
+    results = {
+        "final_cellularity": population.cellularity[idx].copy(),
+        "final_radius": population.radius[idx].copy(),
+        "min_cellularity": min_cellularity,
+        "time_to_threshold": time_to_threshold,
+        "cellularity_auc": auc,
+        "final_state": np.column_stack((
+            population.radius[idx], population.cellularity[idx], population.drug_efficacy[idx],
+            population.last_delta[idx], population.noise_step[idx].astype(np.float64),
+            min_cellularity, time_to_threshold, auc
+        )),
+    }
+    return results, checkpoints
+
+
+def _simulate_chunk(args):
+    return simulate_batch(*args)
+
+
+def scenario_keys(columns, events, dt, n_steps, threshold, integrator):
+    """
+    Chiavi di contenuto per la cache: una per ogni evento (stato dopo quella dose,
+    condiviso da tutti gli schemi con le stesse dosi fino a lì) e una finale.
+    """
+    ev_scenario, ev_step, ev_dose = events
+    n = len(columns["initial_cellularity"])
+    event_keys = [None] * len(ev_scenario)
+    final_keys = []
+    ev_bounds = np.searchsorted(ev_scenario, np.arange(n + 1))
+    for j in range(n):
+        h = content_key(
+            "tumor_population/v1", integrator, repr(float(dt)), repr(float(threshold)),
+            repr(float(columns["initial_radius"][j])), repr(float(columns["initial_cellularity"][j])),
+            repr(float(columns["proliferation_rate"][j])), repr(float(columns["drug_decay"][j])),
+            int(columns["noise_key"][j])
+        )
+        for e in range(ev_bounds[j], ev_bounds[j + 1]):
+            h = chain_key(h, struct.pack("<qd", int(ev_step[e]), float(ev_dose[e])))
+            event_keys[e] = h
+        final_keys.append(chain_key(h, struct.pack("<q", n_steps)))
+    return event_keys, final_keys, ev_bounds
+
+
+def run_scenarios(columns, horizon=600.0, dt=0.5, threshold=5.0, integrator="fixed",
+                  workers=None, chunk_size=4096, cache=None):
+    """
+    Divide gli scenari in blocchi e li simula in parallelo; risultati nello stesso ordine.
+    Con una TrajectoryCache: gli scenari già visti tornano subito, quelli che
+    condividono le prime dosi con uno già visto ripartono dall'ultimo checkpoint
+    comune (ramo dello schema); gli altri partono da zero.
+    """
+    n = len(columns["initial_cellularity"])
+    n_steps = int(round(horizon / dt))
+    events = schedule_events(columns, dt, n_steps)
+    ev_scenario, ev_step, ev_dose = events
+    pending = np.ones(len(ev_scenario), dtype=bool)
+    start_step = np.zeros(n, dtype=np.int64)
+    start_state = np.zeros((n, len(CHECKPOINT_FIELDS)))
+    done = np.zeros(n, dtype=bool)
+    final_state = np.zeros((n, len(CHECKPOINT_FIELDS)))
+    stats = {"scenarios": n, "cached": 0, "resumed": 0, "simulated": 0, "steps_saved": 0}
+
+    if cache is not None:
+        event_keys, final_keys, ev_bounds = scenario_keys(columns, events, dt, n_steps, threshold, integrator)
+        found = cache.get_many(final_keys)
+        for j, key in enumerate(final_keys):
+            if key in found:
+                done[j] = True
+                final_state[j] = found[key]
+        # Ultimo checkpoint disponibile per gli scenari da simulare
+        wanted = [event_keys[e] for j in np.flatnonzero(~done) for e in range(ev_bounds[j], ev_bounds[j + 1])]
+        found = cache.get_many(wanted)
+        for j in np.flatnonzero(~done):
+            for e in range(ev_bounds[j + 1] - 1, ev_bounds[j] - 1, -1):
+                if event_keys[e] in found:
+                    start_step[j] = ev_step[e]
+                    start_state[j] = found[event_keys[e]]
+                    pending[ev_bounds[j]:e + 1] = False
+                    break
+        stats["cached"] = int(done.sum())
+        stats["resumed"] = int((start_step > 0).sum())
+        stats["steps_saved"] = int(done.sum()) * n_steps + int(start_step.sum())
+
+    todo = np.flatnonzero(~done)
+    stats["simulated"] = len(todo) - stats["resumed"]
+    tasks = []
+    for a in range(0, len(todo), chunk_size):
+        rows = todo[a:a + chunk_size]
+        # Eventi del blocco, con indici di scenario locali
+        local = np.full(n, -1)
+        local[rows] = np.arange(len(rows))
+        ev_rows = np.flatnonzero(local[ev_scenario] >= 0)
+        tasks.append((rows, ev_rows, (
+            {name: values[rows] for name, values in columns.items()}, horizon, dt, threshold, integrator,
+            (local[ev_scenario[ev_rows]], ev_step[ev_rows], ev_dose[ev_rows]), pending[ev_rows],
+            start_step[rows], start_state[rows]
+        )))
+    if workers == 1 or len(tasks) <= 1:
+        parts = [_simulate_chunk(task) for _, _, task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_simulate_chunk, [task for _, _, task in tasks]))
+
+    new_entries = []
+    for (rows, ev_rows, _), (results, checkpoints) in zip(tasks, parts):
+        final_state[rows] = results["final_state"]
+        if cache is not None:
+            applied = np.flatnonzero(~np.isnan(checkpoints[:, 0]))
+            new_entries.extend((event_keys[ev_rows[e]], checkpoints[e]) for e in applied)
+            new_entries.extend((final_keys[j], results["final_state"][i]) for i, j in enumerate(rows))
+    if cache is not None:
+        cache.put_many(new_entries)
+        cache.commit()
+
+    total_dose = np.bincount(ev_scenario, weights=ev_dose, minlength=n)
+    results = {
+        "final_cellularity": final_state[:, 1].copy(),
+        "final_radius": final_state[:, 0].copy(),
+        "min_cellularity": final_state[:, 5].copy(),
+        "time_to_threshold": final_state[:, 6].copy(),
+        "cellularity_auc": final_state[:, 7].copy(),
+        "total_dose": total_dose,
+    }
+    return results, stats
+
+
+def rank_scenarios(columns, results):
+    """
+    Classifica per paziente: cellularità finale, poi tempo alla soglia,
+    poi dose totale (tutti crescenti). rank 1 = protocollo migliore.
+    La cellularità finale è confrontata alla precisione dei payload (4 decimali):
+    i protocolli che azzerano il tumore sono pari merito su quel criterio.
+    """
+    final = np.round(results["final_cellularity"], 4)
+    order = np.lexsort((results["total_dose"], results["time_to_threshold"],
+                        final, columns["patient_id"]))
+    rank = np.empty(len(order), dtype=np.int64)
+    patients = columns["patient_id"][order]
+    starts = np.r_[0, np.flatnonzero(patients[1:] != patients[:-1]) + 1]
+    position = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    rank[order] = position + 1
+    return rank
+
+
+# --- OUTPUT ---
+def write_results(path, table):
+    """Tabella a colonne: Parquet se pyarrow è installato, altrimenti .npz"""
+    if pyarrow is not None and not path.endswith(".npz"):
+        pyarrow.parquet.write_table(pyarrow.table(table), path)
+        return path
+    path = os.path.splitext(path)[0] + ".npz"
+    np.savez_compressed(path, **table)
+    return path
+
+
+def read_results(path):
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            return pd.DataFrame({name: data[name] for name in data.files})
+    return pd.read_parquet(path)
+
+
+def explore(patients, schedules, seed=0, **options):
+    """API batch: scenari -> (tabella a colonne con metriche e classifica, statistiche cache)"""
+    columns = build_scenarios(patients, schedules, seed)
+    results, stats = run_scenarios(columns, **options)
+    table = dict(columns)
+    table.update(results)
+    table["rank"] = rank_scenarios(columns, results)
+    return table, stats
+
+
+def _float_list(text):
+    return [float(v) for v in text.split(",") if v]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Esploratore what-if dei protocolli di somministrazione")
+    parser.add_argument("--csv", default=CSV_FILENAME, help="Dataset dei pazienti")
+    parser.add_argument("--patients", type=int, default=1, help="Primi N pazienti del dataset")
+    parser.add_argument("--ids", default="", help="Id dei pazienti (separati da virgola)")
+    parser.add_argument("--random", type=int, default=0, help="N schemi casuali invece della griglia")
+    for name, values in DEFAULT_GRID.items():
+        parser.add_argument("--" + name.replace("_", "-"), default=",".join(str(v) for v in values),
+                            help=f"Valori di {name} (default: %(default)s)")
+    parser.add_argument("--horizon", type=float, default=600.0, help="Secondi simulati")
+    parser.add_argument("--dt", type=float, default=0.5, help="Passo di integrazione (s)")
+    parser.add_argument("--threshold", type=float, default=5.0, help="Cellularità obiettivo per il tempo alla soglia")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="fixed", help="Metodo di integrazione")
+    parser.add_argument("--workers", type=int, default=None, help="Processi (default: tutti i core)")
+    parser.add_argument("--chunk", type=int, default=4096, help="Scenari per blocco")
+    parser.add_argument("--seed", type=int, default=0, help="Seed del rumore biologico")
+    parser.add_argument("--output", default="whatif_results.parquet", help="File dei risultati (.parquet o .npz)")
+    parser.add_argument("--top", type=int, default=5, help="Protocolli migliori da mostrare per paziente")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_FILE, help="File SQLite della cache delle traiettorie")
+    parser.add_argument("--no-cache", action="store_true", help="Disabilita la cache su disco (resta solo quella in memoria)")
+    parser.add_argument("--cache-items", type=int, default=DEFAULT_MEMORY_ITEMS, help="Voci nella cache LRU in memoria")
+    args = parser.parse_args()
+
+    ids = [int(v) for v in args.ids.split(",") if v]
+    patients = load_patients(args.csv, limit=None if ids else args.patients, ids=ids)
+    grid = {name: _float_list(getattr(args, name)) for name in DEFAULT_GRID}
+    if args.random:
+        schedules = random_schedules(grid, args.random, np.random.default_rng(args.seed))
+    else:
+        schedules = grid_schedules(grid)
+    n_sched = len(next(iter(schedules.values())))
+    print(f"🧪 {len(patients)} pazienti x {n_sched} protocolli = {len(patients) * n_sched} scenari")
+
+    cache = TrajectoryCache(None if args.no_cache else args.cache, args.cache_items)
+    start = time.perf_counter()
+    table, stats = explore(patients, schedules, seed=args.seed, horizon=args.horizon, dt=args.dt,
+                           threshold=args.threshold, integrator=args.integrator,
+                           workers=args.workers, chunk_size=args.chunk, cache=cache)
+    elapsed = time.perf_counter() - start
+    cache.close()
+    print(f"⚡ Completati in {elapsed:.2f}s ({len(table['rank']) / elapsed:.0f} scenari/s)")
+    print(f"🗃️ Cache traiettorie: {stats['cached']} pronti, {stats['resumed']} ripresi da un checkpoint, "
+          f"{stats['simulated']} simulati da zero ({stats['steps_saved']} step risparmiati)")
+
+    path = write_results(args.output, table)
+    print(f"💾 Risultati in {path}")
+
+    df = pd.DataFrame(table)
+    columns = ["rank", "first_dose", "interval", "n_doses", "efficacy", "drug_decay",
+               "final_cellularity", "time_to_threshold", "total_dose"]
+    for patient_id, group in df[df["rank"] <= args.top].groupby("patient_id"):
+        print(f"\n🏥 Paziente {patient_id}")
+        print(group.sort_values("rank")[columns].to_string(index=False))
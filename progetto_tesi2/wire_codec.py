@@ -0,0 +1,251 @@
+import json
+import struct
+import numpy as np
+
+# MessagePack opzionale
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# --- FORMATO DI TRASPORTO COMPATTO (CODEC) ---
+# Ogni messaggio binario inizia con un byte di intestazione:
+#     (WIRE_VERSION << 4) | codec_id
+# Per il codec "struct" seguono 2 byte: schema_id e versione dello schema.
+# Il codec "json" storico NON ha intestazione (testo JSON puro) così i client
+# Unity esistenti continuano a funzionare; il decoder lo riconosce dal primo byte.
+WIRE_VERSION = 1
+
+CODEC_JSON = 1
+CODEC_MSGPACK = 2
+CODEC_STRUCT = 3
+CODECS = ("json", "json+header", "msgpack", "struct")
+
+
+# --- SCHEMI VERSIONATI ---
+def _struct_code(dtype):
+    dtype = np.dtype(dtype)
+    return f"{dtype.itemsize}s" if dtype.kind == "S" else dtype.char
+
+
+def _get_path(payload, path):
+    value = payload
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def _set_path(payload, path, value):
+    keys = path.split(".")
+    for key in keys[:-1]:
+        payload = payload.setdefault(key, {})
+    payload[keys[-1]] = value
+
+
+def _to_wire(value, dtype):
+    if np.dtype(dtype).kind == "S":
+        return str("" if value is None else value).encode()
+    if value is None:
+        return 0
+    return int(value) if np.dtype(dtype).kind in "iu" else float(value)
+
+
+def _from_wire(value, dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind == "S":
+        return value.rstrip(b"\0").decode()
+    if dtype.kind == "f" and dtype.itemsize == 4:
+        # Rappresentazione più corta del float32 (0.5018, non 0.501800000667572)
+        return float(str(np.float32(value)))
+    return value.item() if hasattr(value, "item") else value
+
+
+class RecordSchema:
+    """Un dizionario (anche annidato: campi 'a.b') <-> un record binario a dimensione fissa"""
+    def __init__(self, name, schema_id, version, fields):
+        self.name = name
+        self.schema_id = schema_id
+        self.version = version
+        self.fields = fields
+        self.struct = struct.Struct("<" + "".join(_struct_code(dt) for _, dt in fields))
+
+    def pack(self, payload):
+        return self.struct.pack(*(_to_wire(_get_path(payload, f), dt) for f, dt in self.fields))
+
+    def unpack(self, body):
+        payload = {}
+        for (field, dtype), value in zip(self.fields, self.struct.unpack(body)):
+            _set_path(payload, field, _from_wire(value, dtype))
+        return payload
+
+
+class TableSchema:
+    """
+    Intestazione a campi fissi + tabella di righe indicizzata per chiave
+    (es. {"timestamp": ..., "tumors": {"left": {...}, "right": {...}}}).
+    Le righe sono un array NumPy strutturato.
+    """
+    def __init__(self, name, schema_id, version, header_fields, table, key_dtype, row_fields):
+        self.name = name
+        self.schema_id = schema_id
+        self.version = version
+        self.header = RecordSchema(name, schema_id, version, header_fields)
+        self.table = table
+        self.row_fields = row_fields
+        self.row_dtype = np.dtype([("key", key_dtype)] + [(f, dt) for f, dt in row_fields]).newbyteorder("<")
+
+    def pack(self, payload):
+        rows_in = payload.get(self.table) or {}
+        rows = np.zeros(len(rows_in), dtype=self.row_dtype)
+        for i, (key, row) in enumerate(rows_in.items()):
+            rows[i]["key"] = _to_wire(key, self.row_dtype["key"])
+            for field, dtype in self.row_fields:
+                rows[i][field] = _to_wire(row.get(field), dtype)
+        return self.header.pack(payload) + struct.pack("<H", len(rows)) + rows.tobytes()
+
+    def unpack(self, body):
+        size = self.header.struct.size
+        payload = self.header.unpack(body[:size])
+        (count,) = struct.unpack_from("<H", body, size)
+        rows = np.frombuffer(body, dtype=self.row_dtype, count=count, offset=size + 2)
+        table = {}
+        for row in rows:
+            table[_from_wire(row["key"], self.row_dtype["key"])] = {
+                field: _from_wire(row[field], dtype) for field, dtype in self.row_fields
+            }
+        payload[self.table] = table
+        return payload
+
+
+BIO_COLUMNS = [
+    "radius_mean", "texture_mean", "perimeter_mean", "area_mean", "smoothness_mean",
+    "compactness_mean", "concavity_mean", "concave_points_mean", "symmetry_mean",
+    "fractal_dimension_mean", "radius_se", "texture_se", "perimeter_se", "area_se",
+    "smoothness_se", "compactness_se", "concavity_se", "concave_points_se", "symmetry_se",
+    "fractal_dimension_se", "radius_worst", "texture_worst", "perimeter_worst", "area_worst",
+    "smoothness_worst", "compactness_worst", "concavity_worst", "concave_points_worst",
+    "symmetry_worst", "fractal_dimension_worst",
+]
+
+SCHEMAS = {}          # nome -> versione corrente (usata dall'encoder)
+SCHEMA_VERSIONS = {}  # (schema_id, versione) -> schema, anche le versioni storiche
+
+def register_schema(schema, current=True):
+    """current=False: solo per decodificare dati vecchi (es. registrazioni .dtrec)"""
+    SCHEMA_VERSIONS[(schema.schema_id, schema.version)] = schema
+    if current:
+        SCHEMAS[schema.name] = schema
+    return schema
+
+# Riga di data.csv (BioSender)
+register_schema(RecordSchema("bio_record", 1, 1,
+    [("id", "i8"), ("diagnosis", "S1")] + [(c, "f8") for c in BIO_COLUMNS]))
+
+# Pacchetto per slice del DICOM player
+register_schema(RecordSchema("dicom_slice", 2, 1, [
+    ("id", "i4"), ("slice_index", "S8"), ("diagnosis", "S1"),
+    ("radius_mean", "f4"), ("texture_mean", "f4"),
+    ("lesion_area_mm2", "f4"), ("lesion_radius_mm", "f4"),
+]))
+
+# Stato dei tumori pubblicato dall'EdgeServer
+TUMOR_ROWS = [("radius", "f4"), ("cellularity", "f4"), ("drug_level", "f4"), ("status", "S8")]
+register_schema(TableSchema("tumor_state", 3, 1,
+    header_fields=[("timestamp", "f8"), ("sim_time", "f8")],
+    table="tumors", key_dtype="S16", row_fields=TUMOR_ROWS), current=False)
+# v2: numero di sequenza e flag keyframe per la pubblicazione a variazione
+register_schema(TableSchema("tumor_state", 3, 2,
+    header_fields=[("timestamp", "f8"), ("sim_time", "f8"), ("seq", "u4"), ("keyframe", "?")],
+    table="tumors", key_dtype="S16", row_fields=TUMOR_ROWS), current=False)
+# v3: patient_id (sessioni multi-paziente: il messaggio non dipende dal nome del topic)
+register_schema(TableSchema("tumor_state", 3, 3,
+    header_fields=[("timestamp", "f8"), ("sim_time", "f8"), ("patient_id", "S32"),
+                   ("seq", "u4"), ("keyframe", "?")],
+    table="tumors", key_dtype="S16", row_fields=TUMOR_ROWS))
+
+# Ensemble Monte Carlo dell'EdgeServer (--replicas): mediana nei campi storici
+# + bande percentili. Le colonne sono fisse: il codec struct supporta solo
+# le bande di default (ENSEMBLE_BANDS), le altre richiedono json/msgpack.
+ENSEMBLE_BANDS = (5.0, 95.0)
+register_schema(TableSchema("tumor_ensemble", 5, 1,
+    header_fields=[("timestamp", "f8"), ("sim_time", "f8"), ("patient_id", "S32"),
+                   ("seq", "u4"), ("keyframe", "?"), ("replicas", "u2")],
+    table="tumors", key_dtype="S16",
+    row_fields=TUMOR_ROWS + [(f"{name}_p{band:g}", "f4")
+                             for name in ("radius", "cellularity", "drug_level") for band in ENSEMBLE_BANDS]))
+
+# Aggiornamento di simulation_loop (tumor_simulation_edge.py)
+register_schema(RecordSchema("sim_update", 4, 1, [
+    ("type", "S16"), ("timestamp", "f8"), ("sim_time", "f8"),
+    ("data.radius", "f4"), ("data.cellularity", "f4"), ("data.drug_level", "f4"), ("data.status", "S8"),
+]))
+
+
+# --- ENCODER / DECODER ---
+class WireEncoder:
+    """
+    Encoder per un topic: codec in CODECS, schema (nome) richiesto solo da "struct".
+    Il codec "struct" trasporta solo i campi dello schema.
+    """
+    def __init__(self, codec="json", schema=None):
+        if codec not in CODECS:
+            raise ValueError(f"Codec sconosciuto: {codec} (disponibili: {', '.join(CODECS)})")
+        if codec == "msgpack" and msgpack is None:
+            raise RuntimeError("msgpack non installato: pip install msgpack")
+        if codec == "struct" and schema not in SCHEMAS:
+            raise ValueError(f"Il codec struct richiede uno schema registrato (ricevuto: {schema})")
+        self.codec = codec
+        self.schema = SCHEMAS.get(schema)
+
+    def encode(self, payload):
+        if self.codec == "json":
+            return json.dumps(payload, default=str).encode()
+        if self.codec == "json+header":
+            return bytes([(WIRE_VERSION << 4) | CODEC_JSON]) + json.dumps(payload, default=str).encode()
+        if self.codec == "msgpack":
+            return bytes([(WIRE_VERSION << 4) | CODEC_MSGPACK]) + msgpack.packb(payload)
+        return (bytes([(WIRE_VERSION << 4) | CODEC_STRUCT, self.schema.schema_id, self.schema.version])
+                + self.schema.pack(payload))
+
+
+def peek_codec(data):
+    """Nome del codec di un messaggio ricevuto (senza decodificarlo)"""
+    if not data or (data[0] >> 4) != WIRE_VERSION:
+        return "json"
+    return {CODEC_JSON: "json+header", CODEC_MSGPACK: "msgpack", CODEC_STRUCT: "struct"}.get(data[0] & 0x0F, "unknown")
+
+
+def decode(data):
+    """Decodifica un messaggio di qualsiasi codec (JSON storico incluso) in un dizionario"""
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    codec = peek_codec(data)
+    if codec == "json":
+        return json.loads(data)
+    if codec == "json+header":
+        return json.loads(data[1:])
+    if codec == "msgpack":
+        if msgpack is None:
+            raise RuntimeError("msgpack non installato: pip install msgpack")
+        return msgpack.unpackb(data[1:])
+    if codec == "struct":
+        schema = SCHEMA_VERSIONS.get((data[1], data[2]))
+        if schema is None:
+            raise ValueError(f"Schema non supportato: id={data[1]} versione={data[2]}")
+        return schema.unpack(data[3:])
+    raise ValueError(f"Intestazione sconosciuta: 0x{data[0]:02x}")
+
+
+def parse_topic_codecs(spec):
+    """'topicA=msgpack,topicB=struct' -> {topic: codec}"""
+    mapping = {}
+    for item in filter(None, (spec or "").split(",")):
+        topic, _, codec = item.partition("=")
+        if codec not in CODECS:
+            raise ValueError(f"Codec sconosciuto per {topic}: {codec}")
+        mapping[topic.strip()] = codec
+    return mapping
+